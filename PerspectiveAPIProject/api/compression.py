@@ -0,0 +1,261 @@
+"""
+HTTP compression for the Flask app.
+
+Responses: `compress_response` (an after_request hook) picks the best encoding
+the client accepts, from zstd and br when their libraries are installed, and
+gzip (always available). It compresses JSON and text bodies of at least
+COMPRESSION_MIN_SIZE bytes and adds `Vary: Accept-Encoding`. Streamed responses
+(NDJSON) are left alone. A strong ETag names the bytes sent, so a compressed
+response's ETag gets the encoding appended (`"<etag>-gzip"`, see
+services/etag.py); conditional requests strip it again and match the version.
+
+Perspective documents are compressed once per version. Routes tag a response
+with `set_compression_cache_key(response, etag)`, and the compressed bodies
+are kept in an LRU keyed by (ETag, encoding). The ETag is built from id and
+updated_time, so every write produces a new key and stale entries age out.
+
+Requests: `decode_request_body` inflates a Content-Encoding'd body (gzip,
+deflate, and zstd/br when available). Decoded bodies are capped at
+COMPRESSION_MAX_REQUEST_SIZE.
+"""
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Flask, Response, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from .metrics import timed
+from .services.etag import encoded_etag
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+# Smaller bodies are sent as they are; compressing them gains little.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+# Total bytes of compressed perspective bodies kept in memory.
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Largest request body accepted after decompression.
+COMPRESSION_MAX_REQUEST_SIZE = int(os.getenv("COMPRESSION_MAX_REQUEST_SIZE", str(16 * 1024 * 1024)))
+
+_COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(data)
+
+
+def _brotli_compress(data: bytes) -> bytes:
+    return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+
+
+def _gzip_compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+# Encoding -> compressor, in order of preference when the client accepts several equally.
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd_compress
+if brotli is not None:
+    ENCODERS['br'] = _brotli_compress
+ENCODERS['gzip'] = _gzip_compress
+
+
+def _too_large() -> RequestEntityTooLarge:
+    return RequestEntityTooLarge(f"Decompressed request body exceeds {COMPRESSION_MAX_REQUEST_SIZE} bytes.")
+
+
+def _inflate(data: bytes, wbits: int) -> bytes:
+    decompressor = zlib.decompressobj(wbits)
+    decoded = decompressor.decompress(data, COMPRESSION_MAX_REQUEST_SIZE)
+    if decompressor.unconsumed_tail:
+        raise _too_large()
+    return decoded + decompressor.flush()
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+        decoded = reader.read(COMPRESSION_MAX_REQUEST_SIZE + 1)
+    if len(decoded) > COMPRESSION_MAX_REQUEST_SIZE:
+        raise _too_large()
+    return decoded
+
+
+# Compressed bytes fed per step to a brotli without output_buffer_limit (< 1.2):
+# the output is checked after each step, so one step bounds the overshoot.
+_BROTLI_CHUNK_SIZE = 1024
+
+
+def _brotli_decompress(data: bytes) -> bytes:
+    decompressor = brotli.Decompressor()
+    if hasattr(decompressor, 'can_accept_more_data'):
+        # brotli >= 1.2 stops growing the output at output_buffer_limit.
+        decoded = decompressor.process(data, output_buffer_limit=COMPRESSION_MAX_REQUEST_SIZE + 1)
+        if len(decoded) > COMPRESSION_MAX_REQUEST_SIZE:
+            raise _too_large()
+    else:
+        chunks, size = [], 0
+        for start in range(0, len(data), _BROTLI_CHUNK_SIZE):
+            chunk = decompressor.process(data[start:start + _BROTLI_CHUNK_SIZE])
+            size += len(chunk)
+            if size > COMPRESSION_MAX_REQUEST_SIZE:
+                raise _too_large()
+            chunks.append(chunk)
+        decoded = b"".join(chunks)
+    if not decompressor.is_finished():
+        raise brotli.error("Truncated brotli stream.")
+    return decoded
+
+
+DECODERS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': lambda data: _inflate(data, 16 + zlib.MAX_WBITS),
+    'x-gzip': lambda data: _inflate(data, 16 + zlib.MAX_WBITS),
+    'deflate': lambda data: _inflate(data, zlib.MAX_WBITS),
+}
+if zstandard is not None:
+    DECODERS['zstd'] = _zstd_decompress
+if brotli is not None:
+    DECODERS['br'] = _brotli_decompress
+
+
+def decode_request_body(data: bytes) -> bytes:
+    """
+    The current request's body with its Content-Encoding(s) undone.
+
+    Raises UnsupportedMediaType (415) for an unknown encoding, and
+    RequestEntityTooLarge (413) when the decoded body exceeds COMPRESSION_MAX_REQUEST_SIZE.
+    """
+    header = request.headers.get('Content-Encoding', '')
+    # Encodings are listed in the order they were applied, so undo them in reverse.
+    for encoding in reversed([e.strip().lower() for e in header.split(',') if e.strip()]):
+        if encoding == 'identity':
+            continue
+        decoder = DECODERS.get(encoding)
+        if decoder is None:
+            raise UnsupportedMediaType(f"Unsupported Content-Encoding '{encoding}'.")
+        try:
+            data = decoder(data)
+        except (OSError, EOFError, zlib.error) as e:
+            raise UnsupportedMediaType(f"Request body is not valid {encoding}: {e}")
+        except RequestEntityTooLarge:
+            raise
+        except Exception as e:  # zstandard.ZstdError / brotli.error
+            raise UnsupportedMediaType(f"Request body is not valid {encoding}: {e}")
+    return data
+
+
+class CompressedBodyCache:
+    """LRU of compressed response bodies keyed by (cache key, encoding), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Tuple[str, str], body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+compressed_body_cache = CompressedBodyCache(COMPRESSION_CACHE_MAX_BYTES)
+
+
+def set_compression_cache_key(response: Response, key: str) -> Response:
+    """Marks a response whose body is fully determined by `key` (a perspective ETag), so its compressed form is cached."""
+    response.compression_cache_key = key
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    """after_request hook: compresses the body in the best encoding the client accepts."""
+    if (response.mimetype not in _COMPRESSIBLE_MIMETYPES and not response.mimetype.startswith('text/')) \
+            or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.content_length is not None and response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+    if encoding is None:
+        return response
+
+    cache_key = getattr(response, 'compression_cache_key', None)
+    body = compressed_body_cache.get((cache_key, encoding)) if cache_key is not None else None
+    if body is None:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        with timed('serialization'):
+            body = ENCODERS[encoding](data)
+        if cache_key is not None:
+            compressed_body_cache.put((cache_key, encoding), body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+def init_compression(app: Flask):
+    """Installs response compression (unless COMPRESSION_ENABLED=0)."""
+    if COMPRESSION_ENABLED:
+        app.after_request(compress_response)
@@ -1,68 +1,113 @@
+import atexit
 import os
+import threading
 import psycopg2
-from psycopg2.extras import DictCursor, register_uuid
+from psycopg2.extras import register_uuid
 from psycopg2.extensions import connection, cursor
 from flask import g
-from typing import Tuple
+from typing import Optional, Tuple
+from .pool import ConnectionPool
+from .prepared import PreparingConnection
+from .profiling import ProfilingCursor, TimedCursor
 
 # Register UUID support for psycopg2
 register_uuid()
 
 # Database connection details (replace with your actual details or environment variables).
-DB_NAME = "skg023"
-DB_USER = "postgres"
-DB_PASSWORD = "232222"
-DB_HOST = "localhost"
-DB_PORT = "5432"
-DB_SCHEMA = "recsui"
+DB_NAME = os.getenv("DB_NAME", "skg023")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "232222")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_SCHEMA = os.getenv("DB_SCHEMA", "recsui")
 
+# Connection pool settings.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Seconds a request waits for a free connection before giving up.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Connections idle for longer than this many seconds are pinged before reuse.
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+# Seconds allowed for the TCP + auth handshake of a new physical connection.
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Prepare service statements server-side once per pooled connection.
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") == "1"
 
-def get_db_connection() -> Tuple[connection, cursor]:
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    minconn=DB_POOL_MIN_SIZE,
+                    maxconn=DB_POOL_MAX_SIZE,
+                    schema=DB_SCHEMA,
+                    timeout=DB_POOL_TIMEOUT,
+                    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    connect_timeout=DB_CONNECT_TIMEOUT,
+                    connection_factory=PreparingConnection if DB_PREPARED_STATEMENTS else None,
+                )
+                atexit.register(close_pool)
+    return _pool
+
+
+def close_pool():
+    """Closes every pooled connection. Safe to call more than once."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def get_db_connection(cursor_factory=TimedCursor) -> Tuple[connection, cursor]:
     """
-    Establishes a connection to the PostgreSQL database and returns
-    both the connection and a cursor object.
+    Checks a connection out of the pool and returns both the connection
+    and a cursor object (a DictCursor subclass, `cursor_factory`).
 
     Raises:
-        psycopg2.Error: If the connection fails.
+        psycopg2.Error: If no connection could be obtained.
     """
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT,
-        )
-        # Use DictCursor to return query results as dictionaries
-        curr = conn.cursor(cursor_factory=DictCursor)
-        curr.execute(f"SET search_path TO {DB_SCHEMA};")
-        print("Successfully connected to the database.")
+        conn = get_pool().getconn()
+        # Use DictCursor to return query results as dictionaries (timed for /metrics)
+        curr = conn.cursor(cursor_factory=cursor_factory)
         return conn, curr
     except psycopg2.Error as e:
         print(f"Error connecting to the database: {e}")
         raise
 
 
-def close_db_connection(conn: connection, curr: cursor):
-    """Closes the database cursor and connection."""
+def release_db_connection(conn: connection, curr: cursor):
+    """Closes the database cursor and returns the connection to the pool."""
     if curr:
         curr.close()
     if conn:
-        conn.close()
-    print("Database connection closed.")
+        get_pool().putconn(conn)
 
 
 def get_db():
     """
     Provides a database connection and cursor that is local to the current request.
-    If they don't exist for the request, it creates new ones.
+    If they don't exist for the request, it checks them out of the pool.
+    The cursor counts the request's queries against its budget (see profiling.py).
     """
     if 'db_conn' not in g or 'db_curr' not in g:
         try:
-            conn, curr = get_db_connection()
+            conn, curr = get_db_connection(cursor_factory=ProfilingCursor)
             g.db_conn = conn
             g.db_curr = curr
         except psycopg2.Error as e:
             raise ConnectionError(f"Failed to get database connection: {e}") from e
 
-    return g.db_conn, g.db_curr
\ No newline at end of file
+    return g.db_conn, g.db_curr
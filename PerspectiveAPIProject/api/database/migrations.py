@@ -0,0 +1,518 @@
+"""
+Versioned DDL for the recsui.perspectives table.
+
+This module owns the schema for every app that shares the table (the Flask
+app, perspective_api, perspective_api_002 and perspectives_app); none of them
+issue DDL at startup. The baseline table is created if missing, then each
+migration runs once, in order, inside its own transaction and is recorded in
+recsui.schema_migrations. Run from the PerspectiveAPIProject directory:
+
+    python -m api.database.migrations upgrade
+    python -m api.database.migrations status
+    python -m api.database.migrations check
+
+`to-items` and `to-blobs` move the section data between the JSONB columns and
+the one-row-per-item table of migration 6 (PERSPECTIVE_STORAGE=postgres_items).
+Stop the writers, convert, and restart them with the matching backend.
+
+`status` only reads: it does not create the schema or the version table.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from psycopg2.extensions import connection
+
+from .database import get_pool
+from ..services.item_perspective import (_ASSEMBLED_BY_ID_QUERY, _DOCUMENT_BY_USERNAME_QUERY as
+                                         _ITEM_DOCUMENT_BY_USERNAME_QUERY, _ITEM_DELETE_QUERIES, _ITEM_UPSERT_QUERIES,
+                                         ItemPerspectiveService, _item_field_statements, _item_search_statement)
+from ..services.perspective import (_BULK_UPSERT_QUERY, _BULK_UPSERT_TEMPLATE, _DELETE_QUERY, _DOCUMENT_BY_USERNAME_QUERY,
+                                    _ETAG_BY_USERNAME_QUERY, _SECTION_CAS_QUERIES, _SECTION_MERGE_QUERIES,
+                                    _SECTION_READ_QUERIES, _SECTION_REPLACE_QUERIES, _SELECT_ALL_QUERY,
+                                    _SELECT_BY_ID_QUERY, _SELECT_BY_USERNAME_QUERY, _SELECT_ORDERED_QUERY,
+                                    _SELECT_PAGE_QUERY, _field_statements, _projection_statement, _search_statement,
+                                    _update_statement)
+from ..services.storage import SECTION_MERGE_KEYS
+
+# Usernames stored more than once, most repeated first. Migration 1 lists them instead of failing mid-build.
+_DUPLICATE_USERNAMES_QUERY = """
+SELECT username, count(*) FROM recsui.perspectives
+GROUP BY username HAVING count(*) > 1
+ORDER BY count(*) DESC, username;
+"""
+# Duplicated usernames named in migration 1's error.
+_MAX_LISTED_DUPLICATES = 20
+
+
+def _create_username_index(conn: connection):
+    """
+    Migration 1. Stops with the duplicated usernames if there are any, then builds
+    the index CONCURRENTLY (outside a transaction), so writers are not blocked while
+    it builds. If a build fails (e.g. a duplicate inserted meanwhile), Postgres
+    leaves an INVALID index behind; the next upgrade drops it and builds it again.
+    """
+    with conn.cursor() as curr:
+        curr.execute(_DUPLICATE_USERNAMES_QUERY)
+        duplicates = curr.fetchall()
+        curr.execute("SELECT indisvalid FROM pg_index "
+                     "WHERE indexrelid = to_regclass('recsui.perspectives_username_key');")
+        existing = curr.fetchone()
+    conn.commit()
+    if duplicates:
+        listed = ", ".join(f"{username!r} ({count} rows)" for username, count in duplicates[:_MAX_LISTED_DUPLICATES])
+        if len(duplicates) > _MAX_LISTED_DUPLICATES:
+            listed += f", and {len(duplicates) - _MAX_LISTED_DUPLICATES} more"
+        raise RuntimeError(
+            f"Cannot create the unique index on recsui.perspectives (username): {len(duplicates)} usernames have "
+            f"more than one row: {listed}. Merge or delete the extra rows, then run upgrade again."
+        )
+
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as curr:
+            if existing is not None and not existing[0]:
+                curr.execute("DROP INDEX CONCURRENTLY recsui.perspectives_username_key;")
+            curr.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS perspectives_username_key "
+                         "ON recsui.perspectives (username);")
+    finally:
+        conn.autocommit = autocommit
+
+
+# (version, description, SQL or a function of the connection). Never edit a released migration; append a new one.
+# SQL runs in the transaction that records the version; a function runs before it and manages its own
+# transactions (needed for CREATE INDEX CONCURRENTLY), so it must be safe to run again after a failure.
+MIGRATIONS: List[Tuple[int, str, Union[str, Callable[[connection], None]]]] = [
+    (
+        1,
+        "unique index on username (required by the ON CONFLICT (username) upserts)",
+        _create_username_index,
+    ),
+    (
+        2,
+        "version column for optimistic concurrency control",
+        "ALTER TABLE recsui.perspectives ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;",
+    ),
+    (
+        3,
+        "btree index on updated_time",
+        "CREATE INDEX IF NOT EXISTS perspectives_updated_time_idx ON recsui.perspectives (updated_time);",
+    ),
+    (
+        4,
+        "JSONB (not JSON) section columns with '[]' defaults",
+        """
+        DO $$
+        DECLARE
+            section text;
+        BEGIN
+            FOREACH section IN ARRAY ARRAY['column_state', 'sort_model', 'filter_model'] LOOP
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_schema = 'recsui' AND table_name = 'perspectives'
+                      AND column_name = section) = 'json' THEN
+                    EXECUTE format('ALTER TABLE recsui.perspectives ALTER COLUMN %I TYPE jsonb USING %I::jsonb',
+                                   section, section);
+                END IF;
+                EXECUTE format('ALTER TABLE recsui.perspectives ALTER COLUMN %I SET DEFAULT ''[]''::jsonb', section);
+            END LOOP;
+        END
+        $$;
+        """,
+    ),
+    (
+        5,
+        "GIN indexes for searching sections by column, view and filter field",
+        """
+        CREATE INDEX IF NOT EXISTS perspectives_column_state_gin
+            ON recsui.perspectives USING gin (column_state jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS perspectives_sort_model_gin
+            ON recsui.perspectives USING gin (sort_model jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS perspectives_filter_model_gin
+            ON recsui.perspectives USING gin (filter_model jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS perspectives_sort_fields_gin
+            ON recsui.perspectives USING gin (
+                jsonb_path_query_array(sort_model, '$[*].filters ? (@.type() == "object").keyvalue().key')
+                jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS perspectives_filter_fields_gin
+            ON recsui.perspectives USING gin (
+                jsonb_path_query_array(filter_model, '$[*].filters ? (@.type() == "object").keyvalue().key')
+                jsonb_path_ops);
+        """,
+    ),
+    (
+        6,
+        "one row per section item (recsui.perspective_items) and the recsui.perspectives_assembled view",
+        """
+        CREATE TABLE IF NOT EXISTS recsui.perspective_items (
+            perspective_id integer NOT NULL REFERENCES recsui.perspectives (id) ON DELETE CASCADE,
+            section text NOT NULL CHECK (section IN ('column_state', 'sort_model', 'filter_model')),
+            name text NOT NULL,
+            -- '' for column_state, whose items are keyed by name alone.
+            view text NOT NULL DEFAULT '',
+            position integer NOT NULL,
+            item jsonb NOT NULL,
+            PRIMARY KEY (perspective_id, section, name, view)
+        );
+        CREATE INDEX IF NOT EXISTS perspective_items_item_gin
+            ON recsui.perspective_items USING gin (item jsonb_path_ops);
+        CREATE INDEX IF NOT EXISTS perspective_items_filters_gin
+            ON recsui.perspective_items USING gin ((item -> 'filters'));
+        -- The perspectives table with its sections rebuilt from the item rows. Sections
+        -- a query does not select are not aggregated.
+        CREATE OR REPLACE VIEW recsui.perspectives_assembled AS
+        SELECT p.id, p.username, p.layout_name, p.updated_by,
+               s.column_state, s.sort_model, s.filter_model,
+               p.updated_time, p.version
+        FROM recsui.perspectives AS p
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(jsonb_agg(i.item ORDER BY i.position) FILTER (WHERE i.section = 'column_state'),
+                         '[]'::jsonb) AS column_state,
+                COALESCE(jsonb_agg(i.item ORDER BY i.position) FILTER (WHERE i.section = 'sort_model'),
+                         '[]'::jsonb) AS sort_model,
+                COALESCE(jsonb_agg(i.item ORDER BY i.position) FILTER (WHERE i.section = 'filter_model'),
+                         '[]'::jsonb) AS filter_model
+            FROM recsui.perspective_items AS i
+            WHERE i.perspective_id = p.id
+        ) AS s;
+        """,
+    ),
+    (
+        7,
+        "sort_model/filter_model items stored with \"filters\": \"\" rewritten to {}",
+        # Older clients saved an empty filters as "", which ViewSetting reads as {}. Reads now
+        # return the stored JSON as it is, so the rows are normalized once. The touched rows get a
+        # new updated_time and version, so their ETags (and cached bodies) change with them.
+        """
+        UPDATE recsui.perspectives AS p
+        SET sort_model = CASE WHEN jsonb_typeof(p.sort_model) <> 'array' THEN p.sort_model ELSE COALESCE((
+                SELECT jsonb_agg(CASE WHEN e.item -> 'filters' = '""'::jsonb
+                                      THEN jsonb_set(e.item, '{filters}', '{}'::jsonb) ELSE e.item END
+                                 ORDER BY e.n)
+                FROM jsonb_array_elements(p.sort_model) WITH ORDINALITY AS e(item, n)), '[]'::jsonb) END,
+            filter_model = CASE WHEN jsonb_typeof(p.filter_model) <> 'array' THEN p.filter_model ELSE COALESCE((
+                SELECT jsonb_agg(CASE WHEN e.item -> 'filters' = '""'::jsonb
+                                      THEN jsonb_set(e.item, '{filters}', '{}'::jsonb) ELSE e.item END
+                                 ORDER BY e.n)
+                FROM jsonb_array_elements(p.filter_model) WITH ORDINALITY AS e(item, n)), '[]'::jsonb) END,
+            updated_time = now(),
+            version = p.version + 1
+        WHERE p.sort_model @? '$[*] ? (@.filters == "")' OR p.filter_model @? '$[*] ? (@.filters == "")';
+        WITH fixed AS (
+            UPDATE recsui.perspective_items
+            SET item = jsonb_set(item, '{filters}', '{}'::jsonb)
+            WHERE section IN ('sort_model', 'filter_model') AND item -> 'filters' = '""'::jsonb
+            RETURNING perspective_id
+        )
+        UPDATE recsui.perspectives
+        SET updated_time = now(), version = version + 1
+        WHERE id IN (SELECT perspective_id FROM fixed);
+        """,
+    ),
+]
+
+# The table as it existed before migrations were introduced. Only created when
+# missing (a fresh database); migrations are applied on top of it.
+_CREATE_BASELINE = """
+CREATE SCHEMA IF NOT EXISTS recsui;
+CREATE TABLE IF NOT EXISTS recsui.perspectives (
+    id serial PRIMARY KEY,
+    username varchar NOT NULL,
+    layout_name varchar NOT NULL,
+    updated_by varchar NOT NULL,
+    column_state jsonb NOT NULL DEFAULT '[]'::jsonb,
+    sort_model jsonb NOT NULL DEFAULT '[]'::jsonb,
+    filter_model jsonb NOT NULL DEFAULT '[]'::jsonb,
+    updated_time timestamptz DEFAULT now()
+);
+"""
+
+_CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS recsui.schema_migrations (
+    version integer PRIMARY KEY,
+    description text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+
+def current_version(conn: connection) -> int:
+    """Returns the highest applied migration version (0 for a fresh database). Read-only."""
+    with conn.cursor() as curr:
+        curr.execute("SELECT to_regclass('recsui.schema_migrations') IS NOT NULL;")
+        if curr.fetchone()[0]:
+            curr.execute("SELECT COALESCE(MAX(version), 0) FROM recsui.schema_migrations;")
+            version = curr.fetchone()[0]
+        else:
+            version = 0
+    conn.rollback()
+    return version
+
+
+def upgrade(conn: connection) -> List[int]:
+    """Creates the baseline table if missing, applies every pending migration and returns their versions."""
+    with conn.cursor() as curr:
+        curr.execute(_CREATE_BASELINE)
+        curr.execute(_CREATE_VERSION_TABLE)
+    conn.commit()
+    applied = []
+    version = current_version(conn)
+    for migration_version, description, step in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        try:
+            if callable(step):
+                step(conn)
+            with conn.cursor() as curr:
+                if not callable(step):
+                    curr.execute(step)
+                curr.execute(
+                    "INSERT INTO recsui.schema_migrations (version, description) VALUES (%s, %s);",
+                    (migration_version, description)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration_version)
+        print(f"Applied migration {migration_version}: {description}")
+    return applied
+
+
+# Moves the sections of every perspective that has any into item rows, then empties
+# the JSONB columns. When a section repeats a key, its last occurrence is kept.
+_CONVERT_TO_ITEMS = """
+DELETE FROM recsui.perspective_items AS i
+USING recsui.perspectives AS p
+WHERE i.perspective_id = p.id
+  AND (p.column_state <> '[]'::jsonb OR p.sort_model <> '[]'::jsonb OR p.filter_model <> '[]'::jsonb);
+INSERT INTO recsui.perspective_items (perspective_id, section, name, view, position, item)
+SELECT DISTINCT ON (p.id, s.section, e.item ->> 'name', s.view)
+       p.id, s.section, e.item ->> 'name', s.view, e.ord, e.item
+FROM recsui.perspectives AS p
+CROSS JOIN LATERAL (VALUES ('column_state', p.column_state), ('sort_model', p.sort_model),
+                           ('filter_model', p.filter_model)) AS sections(section, items)
+CROSS JOIN LATERAL jsonb_array_elements(sections.items) WITH ORDINALITY AS e(item, ord)
+CROSS JOIN LATERAL (SELECT sections.section,
+                           CASE WHEN sections.section = 'column_state' THEN '' ELSE e.item ->> 'view' END
+                           AS view) AS s
+ORDER BY p.id, s.section, e.item ->> 'name', s.view, e.ord DESC;
+UPDATE recsui.perspectives
+SET column_state = '[]'::jsonb, sort_model = '[]'::jsonb, filter_model = '[]'::jsonb
+WHERE column_state <> '[]'::jsonb OR sort_model <> '[]'::jsonb OR filter_model <> '[]'::jsonb;
+"""
+
+# Writes the assembled sections of every perspective that has item rows back into
+# the JSONB columns, then deletes the rows.
+_CONVERT_TO_BLOBS = """
+UPDATE recsui.perspectives AS p
+SET column_state = a.column_state, sort_model = a.sort_model, filter_model = a.filter_model
+FROM recsui.perspectives_assembled AS a
+WHERE a.id = p.id AND EXISTS (SELECT 1 FROM recsui.perspective_items AS i WHERE i.perspective_id = p.id);
+DELETE FROM recsui.perspective_items;
+"""
+
+
+def convert(conn: connection, to_items: bool) -> int:
+    """
+    Moves the section data to the item rows (`to_items`) or back to the JSONB
+    columns, in one transaction that blocks writers of both tables. updated_time
+    and version are left alone: the documents, and so the ETags, do not change.
+    Returns the number of perspectives converted.
+    """
+    if current_version(conn) < 6:
+        raise RuntimeError("Migration 6 is not applied; run `upgrade` first.")
+    try:
+        with conn.cursor() as curr:
+            curr.execute("LOCK TABLE recsui.perspectives, recsui.perspective_items IN SHARE ROW EXCLUSIVE MODE;")
+            if to_items:
+                curr.execute("""
+                    SELECT count(*) FROM recsui.perspectives
+                    WHERE column_state <> '[]'::jsonb OR sort_model <> '[]'::jsonb OR filter_model <> '[]'::jsonb;
+                """)
+            else:
+                curr.execute("SELECT count(DISTINCT perspective_id) FROM recsui.perspective_items;")
+            converted = curr.fetchone()[0]
+            curr.execute(_CONVERT_TO_ITEMS if to_items else _CONVERT_TO_BLOBS)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return converted
+
+
+def _section_params() -> Dict[str, Any]:
+    return {'username': 'check', 'layout_name': 'check', 'updated_by': 'check', 'items': '[]'}
+
+
+def _search_params(column: bool, view: bool, filter_field: bool) -> Tuple[Any, ...]:
+    """Sample parameters for `_search_statement`, in the order search_perspectives passes them."""
+    params = []
+    if column:
+        params += ['[{"defaultColumns": ["check"]}]', '["check"]', '["check"]']
+    if view:
+        params += ['[{"view": "check"}]'] * 3
+    if filter_field:
+        params.append('["check"]')
+    return (0, *params, 100)
+
+
+# The projection checked: one view of column_state, paged, read by username.
+_PROJECTION_ARGS = ('username', ('column_state', 'updated_time'), True, True, True)
+_PROJECTION_PARAMS = {'key': 'check', 'view': 'check', 'first': 0, 'last': 99}
+# The fields modify_perspective_fields is checked with (a section and a plain column).
+_FIELDS = ('layout_name', 'column_state')
+
+# Every query the Postgres services issue, taken from the same constants and
+# statement builders they use, with sample parameters and the index it must be
+# able to use (None: a full scan is expected; a tuple: any of those indexes is fine).
+# (name, SQL, params, expected index)
+QUERY_CHECKS: List[Tuple[str, str, Any, Union[None, str, Tuple[str, ...]]]] = [
+    ("get_perspective_by_id", _SELECT_BY_ID_QUERY, (1,), "perspectives_pkey"),
+    ("get_perspective_by_username", _SELECT_BY_USERNAME_QUERY, ('check',), "perspectives_username_key"),
+    ("load_perspective_document", _DOCUMENT_BY_USERNAME_QUERY, ('check',), "perspectives_username_key"),
+    ("load_perspective_projection", _projection_statement(*_PROJECTION_ARGS)[1], _PROJECTION_PARAMS,
+     "perspectives_username_key"),
+    ("get_perspective_etag_by_username", _ETAG_BY_USERNAME_QUERY, ('check',), "perspectives_username_key"),
+    ("get_perspectives_page", _SELECT_PAGE_QUERY, (0, 100), "perspectives_pkey"),
+    ("iter_perspectives", _SELECT_ORDERED_QUERY, None, None),
+    ("get_all_perspectives", _SELECT_ALL_QUERY, None, None),
+    ("update_perspective (If-Match)", _update_statement('id', ('layout_name',), True)[1],
+     ('check', 1, [datetime.now(timezone.utc)]), ("perspectives_pkey", "perspectives_updated_time_idx")),
+    ("update_perspective_by_username", _update_statement('username', ('layout_name',), False)[1],
+     ('check', 'check'), "perspectives_username_key"),
+    ("delete_perspective", _DELETE_QUERY, (1,), "perspectives_pkey"),
+    ("modify_perspective_fields (read)", _field_statements(_FIELDS)[0][1], ('check',), "perspectives_username_key"),
+    ("modify_perspective_fields (compare-and-swap)", _field_statements(_FIELDS)[1][1], ('check', '[]', 1, 1),
+     "perspectives_pkey"),
+    ("bulk_upsert_perspectives", _BULK_UPSERT_QUERY.replace("%s", _BULK_UPSERT_TEMPLATE, 1),
+     ('check', 'check', 'check', '[]', '[]', '[]'), "perspectives_username_key"),
+] + [
+    (f"modify_section_items {section} ({variant})", query, params, expected)
+    for section in SECTION_MERGE_KEYS
+    for variant, query, params, expected in (
+        ("read", _SECTION_READ_QUERIES[section], ('check',), "perspectives_username_key"),
+        ("compare-and-swap", _SECTION_CAS_QUERIES[section], ('[]', 1, 1), "perspectives_pkey"),
+    )
+] + [
+    (f"search_perspectives ({label})", _search_statement(*criteria)[1], _search_params(*criteria), expected)
+    for label, criteria, expected in (
+        ("column", (True, False, False), "perspectives_column_state_gin"),
+        ("view", (False, True, False), "perspectives_column_state_gin"),
+        ("filter field", (False, False, True), "perspectives_filter_fields_gin"),
+    )
+] + [
+    (f"{kind} {section} ({variant})", query, _section_params(), "perspectives_username_key")
+    for kind, queries in (("upsert_section_items", _SECTION_MERGE_QUERIES),
+                          ("replace_section_items", _SECTION_REPLACE_QUERIES))
+    for section, pair in queries.items()
+    for variant, query in zip(("insert", "update"), pair)
+] + [
+    # The one-row-per-item layout (migration 6, PERSPECTIVE_STORAGE=postgres_items).
+    ("get_perspective_by_id (items)", _ASSEMBLED_BY_ID_QUERY, (1,), "perspectives_pkey"),
+    ("load_perspective_document (items)", _ITEM_DOCUMENT_BY_USERNAME_QUERY, ('check',), "perspective_items_pkey"),
+    ("load_perspective_projection (items)",
+     _projection_statement(*_PROJECTION_ARGS, ItemPerspectiveService._projection_source)[1], _PROJECTION_PARAMS,
+     "perspective_items_pkey"),
+    ("modify_perspective_fields (read, items)", _item_field_statements(_FIELDS)[0][1], ('check',),
+     "perspective_items_pkey"),
+    ("modify_perspective_fields (compare-and-swap, items)", _item_field_statements(_FIELDS)[1][1], ('check', 1, 1),
+     "perspectives_pkey"),
+    ("upsert_section_items column_state (items)", _ITEM_UPSERT_QUERIES['column_state'],
+     {'id': 1, 'items': '[{"name": "check"}]'}, "perspective_items_pkey"),
+    ("delete one column_state item (items)", _ITEM_DELETE_QUERIES['column_state'],
+     {'id': 1, 'keys': '[["check", ""]]'}, "perspective_items_pkey"),
+    ("search_perspectives (view, items)", _item_search_statement(False, True, False)[1],
+     {'after_id': 0, 'view': '{"view": "check"}', 'limit': 100},
+     ("perspective_items_item_gin", "perspective_items_pkey")),
+    ("search_perspectives (filter field, items)", _item_search_statement(False, False, True)[1],
+     {'after_id': 0, 'filter_field': 'check', 'limit': 100},
+     ("perspective_items_filters_gin", "perspective_items_pkey")),
+]
+
+
+def _plan_indexes(plan: Dict[str, Any], used: set, seq_scans: set):
+    """Collects index names (including ON CONFLICT arbiters) and seq-scanned relations from a JSON plan."""
+    if plan.get("Index Name"):
+        used.add(plan["Index Name"])
+    used.update(plan.get("Conflict Arbiter Indexes", []))
+    if plan.get("Node Type") == "Seq Scan":
+        seq_scans.add(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        _plan_indexes(child, used, seq_scans)
+
+
+def check(conn: connection) -> bool:
+    """
+    EXPLAINs every query in QUERY_CHECKS and verifies it can use its expected index,
+    then prints the index usage counters. Returns False if any query cannot.
+
+    Sequential scans are disabled for the EXPLAIN so that a small table does not
+    hide a missing index: the planner only falls back to a seq scan when no index
+    can serve the query.
+    """
+    ok = True
+    planned = set()
+    with conn.cursor() as curr:
+        curr.execute("SET LOCAL enable_seqscan = off;")
+        for name, query, params, expected in QUERY_CHECKS:
+            curr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = curr.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used, seq_scans = set(), set()
+            _plan_indexes(plan[0]["Plan"], used, seq_scans)
+            planned.update(used)
+            acceptable = (expected,) if isinstance(expected, str) else expected or ()
+            passed = expected is None or (bool(used.intersection(acceptable)) and "perspectives" not in seq_scans)
+            ok = ok and passed
+            detail = ", ".join(sorted(used)) or "no index"
+            if seq_scans:
+                detail += f"; seq scan on {', '.join(sorted(seq_scans))}"
+            print(f"{'ok  ' if passed else 'FAIL'} {name:<56} expected {' or '.join(acceptable) or '-'}; uses {detail}")
+
+        curr.execute(
+            """
+            SELECT indexrelname, idx_scan FROM pg_stat_user_indexes
+            WHERE schemaname = 'recsui' AND relname IN ('perspectives', 'perspective_items')
+            ORDER BY indexrelname;
+            """
+        )
+        print("\nIndex usage since the statistics were last reset:")
+        for index_name, scans in curr.fetchall():
+            note = "" if index_name in planned else " (not used by any service query)"
+            print(f"  {index_name:<40} {scans:>12} scans{note}")
+    conn.rollback()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the recsui.perspectives schema.")
+    parser.add_argument("command", choices=["upgrade", "status", "check", "to-items", "to-blobs"])
+    args = parser.parse_args()
+
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        if args.command == "upgrade":
+            if not upgrade(conn):
+                print("Schema is up to date.")
+        elif args.command == "check":
+            if not check(conn):
+                sys.exit(1)
+        elif args.command in ("to-items", "to-blobs"):
+            converted = convert(conn, to_items=args.command == "to-items")
+            print(f"Converted {converted} perspectives to the {args.command[3:]} layout.")
+        else:
+            version = current_version(conn)
+            latest = MIGRATIONS[-1][0]
+            print(f"Current version: {version} (latest: {latest})")
+    finally:
+        pool.putconn(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Bulk dump and load of recsui.perspectives through COPY.
+
+Dump streams the table with COPY ... TO STDOUT into NDJSON or CSV. Load streams
+a file back with COPY FROM STDIN into a temporary staging table and merges it
+into recsui.perspectives by username (the last row wins for a repeated
+username). Rows are validated against PerspectiveCreate in parallel worker
+processes while the file is being streamed. Memory use is bounded by
+--batch-size, not by the file size.
+
+Run from the PerspectiveAPIProject directory:
+
+    python -m api.database.perspective_copy dump perspectives.ndjson
+    python -m api.database.perspective_copy dump perspectives.csv --format csv
+    python -m api.database.perspective_copy load perspectives.ndjson --workers 4
+
+id, version and updated_time are not carried over: loaded rows get new ids in
+the target environment, and updated_time is set to the load time so ETags
+issued there change.
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .database import get_pool
+from ..schemas.perspective import PerspectiveCreate
+
+COLUMNS = ("username", "layout_name", "updated_by", "column_state", "sort_model", "filter_model")
+JSON_COLUMNS = ("column_state", "sort_model", "filter_model")
+
+_DUMP_SELECT = """
+    SELECT username, layout_name, updated_by, column_state, sort_model, filter_model, updated_time
+    FROM recsui.perspectives ORDER BY id
+"""
+# row_to_json never emits raw control characters, so a CSV COPY whose quote and
+# delimiter are control characters passes the JSON text through unescaped.
+_DUMP_NDJSON = f"COPY (SELECT row_to_json(p) FROM ({_DUMP_SELECT}) AS p) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02');"
+_DUMP_CSV = f"COPY ({_DUMP_SELECT}) TO STDOUT WITH (FORMAT csv, HEADER true);"
+
+_CREATE_STAGING = """
+    CREATE TEMP TABLE perspectives_staging (
+        seq bigserial,
+        username text,
+        layout_name text,
+        updated_by text,
+        column_state jsonb,
+        sort_model jsonb,
+        filter_model jsonb
+    ) ON COMMIT DROP;
+"""
+_COPY_STAGING = f"COPY perspectives_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv);"
+_MERGE_STAGING = f"""
+    WITH merged AS (
+        INSERT INTO recsui.perspectives AS p ({', '.join(COLUMNS)})
+        SELECT DISTINCT ON (username) {', '.join(COLUMNS)}
+        FROM perspectives_staging
+        ORDER BY username, seq DESC
+        ON CONFLICT (username) DO UPDATE SET
+            layout_name = EXCLUDED.layout_name,
+            updated_by = EXCLUDED.updated_by,
+            column_state = EXCLUDED.column_state,
+            sort_model = EXCLUDED.sort_model,
+            filter_model = EXCLUDED.filter_model,
+            updated_time = now(),
+            version = p.version + 1
+        RETURNING (p.xmax = 0) AS created
+    )
+    SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM merged;
+"""
+
+
+class _Progress:
+    """Prints rows, bytes and throughput to stderr at most every `interval` seconds."""
+
+    def __init__(self, label: str, interval: float = 2.0):
+        self.label = label
+        self.interval = interval
+        self.rows = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def add(self, rows: int, nbytes: int):
+        self.rows += rows
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report(final=False)
+
+    def report(self, final: bool = True):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        prefix = "done" if final else "..."
+        print(
+            f"{self.label} {prefix} {self.rows} rows, {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+            f"({self.rows / elapsed:.0f} rows/s, {self.bytes / 1e6 / elapsed:.1f} MB/s)",
+            file=sys.stderr
+        )
+
+
+class _CountingWriter:
+    """File wrapper handed to copy_expert that counts rows and bytes as they are written."""
+
+    def __init__(self, fileobj, progress: _Progress, header_lines: int = 0):
+        self._fileobj = fileobj
+        self._progress = progress
+        self._header_lines = header_lines
+
+    def write(self, data):
+        self._fileobj.write(data)
+        rows = data.count(b"\n" if isinstance(data, bytes) else "\n")
+        skipped = min(rows, self._header_lines)
+        self._header_lines -= skipped
+        self._progress.add(rows - skipped, len(data))
+
+
+class _IteratorReader(io.RawIOBase):
+    """Exposes an iterator of encoded chunks as the readable file copy_expert expects."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def dump(path: str, fmt: str):
+    """Streams the whole table into `path` as NDJSON or CSV."""
+    pool = get_pool()
+    conn = pool.getconn()
+    progress = _Progress("dump")
+    try:
+        with open(path, "wb") as out, conn.cursor() as curr:
+            writer = _CountingWriter(out, progress, header_lines=1 if fmt == "csv" else 0)
+            curr.copy_expert(_DUMP_NDJSON if fmt == "ndjson" else _DUMP_CSV, writer)
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+    progress.report()
+
+
+def _read_records(path: str, fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yields (line_number, raw record) pairs without loading the file into memory."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+        else:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, row
+
+
+def _validate_record(item: Tuple[int, object]) -> Tuple[int, bool, str]:
+    """
+    Worker-process validation of one record against PerspectiveCreate.
+
+    Returns (line_number, ok, payload): on success payload is the CSV line to COPY
+    into the staging table, otherwise it is the error message.
+    """
+    line_number, raw = item
+    try:
+        if isinstance(raw, str):
+            record = json.loads(raw)
+        else:
+            record = {k: v for k, v in raw.items() if k in COLUMNS}
+            for column in JSON_COLUMNS:
+                if record.get(column):
+                    record[column] = json.loads(record[column])
+        perspective = PerspectiveCreate.model_validate(record)
+    except (ValueError, ValidationError) as e:
+        return line_number, False, str(e).replace("\n", " ")
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow([
+        perspective.username,
+        perspective.layout_name,
+        perspective.updated_by,
+        json.dumps([cs.model_dump() for cs in perspective.column_state]),
+        json.dumps([sm.model_dump() for sm in perspective.sort_model]),
+        json.dumps([fm.model_dump() for fm in perspective.filter_model]),
+    ])
+    return line_number, True, out.getvalue()
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validated_lines(records: Iterator, workers: multiprocessing.Pool, batch_size: int,
+                     progress: _Progress, errors: List[str], max_errors_shown: int) -> Iterator[bytes]:
+    """
+    Validates records in the worker pool, one batch ahead of the COPY, and yields the
+    encoded CSV lines of the valid ones. At most two batches are in memory at a time.
+    """
+    pending = None
+    for batch in _batched(records, batch_size):
+        submitted = workers.map_async(_validate_record, batch, chunksize=max(1, batch_size // 64))
+        if pending is not None:
+            yield from _drain(pending.get(), progress, errors, max_errors_shown)
+        pending = submitted
+    if pending is not None:
+        yield from _drain(pending.get(), progress, errors, max_errors_shown)
+
+
+def _drain(results, progress: _Progress, errors: List[str], max_errors_shown: int) -> Iterator[bytes]:
+    for line_number, ok, payload in results:
+        if ok:
+            data = payload.encode("utf-8")
+            progress.add(1, len(data))
+            yield data
+        else:
+            if len(errors) < max_errors_shown:
+                print(f"line {line_number}: {payload}", file=sys.stderr)
+            errors.append(str(line_number))
+
+
+def load(path: str, fmt: str, workers: int, batch_size: int, max_errors_shown: int = 20):
+    """Validates and streams `path` into a staging table, then merges it by username."""
+    errors: List[str] = []
+    progress = _Progress("load")
+    # Start the workers before any database connection exists so none is inherited by fork.
+    with multiprocessing.Pool(workers) as worker_pool:
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as curr:
+                curr.execute(_CREATE_STAGING)
+                lines = _validated_lines(_read_records(path, fmt), worker_pool, batch_size,
+                                         progress, errors, max_errors_shown)
+                curr.copy_expert(_COPY_STAGING, _IteratorReader(lines))
+                curr.execute(_MERGE_STAGING)
+                created, updated = curr.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+
+    progress.report()
+    print(f"merged: {created} created, {updated} updated, {len(errors)} invalid rows skipped", file=sys.stderr)
+
+
+def _format_for(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    dump_parser = subparsers.add_parser("dump", help="write the table to a file")
+    dump_parser.add_argument("path")
+    dump_parser.add_argument("--format", choices=["ndjson", "csv"])
+
+    load_parser = subparsers.add_parser("load", help="validate a file and merge it into the table")
+    load_parser.add_argument("path")
+    load_parser.add_argument("--format", choices=["ndjson", "csv"])
+    load_parser.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    load_parser.add_argument("--batch-size", type=int, default=5000, help="records validated per round")
+
+    args = parser.parse_args()
+    fmt = _format_for(args.path, args.format)
+    if args.command == "dump":
+        dump(args.path, fmt)
+    else:
+        load(args.path, fmt, args.workers, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
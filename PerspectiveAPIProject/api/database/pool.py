@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+
+class PoolTimeoutError(PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of psycopg2 connections.
+
+    - At most `maxconn` physical connections are open at any time; callers block
+      for up to `timeout` seconds when all of them are checked out.
+    - `minconn` connections are opened eagerly when the pool is created.
+    - The search_path is set once per physical connection, not per checkout.
+    - Connections that have been idle longer than `health_check_interval` seconds
+      are pinged on checkout and replaced if the ping fails.
+    - Connections are rolled back before they go back into the pool, so a
+      request can never leak an open transaction into the next one.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, schema: str, timeout: float = 5.0,
+                 health_check_interval: float = 30.0, **connect_kwargs: Any):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1.")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.schema = schema
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs: Dict[str, Any] = connect_kwargs
+
+        # Idle connections paired with the monotonic time they were returned.
+        self._idle: Deque[Tuple[connection, float]] = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self) -> connection:
+        """Opens a new physical connection and prepares its session state."""
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with conn.cursor() as curr:
+            curr.execute(sql.SQL("SET search_path TO {};").format(sql.Identifier(self.schema)))
+        # SET is transactional, so commit it to make it stick for the whole session.
+        conn.commit()
+        print("Successfully connected to the database.")
+        return conn
+
+    def _is_healthy(self, conn: connection, idle_since: float) -> bool:
+        """Cheap liveness check; only round-trips to the server for long-idle connections."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as curr:
+                curr.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: connection):
+        """Closes a connection and frees its slot in the pool."""
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self) -> connection:
+        """
+        Checks a healthy connection out of the pool, opening a new one if the pool
+        has not reached `maxconn` yet.
+
+        Raises:
+            PoolTimeoutError: If no connection became available within `timeout` seconds.
+            psycopg2.Error: If a new connection could not be opened.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Connection pool is closed.")
+                    if self._idle:
+                        # LIFO keeps the most recently used (warmest) connections busy.
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn, idle_since = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a database connection."
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn: connection, close: bool = False):
+        """Returns a connection to the pool, discarding it if it is broken or `close` is set."""
+        if conn is None:
+            return
+        if close or self._closed or conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Closes every idle connection and refuses further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Returns a snapshot of the pool's occupancy."""
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle)}
@@ -0,0 +1,105 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from psycopg2 import errors
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection, cursor
+
+# psycopg2 placeholders: %(name)s, %s and the escaped literal %%.
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+Params = Union[None, Sequence[Any], Dict[str, Any]]
+
+
+@lru_cache(maxsize=1024)
+def _to_positional(query: str) -> Tuple[str, Tuple[Union[int, str], ...]]:
+    """
+    Rewrites psycopg2 placeholders as $1..$n for PREPARE.
+
+    Returns the rewritten SQL and, for each $n in order, the key of its value in
+    the params: an index for %s, a name for %(name)s (a repeated name reuses
+    the same $n).
+    """
+    keys: List[Union[int, str]] = []
+    positions: Dict[str, int] = {}
+
+    def replace(match: "re.Match") -> str:
+        token = match.group(0)
+        if token == "%%":
+            return "%"
+        name = match.group(1)
+        if name is None:
+            keys.append(len(keys))
+            return f"${len(keys)}"
+        if name not in positions:
+            keys.append(name)
+            positions[name] = len(keys)
+        return f"${positions[name]}"
+
+    return _PLACEHOLDER.sub(replace, query), tuple(keys)
+
+
+class PreparingConnection(connection):
+    """
+    psycopg2 connection that prepares statements server-side on first use.
+
+    Prepared statements live as long as the session (a ROLLBACK does not drop
+    them), so each pooled connection parses and plans every statement once and
+    afterwards only sends `EXECUTE name (...)` with the parameters.
+
+    A statement whose result type changed under it (a migration altered a table
+    or view it reads) fails with "cached plan must not change result type". It
+    is then deallocated and prepared again: at once when the failing call
+    started the transaction, else on its next use after the caller rolls back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: Dict[str, str] = {}
+        # Names still allocated server-side whose plan went stale; deallocated before re-preparing.
+        self.stale: Set[str] = set()
+
+    def execute_prepared(self, curr: cursor, name: str, query: str, params: Params = None):
+        """Executes `query` as the prepared statement `name`, preparing it first if needed."""
+        started_transaction = self.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        try:
+            self._execute_prepared(curr, name, query, params)
+        except errors.FeatureNotSupported as e:
+            if "cached plan must not change result type" not in str(e):
+                raise
+            self.prepared.pop(name, None)
+            self.stale.add(name)
+            if not started_transaction:
+                raise
+            self.rollback()
+            self._execute_prepared(curr, name, query, params)
+
+    def _execute_prepared(self, curr: cursor, name: str, query: str, params: Params):
+        positional, keys = _to_positional(query)
+        if name not in self.prepared:
+            if name in self.stale:
+                curr.execute(f"DEALLOCATE {name};")
+                self.stale.discard(name)
+            curr.execute(f"PREPARE {name} AS {positional.rstrip().rstrip(';')}")
+            self.prepared[name] = query
+        elif self.prepared[name] != query:
+            raise ValueError(f"Prepared statement name '{name}' is already used by a different query.")
+
+        if not keys:
+            curr.execute(f"EXECUTE {name};")
+            return
+        values = [params[key] for key in keys]
+        curr.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))});", values)
+
+
+def execute_statement(curr: cursor, name: str, query: str, params: Params = None,
+                      conn: Optional[connection] = None):
+    """
+    Runs `query` as the prepared statement `name` when the cursor's connection is a
+    PreparingConnection, and as a plain (re-parsed) statement otherwise.
+    """
+    conn = conn if conn is not None else curr.connection
+    if isinstance(conn, PreparingConnection):
+        conn.execute_prepared(curr, name, query, params)
+    else:
+        curr.execute(query, params)
@@ -0,0 +1,274 @@
+"""
+Per-request query accounting and slow-query capture.
+
+`get_db` hands each request a ProfilingCursor, which counts round trips and the
+time spent in them. At teardown, `check_query_budget` logs a warning when a
+request ran more than DB_QUERY_BUDGET queries or spent more than
+DB_TIME_BUDGET_MS in them. That makes an extra round trip added to a route
+visible.
+
+A statement that takes longer than DB_SLOW_QUERY_MS is captured into a bounded
+ring buffer (`slow_queries`) together with its plan. Reads are re-run under
+EXPLAIN (ANALYZE, BUFFERS). Writes only get a plain EXPLAIN, because ANALYZE
+would apply them a second time. A statement is explained at most once per
+DB_SLOW_QUERY_EXPLAIN_INTERVAL seconds.
+
+Entries never hold request data: the statement is stored as its template (the
+prepared query, or the SQL before parameters are bound) and the literals left
+in it and in the plan are replaced by `?`. The buffer is served at
+GET /api/v1/perspectives/db/slow_queries only to callers that send
+DB_SLOW_QUERY_ADMIN_TOKEN in an X-Admin-Token header; with no token set the
+route answers 404.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import psycopg2
+from flask import has_request_context, request
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection, cursor
+from psycopg2.extras import DictCursor
+
+from ..metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Per-request budget: warn when a request runs more queries, or spends longer in them (0 disables a check).
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "5"))
+DB_TIME_BUDGET_MS = float(os.getenv("DB_TIME_BUDGET_MS", "250"))
+# Statements slower than this are captured with their plan (0 disables capture).
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+# Capacity of the slow-query ring buffer.
+DB_SLOW_QUERY_BUFFER_SIZE = int(os.getenv("DB_SLOW_QUERY_BUFFER_SIZE", "50"))
+# Seconds before the same statement is explained again.
+DB_SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", "60"))
+# X-Admin-Token required to read or clear the slow-query buffer; unset disables those routes.
+DB_SLOW_QUERY_ADMIN_TOKEN = os.getenv("DB_SLOW_QUERY_ADMIN_TOKEN", "")
+
+# Captured statement text is truncated to this many characters.
+_MAX_STATEMENT_LENGTH = 4000
+_EXECUTE = re.compile(r"\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+_EXPLAINABLE = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+# Anything that may modify data; row-locking clauses (FOR [NO KEY] UPDATE) do not count.
+_WRITE = re.compile(r"\b(INSERT|DELETE|MERGE|TRUNCATE)\b|(?<!FOR )(?<!KEY )\bUPDATE\b", re.IGNORECASE)
+# Literals redacted from captured statements and plans: quoted strings, and numbers
+# that are not part of an identifier or a $n parameter.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?\b")
+# Plan lines whose numbers are values rather than costs, rows or timings.
+_PLAN_CONDITION = re.compile(r"(Cond|Filter): ")
+
+
+def _redact_statement(sql: str) -> str:
+    """`sql` with every string and number literal replaced by `?`."""
+    return _NUMBER_LITERAL.sub("?", _STRING_LITERAL.sub("'?'", sql))
+
+
+def _redact_plan(plan: str) -> str:
+    """`plan` with its string literals, and the numbers in its Cond/Filter lines, replaced by `?`."""
+    lines = []
+    for line in plan.split("\n"):
+        line = _STRING_LITERAL.sub("'?'", line)
+        condition = _PLAN_CONDITION.search(line)
+        if condition is not None:
+            line = line[:condition.end()] + _NUMBER_LITERAL.sub("?", line[condition.end():])
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _route() -> Optional[str]:
+    if not has_request_context():
+        return None
+    return f"{request.method} {request.url_rule.rule if request.url_rule is not None else request.path}"
+
+
+class TimedCursor(DictCursor):
+    """DictCursor that counts the time spent in each call towards the request's 'db' phase."""
+
+    def execute(self, query, vars=None):
+        with timed('db'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with timed('db'):
+            return super().executemany(query, vars_list)
+
+    def callproc(self, procname, vars=None):
+        with timed('db'):
+            return super().callproc(procname, vars)
+
+    def fetchone(self):
+        with timed('db'):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with timed('db'):
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        with timed('db'):
+            return super().fetchall()
+
+
+class ProfilingCursor(TimedCursor):
+    """
+    TimedCursor that also counts its round trips and their time, and captures
+    statements slower than DB_SLOW_QUERY_MS into `slow_queries`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Captured now: the budget is checked at app-context teardown, after the request is gone.
+        self.route = _route()
+        self.query_count = 0
+        self.query_seconds = 0.0
+        # First line of every statement, for the budget warning.
+        self.statements: List[str] = []
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        finally:
+            elapsed = self._count(query, time.perf_counter() - start)
+        if DB_SLOW_QUERY_MS and elapsed * 1000 >= DB_SLOW_QUERY_MS:
+            slow_queries.capture(self, query, elapsed)
+        return result
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._count(query, time.perf_counter() - start)
+
+    def callproc(self, procname, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().callproc(procname, vars)
+        finally:
+            self._count(procname, time.perf_counter() - start)
+
+    def _count(self, query, elapsed: float) -> float:
+        self.query_count += 1
+        self.query_seconds += elapsed
+        text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+        self.statements.append(text.strip().split('\n', 1)[0][:120])
+        return elapsed
+
+
+def check_query_budget(curr: Optional[cursor]):
+    """Logs a warning if the request behind `curr` exceeded the query count or time budget."""
+    if not isinstance(curr, ProfilingCursor):
+        return
+    over_count = DB_QUERY_BUDGET and curr.query_count > DB_QUERY_BUDGET
+    over_time = DB_TIME_BUDGET_MS and curr.query_seconds * 1000 > DB_TIME_BUDGET_MS
+    if over_count or over_time:
+        logger.warning(
+            "%s ran %d queries in %.1f ms (budget: %d queries, %.0f ms): %s",
+            curr.route or "request", curr.query_count, curr.query_seconds * 1000,
+            DB_QUERY_BUDGET, DB_TIME_BUDGET_MS, "; ".join(curr.statements),
+        )
+
+
+def _explain(conn: connection, statement: bytes, analyze: bool) -> str:
+    """
+    Plan of `statement`, run on a plain cursor of the same connection so the
+    request's cursor keeps its results. It runs inside a savepoint when a
+    transaction is open, so a failing EXPLAIN does not abort the request's
+    transaction.
+    """
+    prefix = b"EXPLAIN (ANALYZE, BUFFERS) " if analyze else b"EXPLAIN "
+    idle = conn.autocommit or conn.info.transaction_status == TRANSACTION_STATUS_IDLE
+    curr = conn.cursor(cursor_factory=cursor)
+    try:
+        if not idle:
+            curr.execute("SAVEPOINT slow_query_explain")
+        try:
+            curr.execute(prefix + statement)
+            plan = "\n".join(row[0] for row in curr.fetchall())
+        except psycopg2.Error as e:
+            plan = f"EXPLAIN failed: {str(e).strip()}"
+            if not idle:
+                curr.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        if not idle:
+            curr.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        curr.close()
+        if idle and not conn.autocommit:
+            # End the transaction the EXPLAIN itself opened.
+            conn.rollback()
+
+
+class SlowQueryLog:
+    """Thread-safe ring buffer of the most recent slow statements and their plans."""
+
+    def __init__(self, capacity: int = DB_SLOW_QUERY_BUFFER_SIZE):
+        self._entries: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # Statement template -> monotonic time it was last explained.
+        self._explained_at: Dict[str, float] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self._entries.maxlen
+
+    def capture(self, curr: cursor, query, elapsed: float):
+        """Records the statement `curr` just ran, with its plan unless it was explained recently."""
+        text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+        statement = curr.query or b""
+        prepared_query = None
+        execute = _EXECUTE.match(text)
+        if execute is not None:
+            # A PreparingConnection statement: classify it by the query it was prepared from.
+            prepared_query = getattr(curr.connection, 'prepared', {}).get(execute.group(1))
+        source = prepared_query if prepared_query is not None else text
+        if not _EXPLAINABLE.match(source):
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(text)
+            explain = last is None or now - last >= DB_SLOW_QUERY_EXPLAIN_INTERVAL
+            if explain:
+                if len(self._explained_at) >= 1000:
+                    self._explained_at.clear()
+                self._explained_at[text] = now
+
+        analyze = not _WRITE.search(source)
+        if explain:
+            with timed('db'):
+                plan = _redact_plan(_explain(curr.connection, statement, analyze))
+        else:
+            plan = None
+        entry = {
+            "captured_at": datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace("+00:00", "Z"),
+            "duration_ms": round(elapsed * 1000, 3),
+            "route": _route(),
+            # The template, not curr.query: that one has the parameter values bound in.
+            "statement": _redact_statement(source[:_MAX_STATEMENT_LENGTH]),
+            "prepared_statement": execute.group(1) if execute is not None else None,
+            "analyzed": explain and analyze,
+            "plan": plan,
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self) -> List[dict]:
+        """Captured statements, newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._explained_at.clear()
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,60 @@
+"""
+Embedded SQLite database for the `sqlite` storage backend (see services/storage.py).
+
+Each thread gets its own connection to the database file. WAL mode lets readers
+run while a write is in progress. The table mirrors recsui.perspectives; the
+JSON sections are TEXT checked with JSON1's json_valid. The schema is created
+on first connect, so there is no separate migration step.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict
+
+# Database file of the sqlite backend.
+SQLITE_PATH = os.getenv("SQLITE_PATH", "perspectives.sqlite3")
+# Milliseconds a writer waits for the database lock before failing with "database is locked".
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+# NORMAL is durable across application crashes in WAL mode; FULL also survives power loss.
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Page cache per connection, in KiB.
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS perspectives (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    layout_name TEXT NOT NULL,
+    updated_by TEXT NOT NULL,
+    column_state TEXT NOT NULL DEFAULT '[]' CHECK (json_valid(column_state)),
+    sort_model TEXT NOT NULL DEFAULT '[]' CHECK (json_valid(sort_model)),
+    filter_model TEXT NOT NULL DEFAULT '[]' CHECK (json_valid(filter_model)),
+    updated_time TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS perspectives_updated_time_idx ON perspectives (updated_time);
+"""
+
+_local = threading.local()
+
+
+def get_sqlite_connection(path: str = SQLITE_PATH) -> sqlite3.Connection:
+    """
+    Returns this thread's connection to `path`, opening it (and creating the
+    schema) on first use. Connections are in autocommit mode; writers open
+    their transactions explicitly with BEGIN IMMEDIATE.
+    """
+    connections: Dict[str, sqlite3.Connection] = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS};")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
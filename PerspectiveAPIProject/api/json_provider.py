@@ -0,0 +1,106 @@
+"""
+JSON encoding/decoding for the Flask app.
+
+`FastJSONProvider` replaces Flask's stdlib-based provider with orjson when it is
+installed and falls back to the stdlib `json` module otherwise. Both paths
+encode datetimes (ISO 8601, UTC as "Z", matching pydantic's JSON mode), UUIDs,
+pydantic models and the DTOs in api/models natively, so routes can hand models
+and plain dicts straight to `jsonify` without a `model_dump(mode='json')` pass.
+
+`get_request_json` parses request bodies through the same provider and is used
+by the routes instead of `request.json`.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+from typing import Any, Union
+
+from flask import current_app, request
+from flask.json.provider import JSONProvider
+from pydantic import BaseModel
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+from .compression import decode_request_body
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# orjson >= 3.9 can embed pydantic's own serialized output without re-encoding it.
+_Fragment = getattr(orjson, "Fragment", None)
+
+
+def _to_serializable(obj: Any) -> Any:
+    """`default` hook shared by both encoders for types they do not handle natively."""
+    if isinstance(obj, BaseModel):
+        if _Fragment is not None:
+            return _Fragment(obj.model_dump_json())
+        return obj.model_dump(mode='python' if orjson is not None else 'json')
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if isinstance(obj, datetime):
+        text = obj.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, with a stdlib fallback."""
+
+    # Keys are emitted in insertion (schema) order, like the Postgres-built documents.
+    sort_keys = False
+    mimetype = "application/json"
+
+    _ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self.dumps_bytes(obj, **kwargs).decode()
+
+    def dumps_bytes(self, obj: Any, **kwargs: Any) -> bytes:
+        with timed('serialization'):
+            if orjson is not None and not kwargs:
+                return orjson.dumps(obj, default=_to_serializable, option=self._ORJSON_OPTIONS)
+            kwargs.setdefault("default", _to_serializable)
+            kwargs.setdefault("ensure_ascii", False)
+            kwargs.setdefault("separators", (",", ":"))
+            return json.dumps(obj, **kwargs).encode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        with timed('serialization'):
+            if orjson is not None and not kwargs:
+                return orjson.loads(s)
+            return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def get_request_json() -> Any:
+    """
+    Parses the current request's JSON body with the app's JSON provider.
+
+    Same contract as `request.json`: 415 if the Content-Type is not JSON and
+    400 if the body is not valid JSON. Compressed bodies (Content-Encoding) are
+    decoded first, see compression.py.
+    """
+    if not request.is_json:
+        raise UnsupportedMediaType(
+            "Did not attempt to load JSON data because the request Content-Type was not 'application/json'."
+        )
+    try:
+        return current_app.json.loads(decode_request_body(request.get_data(cache=False)))
+    except ValueError as e:
+        raise BadRequest(f"Failed to decode JSON object: {e}")
@@ -0,0 +1,223 @@
+"""
+Request metrics for the Flask app, exposed in the Prometheus text format at /metrics.
+
+- http_request_duration_seconds: latency histogram per route (the URL rule,
+  e.g. /api/v1/perspectives/<int:perspective_id>) and method.
+- http_request_phase_seconds: the same requests split into phases:
+  - db: time spent in cursor calls, see TimedCursor in database/profiling.py;
+  - validation: pydantic validation in the routes;
+  - serialization: JSON encoding and decoding in the app's JSON provider;
+  - other: whatever is left (routing, hooks, cache lookups, ...).
+- http_requests_in_flight: gauge per route and method.
+- http_responses_total: counter per route, method and status code.
+
+Services add their own metrics with `register` (e.g. the write-behind
+counters in services/write_behind.py).
+
+Recording a request costs a few perf_counter() calls, one ContextVar lookup
+per timed phase and one short lock per metric. It is meant to stay on in
+production; METRICS_ENABLED=0 turns it off.
+
+Latency is measured until the view returns its response. For streamed (NDJSON)
+responses, time spent producing the body is not included.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, g, request
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASES = ('db', 'validation', 'serialization')
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Phase -> seconds for the request being handled in this context; None outside requests.
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_phases', default=None)
+
+
+def add_phase_time(phase: str, seconds: float):
+    """Adds `seconds` to a phase of the current request (no-op outside a measured request)."""
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[phase] += seconds
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Times the enclosed block as part of a phase of the current request."""
+    phases = _request_phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] += time.perf_counter() - start
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...], amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = self._header()
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, by route.", ("method", "route"))
+REQUEST_PHASES = Histogram(
+    "http_request_phase_seconds", "Time spent per phase of a request (db, validation, serialization, other).",
+    ("method", "route", "phase"))
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method", "route"))
+RESPONSES = Counter(
+    "http_responses_total", "Responses sent, by status code.", ("method", "route", "status"))
+
+_METRICS: List[_Metric] = [REQUEST_DURATION, REQUEST_PHASES, REQUESTS_IN_FLIGHT, RESPONSES]
+
+
+def register(metric: _Metric) -> _Metric:
+    """Adds a metric defined elsewhere (e.g. by a service) to the /metrics output."""
+    _METRICS.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def _route_labels() -> Tuple[str, str]:
+    # The URL rule, not the path, so ids and usernames do not create new series.
+    return request.method, request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def _start_request():
+    if request.endpoint == 'metrics':
+        return
+    labels = _route_labels()
+    g.metrics_labels = labels
+    g.metrics_start = time.perf_counter()
+    g.metrics_phases_token = _request_phases.set(dict.fromkeys(PHASES, 0.0))
+    REQUESTS_IN_FLIGHT.inc(labels)
+
+
+def _record_response(response: Response) -> Response:
+    labels = g.get('metrics_labels')
+    if labels is None:
+        return response
+    elapsed = time.perf_counter() - g.metrics_start
+    phases = _request_phases.get() or {}
+    REQUEST_DURATION.observe(labels, elapsed)
+    for phase, seconds in phases.items():
+        REQUEST_PHASES.observe(labels + (phase,), seconds)
+    REQUEST_PHASES.observe(labels + ('other',), max(elapsed - sum(phases.values()), 0.0))
+    RESPONSES.inc(labels + (str(response.status_code),))
+    return response
+
+
+def _end_request(exception=None):
+    labels = g.pop('metrics_labels', None)
+    if labels is None:
+        return
+    REQUESTS_IN_FLIGHT.dec(labels)
+    _request_phases.reset(g.pop('metrics_phases_token'))
+
+
+def metrics_route():
+    return Response(render(), mimetype=None, content_type=CONTENT_TYPE)
+
+
+def init_metrics(app: Flask):
+    """Installs the request hooks and the /metrics endpoint (unless METRICS_ENABLED=0)."""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_record_response)
+    app.teardown_request(_end_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_route, methods=['GET'])
@@ -1,10 +1,22 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 import json
 
+# A JSONB section as handed over by psycopg2 (already decoded list) or as raw JSON text.
+RawSection = Union[None, str, bytes, List[Dict[str, Any]]]
+
+
+def _decode_section(raw: RawSection) -> List[Dict[str, Any]]:
+    if raw is None:
+        return []
+    if isinstance(raw, (str, bytes)):
+        return json.loads(raw)
+    return raw
+
 
 class ColumnState:
     """Represents the structure of a single item in the column_state array."""
+    __slots__ = ('name', 'view', 'defaultColumns', 'default')
 
     def __init__(self, name: str, view: str, defaultColumns: List[str], default: bool):
         self.name = name
@@ -12,17 +24,29 @@ class ColumnState:
         self.defaultColumns = defaultColumns
         self.default = default
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ColumnState':
+        return cls(data['name'], data['view'], data['defaultColumns'], data['default'])
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'view': self.view, 'defaultColumns': self.defaultColumns, 'default': self.default}
+
 
 class FilterDetail:
     """Represents the structure of a filter detail."""
+    __slots__ = ('type', 'filter')
 
     def __init__(self, type: str, filter: str):
         self.type = type
         self.filter = filter
 
+    def to_dict(self) -> dict:
+        return {'type': self.type, 'filter': self.filter}
+
 
 class ViewSetting:
     """Represents the structure of a single item in the sort_model or filter_model arrays."""
+    __slots__ = ('name', 'view', 'filters', 'default')
 
     def __init__(self, name: str, view: str, filters: Dict[str, FilterDetail], default: bool):
         self.name = name
@@ -30,24 +54,120 @@ class ViewSetting:
         self.filters = filters
         self.default = default
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ViewSetting':
+        filters = data.get('filters') or {}
+        return cls(
+            name=data['name'],
+            view=data['view'],
+            filters={k: FilterDetail(v['type'], v['filter']) for k, v in filters.items()},
+            default=data['default']
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'view': self.view,
+            'filters': {k: v.to_dict() for k, v in self.filters.items()},
+            'default': self.default,
+        }
+
 
 class Perspective:
     """
     Data Transfer Object (DTO) for the 'perspectives' table.
     This class is not tied to an ORM and is used to represent a database row.
+
+    The JSONB sections are kept as they came from the database (decoded lists or
+    JSON text) and only turned into ColumnState / ViewSetting objects the first
+    time the matching attribute is read; `to_dict` never builds them at all.
     """
+    __slots__ = ('id', 'username', 'layout_name', 'updated_by', 'updated_time', 'version',
+                 '_raw_column_state', '_raw_sort_model', '_raw_filter_model',
+                 '_column_state', '_sort_model', '_filter_model')
 
     def __init__(self, id: int, username: str, layout_name: str, updated_by: str,
-                 column_state: List[ColumnState], sort_model: List[ViewSetting],
-                 filter_model: List[ViewSetting], updated_time: datetime):
+                 column_state: Union[RawSection, List[ColumnState]], sort_model: Union[RawSection, List[ViewSetting]],
+                 filter_model: Union[RawSection, List[ViewSetting]], updated_time: datetime,
+                 version: Optional[int] = None):
         self.id = id
         self.username = username
         self.layout_name = layout_name
         self.updated_by = updated_by
+        self.updated_time = updated_time
+        self.version = version
         self.column_state = column_state
         self.sort_model = sort_model
         self.filter_model = filter_model
-        self.updated_time = updated_time
+
+    @staticmethod
+    def _is_decoded(items, item_type) -> bool:
+        return isinstance(items, list) and bool(items) and isinstance(items[0], item_type)
+
+    @property
+    def column_state(self) -> List[ColumnState]:
+        if self._column_state is None:
+            self._column_state = [ColumnState.from_dict(cs) for cs in _decode_section(self._raw_column_state)]
+            self._raw_column_state = None
+        return self._column_state
+
+    @column_state.setter
+    def column_state(self, value):
+        if self._is_decoded(value, ColumnState):
+            self._column_state, self._raw_column_state = value, None
+        else:
+            self._column_state, self._raw_column_state = None, value
+
+    @property
+    def sort_model(self) -> List[ViewSetting]:
+        if self._sort_model is None:
+            self._sort_model = [ViewSetting.from_dict(sm) for sm in _decode_section(self._raw_sort_model)]
+            self._raw_sort_model = None
+        return self._sort_model
+
+    @sort_model.setter
+    def sort_model(self, value):
+        if self._is_decoded(value, ViewSetting):
+            self._sort_model, self._raw_sort_model = value, None
+        else:
+            self._sort_model, self._raw_sort_model = None, value
+
+    @property
+    def filter_model(self) -> List[ViewSetting]:
+        if self._filter_model is None:
+            self._filter_model = [ViewSetting.from_dict(fm) for fm in _decode_section(self._raw_filter_model)]
+            self._raw_filter_model = None
+        return self._filter_model
+
+    @filter_model.setter
+    def filter_model(self, value):
+        if self._is_decoded(value, ViewSetting):
+            self._filter_model, self._raw_filter_model = value, None
+        else:
+            self._filter_model, self._raw_filter_model = None, value
+
+    @staticmethod
+    def _section_to_dicts(decoded, raw) -> List[Dict[str, Any]]:
+        if decoded is not None:
+            return [item.to_dict() for item in decoded]
+        return _decode_section(raw)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the row as plain dicts/lists in the Perspective schema's key order.
+        Sections that were never accessed are returned as stored, without building objects.
+        """
+        return {
+            'username': self.username,
+            'layout_name': self.layout_name,
+            'updated_by': self.updated_by,
+            'column_state': self._section_to_dicts(self._column_state, self._raw_column_state),
+            'sort_model': self._section_to_dicts(self._sort_model, self._raw_sort_model),
+            'filter_model': self._section_to_dicts(self._filter_model, self._raw_filter_model),
+            'id': self.id,
+            'updated_time': self.updated_time,
+            'version': self.version,
+        }
 
     @staticmethod
     def from_dict(data: dict):
@@ -55,26 +175,15 @@ class Perspective:
         if not data:
             return None
 
-        # Recursively create objects for nested data
-        column_state = [ColumnState(**cs) for cs in data.get('column_state', [])]
-
-        sort_model = []
-        for sm in data.get('sort_model', []):
-            filters = {k: FilterDetail(**v) for k, v in sm.get('filters', {}).items()}
-            sort_model.append(ViewSetting(name=sm['name'], view=sm['view'], filters=filters, default=sm['default']))
-
-        filter_model = []
-        for fm in data.get('filter_model', []):
-            filters = {k: FilterDetail(**v) for k, v in fm.get('filters', {}).items()}
-            filter_model.append(ViewSetting(name=fm['name'], view=fm['view'], filters=filters, default=fm['default']))
-
+        # Sections are decoded lazily, on first attribute access
         return Perspective(
             id=data['id'],
             username=data['username'],
             layout_name=data['layout_name'],
             updated_by=data['updated_by'],
-            column_state=column_state,
-            sort_model=sort_model,
-            filter_model=filter_model,
-            updated_time=data['updated_time']
-        )
\ No newline at end of file
+            column_state=data.get('column_state'),
+            sort_model=data.get('sort_model'),
+            filter_model=data.get('filter_model'),
+            updated_time=data['updated_time'],
+            version=data.get('version')
+        )
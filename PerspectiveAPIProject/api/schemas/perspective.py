@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Union
-from pydantic import BaseModel, Field, model_serializer, validator
+from typing import Optional, List, Dict, Any, Literal, Union
+from pydantic import BaseModel, Field, model_serializer, model_validator, validator
 
 # Schema for the nested filter details within sort and filter models
 class FilterDetail(BaseModel):
@@ -59,6 +59,64 @@ class PerspectiveUpdate(PerspectiveBase):
 class Perspective(PerspectiveBase):
     id: int
     updated_time: datetime
+    version: Optional[int] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Response schemas for the single-item save endpoints.
+# Only the merged section is returned, not the whole perspective.
+class ColumnStateSaveResult(BaseModel):
+    id: int
+    username: str
+    layout_name: str
+    updated_by: str
+    column_state: List[ColumnState]
+    updated_time: datetime
+    version: Optional[int] = None
+
+
+class FilterModelSaveResult(BaseModel):
+    id: int
+    username: str
+    layout_name: str
+    updated_by: str
+    filter_model: List[ViewSetting]
+    updated_time: datetime
+    version: Optional[int] = None
+
+
+class SortModelSaveResult(BaseModel):
+    id: int
+    username: str
+    layout_name: str
+    updated_by: str
+    sort_model: List[ViewSetting]
+    updated_time: datetime
+    version: Optional[int] = None
+
+
+# One operation of a JSON Patch (RFC 6902) document for PATCH /user/<username>.
+# Paths address section items by their merge key instead of by array index, e.g.
+# /column_state/<name>/defaultColumns/- or /filter_model/<name>/<view>/filters/<column>.
+class PatchOperation(BaseModel):
+    op: Literal['add', 'remove', 'replace', 'move', 'copy', 'test']
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(None, alias='from')
+
+    @model_validator(mode='after')
+    def check_operands(self):
+        if self.op in ('add', 'replace', 'test') and 'value' not in self.model_fields_set:
+            raise ValueError(f"'{self.op}' requires a value")
+        if self.op in ('move', 'copy') and self.from_ is None:
+            raise ValueError(f"'{self.op}' requires from")
+        return self
+
+
+# Response of a PATCH: only what a client needs to keep patching (the ETag is also a header).
+class PatchResult(BaseModel):
+    id: int
+    username: str
+    updated_time: datetime
+    version: Optional[int] = None
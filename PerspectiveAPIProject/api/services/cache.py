@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Cache settings. The cache is per-process and only invalidated by writes made in
+# that process: enable it only with a single worker process (see PerspectiveCache).
+PERSPECTIVE_CACHE_ENABLED = os.getenv("PERSPECTIVE_CACHE_ENABLED", "0") == "1"
+# Seconds an entry is served as fresh.
+PERSPECTIVE_CACHE_TTL = float(os.getenv("PERSPECTIVE_CACHE_TTL", "30"))
+# Extra seconds an expired entry may still be served while it is refreshed in the
+# background (stale-while-revalidate). 0 disables it.
+PERSPECTIVE_CACHE_STALE_TTL = float(os.getenv("PERSPECTIVE_CACHE_STALE_TTL", "0"))
+PERSPECTIVE_CACHE_MAX_ENTRIES = int(os.getenv("PERSPECTIVE_CACHE_MAX_ENTRIES", "10000"))
+PERSPECTIVE_CACHE_MAX_BYTES = int(os.getenv("PERSPECTIVE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Rough per-entry bookkeeping cost added to the body size when enforcing max_bytes.
+_ENTRY_OVERHEAD = 200
+
+
+class CacheEntry:
+    """An encoded perspective body together with its ETag."""
+    __slots__ = ('perspective_id', 'username', 'body', 'etag', 'expires_at', 'stale_until', 'refreshing')
+
+    def __init__(self, perspective_id: int, username: str, body: bytes, etag: str,
+                 expires_at: float, stale_until: float):
+        self.perspective_id = perspective_id
+        self.username = username
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.refreshing = False
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.username) + len(self.etag) + _ENTRY_OVERHEAD
+
+
+class PerspectiveCache:
+    """
+    In-process LRU + TTL cache of encoded perspective JSON bodies.
+
+    Entries are stored once per perspective id and are reachable by id or by
+    username. The cache is bounded both by entry count and by total body bytes.
+    Each worker process holds its own cache and a write only invalidates the
+    cache of the process that made it. With several worker processes (gunicorn
+    -w N) the others keep serving the old body, ETag and 304s for up to `ttl`
+    (+ `stale_ttl`) seconds, so PERSPECTIVE_CACHE_ENABLED=1 is only safe with a
+    single worker process (threads are fine).
+
+    Loads that started before an invalidation of the perspective they loaded are
+    discarded when they try to store their result (see `load_token`), so a slow
+    read can never re-insert data that a concurrent write has already replaced.
+    Invalidations are tracked per id and per username; writes to other
+    perspectives do not discard a load.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._ids_by_username: Dict[str, int] = {}
+        self._bytes = 0
+        # Logical clock of invalidations, and the clock value of the latest one per
+        # ('id', id) / ('username', username) key. The oldest records are dropped
+        # beyond max_entries; loads older than `_invalidated_floor` are then discarded.
+        self._clock = 0
+        self._invalidated: "OrderedDict[Tuple[str, Any], int]" = OrderedDict()
+        self._invalidated_floor = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, perspective_id: Optional[int], username: Optional[str]) -> Optional[CacheEntry]:
+        if perspective_id is None:
+            perspective_id = self._ids_by_username.get(username)
+        return self._entries.get(perspective_id) if perspective_id is not None else None
+
+    def get(self, perspective_id: Optional[int] = None,
+            username: Optional[str] = None) -> Tuple[Optional[CacheEntry], Optional[int]]:
+        """
+        Looks up an entry by id or by username.
+
+        Returns (entry, refresh_id): entry is None on a miss; refresh_id is set when a
+        stale entry was served and the caller should refresh that perspective.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(perspective_id, username)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            if now < entry.expires_at:
+                self._entries.move_to_end(entry.perspective_id)
+                self.hits += 1
+                return entry, None
+            if now < entry.stale_until:
+                self._entries.move_to_end(entry.perspective_id)
+                self.stale_hits += 1
+                if entry.refreshing:
+                    return entry, None
+                entry.refreshing = True
+                return entry, entry.perspective_id
+            self._remove(entry)
+            self.misses += 1
+            return None, None
+
+    def load_token(self) -> int:
+        """Returns a token to pass to `put` for a load that is about to start."""
+        with self._lock:
+            return self._clock
+
+    def _invalidated_since(self, token: int, perspective_id: int, username: str) -> bool:
+        return (token < self._invalidated_floor
+                or self._invalidated.get(('id', perspective_id), 0) > token
+                or self._invalidated.get(('username', username), 0) > token)
+
+    def _record_invalidation(self, key: Tuple[str, Any]):
+        self._invalidated[key] = self._clock
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.max_entries:
+            _, dropped = self._invalidated.popitem(last=False)
+            self._invalidated_floor = max(self._invalidated_floor, dropped)
+
+    def put(self, perspective_id: int, username: str, body: bytes, etag: str, token: int):
+        """Stores a body unless this perspective (by id or username) was invalidated since `token` was taken."""
+        now = time.monotonic()
+        entry = CacheEntry(perspective_id, username, body, etag, now + self.ttl, now + self.ttl + self.stale_ttl)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if self._invalidated_since(token, perspective_id, username):
+                return
+            existing = self._entries.get(perspective_id)
+            if existing is not None:
+                self._remove(existing)
+            self._entries[perspective_id] = entry
+            self._ids_by_username[username] = perspective_id
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, oldest = next(iter(self._entries.items()))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, perspective_id: Optional[int] = None, username: Optional[str] = None):
+        """Drops the entry for a perspective, addressed by id, username or both."""
+        with self._lock:
+            self._clock += 1
+            keys = {('id', perspective_id), ('username', username)}
+            for entry in (self._lookup(perspective_id, None), self._lookup(None, username)):
+                if entry is not None:
+                    keys.update((('id', entry.perspective_id), ('username', entry.username)))
+                    self._remove(entry)
+            for key in keys:
+                if key[1] is not None:
+                    self._record_invalidation(key)
+            if username is not None:
+                self._ids_by_username.pop(username, None)
+
+    def release_refresh(self, perspective_id: int):
+        """Clears the refreshing flag once a background refresh has finished, stored or not."""
+        with self._lock:
+            entry = self._entries.get(perspective_id)
+            if entry is not None:
+                entry.refreshing = False
+
+    def clear(self):
+        with self._lock:
+            self._clock += 1
+            self._invalidated.clear()
+            self._invalidated_floor = self._clock
+            self._entries.clear()
+            self._ids_by_username.clear()
+            self._bytes = 0
+
+    def _remove(self, entry: CacheEntry):
+        if self._entries.pop(entry.perspective_id, None) is entry:
+            self._bytes -= entry.size
+        if self._ids_by_username.get(entry.username) == entry.perspective_id:
+            del self._ids_by_username[entry.username]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Process-wide cache shared by every PerspectiveService instance.
+perspective_cache = PerspectiveCache(
+    ttl=PERSPECTIVE_CACHE_TTL,
+    stale_ttl=PERSPECTIVE_CACHE_STALE_TTL,
+    max_entries=PERSPECTIVE_CACHE_MAX_ENTRIES,
+    max_bytes=PERSPECTIVE_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,49 @@
+import os
+import threading
+from typing import Dict
+
+# How many times a read-modify-write is retried after losing a version race.
+PERSPECTIVE_CAS_MAX_RETRIES = int(os.getenv("PERSPECTIVE_CAS_MAX_RETRIES", "5"))
+# Upper bound (seconds, scaled by the attempt number) of the random pause before a retry.
+PERSPECTIVE_CAS_BACKOFF = float(os.getenv("PERSPECTIVE_CAS_BACKOFF", "0.005"))
+
+
+class ConcurrentModificationError(Exception):
+    """Raised when a compare-and-swap write keeps losing to concurrent writers."""
+
+
+class ItemNotFoundError(LookupError):
+    """Raised by a read-modify-write mutation when the item it targets does not exist."""
+
+
+class ConcurrencyStats:
+    """Process-wide counters for optimistic (version-based) writes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.conflicts = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def record(self, attempts: int, succeeded: bool):
+        """Records one read-modify-write that took `attempts` compare-and-swap tries."""
+        with self._lock:
+            self.attempts += attempts
+            lost = attempts if not succeeded else attempts - 1
+            self.conflicts += lost
+            self.retries += attempts - 1
+            if not succeeded:
+                self.exhausted += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "conflicts": self.conflicts,
+                "retries": self.retries,
+                "exhausted": self.exhausted,
+            }
+
+
+concurrency_stats = ConcurrencyStats()
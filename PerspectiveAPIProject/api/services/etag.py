@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+# Content-Encodings whose name is appended to the ETag of a response sent in them (see compression.py).
+ENCODED_ETAG_SUFFIXES = ('zstd', 'br', 'gzip')
+
+
+def make_etag(perspective_id: int, updated_time: datetime) -> str:
+    """
+    Builds the (unquoted) strong ETag of a perspective from its id and updated_time.
+
+    Every write bumps updated_time, so the pair changes whenever the body does.
+    The timestamp is kept in ISO format so it can be turned back into the exact
+    value stored in the database (see `parse_etag`).
+    """
+    return f"{perspective_id}-{updated_time.isoformat()}"
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of the `encoding`-compressed body of the representation tagged `etag`."""
+    return f"{etag}-{encoding}"
+
+
+def strip_encoding(etag: str) -> str:
+    """Inverse of `encoded_etag`: the ETag of the uncompressed representation."""
+    base, _, suffix = etag.rpartition("-")
+    return base if suffix in ENCODED_ETAG_SUFFIXES else etag
+
+
+def parse_etag(etag: str) -> Optional[Tuple[int, datetime]]:
+    """Inverse of `make_etag` (ignoring an encoding suffix). Returns None for tags this service did not issue."""
+    perspective_id, _, timestamp = strip_encoding(etag).partition("-")
+    try:
+        return int(perspective_id), datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+
+
+def updated_times_for(perspective_id: int, etags: Iterable[str]) -> List[datetime]:
+    """Returns the updated_time values encoded in those of `etags` that belong to `perspective_id`."""
+    times = []
+    for etag in etags:
+        parsed = parse_etag(etag)
+        if parsed and parsed[0] == perspective_id:
+            times.append(parsed[1])
+    return times
+
+
+def etag_matches(perspective_id: int, updated_time: datetime, etags: Iterable[str]) -> bool:
+    """True if one of `etags` is the current ETag of the perspective with this id and updated_time."""
+    return updated_time in updated_times_for(perspective_id, etags)
@@ -0,0 +1,544 @@
+"""
+Postgres storage with one row per section item (PERSPECTIVE_STORAGE=postgres_items).
+
+`PerspectiveService` keeps each section in a JSONB array column. Saving one
+column therefore rewrites (and re-TOASTs) the whole array, and concurrent saves
+of different items of the same user compete for the same value. Here every
+column_state, sort_model and filter_model item is a row of
+recsui.perspective_items (migration 6), keyed by (perspective_id, section,
+name, view), and the JSONB columns of recsui.perspectives stay empty:
+
+- Upserting or deleting one item writes that item's row, plus updated_time and
+  version on the parent row. The other items are not read or rewritten.
+- Reads go through the recsui.perspectives_assembled view, which aggregates
+  the items back into the three arrays in one query. Documents, ETags and
+  versions are the same as with the JSONB layout.
+- Whole-section writes (replace, PUT, PATCH, read-modify-writes) compare the
+  stored and the new items and only write the rows that differ. A reordering
+  rewrites the section.
+- Items are ordered by `position`; items merged in are appended after the last
+  one. A section holds each key once: when a write repeats a key, the last
+  occurrence wins.
+
+Every item write updates the parent row first, which locks it, so writers of
+the same perspective are serialized and ETags and versions behave as before.
+
+Existing data is moved between the layouts with
+`python -m api.database.migrations to-items` (and `to-blobs`), while writers
+are stopped and together with the PERSPECTIVE_STORAGE switch. Only the Flask
+app reads this layout.
+"""
+import json
+import random
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import DictCursor, execute_values
+
+from ..models.perspective import Perspective as PerspectiveModel
+from ..schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from .concurrency import (concurrency_stats, ConcurrentModificationError, PERSPECTIVE_CAS_MAX_RETRIES,
+                          PERSPECTIVE_CAS_BACKOFF)
+from .etag import etag_matches, make_etag
+from .perspective import PerspectiveService, _PERSPECTIVE_DOCUMENT, _ROW_COLUMNS, _update_statement
+from .storage import (PreconditionFailedError, SECTION_MERGE_KEYS, UPDATABLE_FIELDS, changed_fields,
+                      merge_section_items, section_items)
+
+# recsui.perspectives with the three sections aggregated from recsui.perspective_items.
+_ASSEMBLED = "recsui.perspectives_assembled"
+
+_PARENT_COLUMNS = "p.id, p.username, p.layout_name, p.updated_by, p.updated_time, p.version"
+
+
+def _item_key(section: str, item: dict) -> Tuple[str, str]:
+    """An item's (name, view) in recsui.perspective_items; column_state items are keyed by name, with view ''."""
+    return item.get('name'), (item.get('view') if 'view' in SECTION_MERGE_KEYS[section] else '')
+
+
+def _section_items_sql(section: str) -> str:
+    """The items of `section` of perspective p.id as a JSONB array, in order."""
+    return (f"(SELECT COALESCE(jsonb_agg(i.item ORDER BY i.position), '[]'::jsonb) "
+            f"FROM recsui.perspective_items AS i WHERE i.perspective_id = p.id AND i.section = '{section}')")
+
+
+def _build_item_upsert_query(section: str) -> str:
+    """
+    Writes the items bound to %(items)s (keys must be unique) into one section of
+    perspective %(id)s. Items already stored keep their position and only their
+    row is updated, and only if it differs; new items are appended in order.
+    """
+    view = "e.item ->> 'view'" if 'view' in SECTION_MERGE_KEYS[section] else "''"
+    return f"""
+        INSERT INTO recsui.perspective_items AS i (perspective_id, section, name, view, position, item)
+        SELECT %(id)s, '{section}', e.item ->> 'name', {view}, tail.position + e.ord, e.item
+        FROM jsonb_array_elements(%(items)s::jsonb) WITH ORDINALITY AS e(item, ord),
+             (SELECT COALESCE(max(position), 0) AS position FROM recsui.perspective_items
+              WHERE perspective_id = %(id)s AND section = '{section}') AS tail
+        ON CONFLICT (perspective_id, section, name, view) DO UPDATE SET item = EXCLUDED.item
+        WHERE i.item IS DISTINCT FROM EXCLUDED.item;
+    """
+
+
+_ITEM_UPSERT_QUERIES = {section: _build_item_upsert_query(section) for section in SECTION_MERGE_KEYS}
+_ITEM_DELETE_QUERIES = {
+    section: f"""
+        DELETE FROM recsui.perspective_items
+        WHERE perspective_id = %(id)s AND section = '{section}'
+          AND (name, view) IN (SELECT k ->> 0, k ->> 1 FROM jsonb_array_elements(%(keys)s::jsonb) AS k);
+    """
+    for section in SECTION_MERGE_KEYS
+}
+_SECTION_CLEAR_QUERIES = {
+    section: f"DELETE FROM recsui.perspective_items WHERE perspective_id = %s AND section = '{section}';"
+    for section in SECTION_MERGE_KEYS
+}
+_SECTION_ITEMS_QUERIES = {
+    section: f"SELECT {_section_items_sql(section)} AS items FROM recsui.perspectives AS p WHERE p.id = %s;"
+    for section in SECTION_MERGE_KEYS
+}
+_ITEMS_INSERT_QUERY = ("INSERT INTO recsui.perspective_items (perspective_id, section, name, view, position, item) "
+                       "VALUES %s;")
+_ITEMS_INSERT_TEMPLATE = "(%s, %s, %s, %s, %s, %s::jsonb)"
+
+# Parent row writes of the section saves; the item rows are written after them.
+_PARENT_UPSERT_QUERY = f"""
+    INSERT INTO recsui.perspectives AS p (username, layout_name, updated_by)
+    VALUES (%(username)s, %(layout_name)s, %(updated_by)s)
+    ON CONFLICT (username) DO UPDATE SET
+        layout_name = EXCLUDED.layout_name,
+        updated_by = EXCLUDED.updated_by,
+        updated_time = now(),
+        version = p.version + 1
+    RETURNING {_PARENT_COLUMNS}, (p.xmax = 0) AS created;
+"""
+_PARENT_UPDATE_QUERY = f"""
+    UPDATE recsui.perspectives AS p SET
+        layout_name = COALESCE(%(layout_name)s, p.layout_name),
+        updated_by = COALESCE(%(updated_by)s, p.updated_by),
+        updated_time = now(),
+        version = p.version + 1
+    WHERE p.username = %(username)s
+    RETURNING {_PARENT_COLUMNS}, FALSE AS created;
+"""
+_PARENT_BULK_UPSERT_QUERY = """
+    INSERT INTO recsui.perspectives AS p (username, layout_name, updated_by)
+    VALUES %s
+    ON CONFLICT (username) DO UPDATE SET
+        layout_name = EXCLUDED.layout_name,
+        updated_by = EXCLUDED.updated_by,
+        updated_time = now(),
+        version = p.version + 1
+    RETURNING p.id, p.username, (p.xmax = 0) AS created;
+"""
+
+_ASSEMBLED_BY_ID_QUERY = f"SELECT {_ROW_COLUMNS} FROM {_ASSEMBLED} WHERE id = %s;"
+_DOCUMENT_BY_ID_QUERY = (f"SELECT p.id, p.username, p.updated_time, {_PERSPECTIVE_DOCUMENT}::text AS body "
+                         f"FROM {_ASSEMBLED} AS p WHERE p.id = %s;")
+_DOCUMENT_BY_USERNAME_QUERY = (f"SELECT p.id, p.username, p.updated_time, {_PERSPECTIVE_DOCUMENT}::text AS body "
+                               f"FROM {_ASSEMBLED} AS p WHERE p.username = %s;")
+_ALL_DOCUMENTS_QUERY = f"SELECT json_agg({_PERSPECTIVE_DOCUMENT} ORDER BY p.id)::text FROM {_ASSEMBLED} AS p;"
+_DOCUMENT_PAGE_QUERY = f"""
+    SELECT COALESCE(json_agg(page.doc ORDER BY page.id), '[]')::text AS items,
+           max(page.id) AS last_id, count(*) AS n
+    FROM (
+        SELECT p.id, {_PERSPECTIVE_DOCUMENT} AS doc
+        FROM {_ASSEMBLED} AS p WHERE p.id > %s ORDER BY p.id LIMIT %s
+    ) AS page;
+"""
+
+
+@lru_cache(maxsize=None)
+def _item_field_statements(fields: Tuple[str, ...]) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+    """
+    Items-layout counterpart of `_field_statements`: the read of `fields` (sections
+    aggregated from their items) and the version-guarded write of the parent row's
+    other fields. The section items are written separately.
+    """
+    mask = sum(1 << UPDATABLE_FIELDS.index(field) for field in fields)
+    columns = [f"{_section_items_sql(f)} AS {f}" if f in SECTION_MERGE_KEYS else f"p.{f}" for f in fields]
+    read = (f"SELECT p.id, p.version, p.updated_time, {', '.join(columns)} "
+            f"FROM recsui.perspectives AS p WHERE p.username = %s;")
+    assignments = [f"{f} = %s" for f in fields if f not in SECTION_MERGE_KEYS]
+    assignments += ["updated_time = now()", "version = version + 1"]
+    cas = (f"UPDATE recsui.perspectives SET {', '.join(assignments)} "
+           f"WHERE id = %s AND version = %s RETURNING id, username, updated_time, version;")
+    return (f"perspective_items_read_fields_{mask}", read), (f"perspective_items_cas_fields_{mask}", cas)
+
+
+@lru_cache(maxsize=None)
+def _item_search_statement(column: bool, view: bool, filter_field: bool) -> Tuple[str, str]:
+    """Items-layout counterpart of `_search_statement`: each criterion is an EXISTS over the item rows."""
+    exists = "EXISTS (SELECT 1 FROM recsui.perspective_items AS i WHERE i.perspective_id = p.id AND {})"
+    filters_key = "(jsonb_typeof(i.item -> 'filters') = 'object' AND i.item -> 'filters' ? %({})s)"
+    conditions = []
+    if column:
+        conditions.append(exists.format(
+            f"(i.section = 'column_state' AND i.item @> %(column_state)s::jsonb "
+            f"OR i.section <> 'column_state' AND {filters_key.format('column')})"))
+    if view:
+        conditions.append(exists.format("i.item @> %(view)s::jsonb"))
+    if filter_field:
+        conditions.append(exists.format(f"i.section = 'filter_model' AND {filters_key.format('filter_field')}"))
+    query = f"""
+        SELECT p.id, p.username, p.layout_name, p.updated_by, p.updated_time
+        FROM recsui.perspectives AS p
+        WHERE p.id > %(after_id)s AND {' AND '.join(conditions)}
+        ORDER BY p.id LIMIT %(limit)s;
+    """
+    return f"perspective_items_search_{int(column)}{int(view)}{int(filter_field)}", query
+
+
+class ItemPerspectiveService(PerspectiveService):
+    """`PerspectiveService` over the one-row-per-item layout (see the module docstring)."""
+
+    _projection_source = ('perspective_items', _ASSEMBLED)
+
+    def get_all_perspectives(self) -> List[PerspectiveModel]:
+        self._execute("perspective_items_select_all", f"SELECT {_ROW_COLUMNS} FROM {_ASSEMBLED};")
+        return [PerspectiveModel.from_dict(p) for p in self.db_curr.fetchall()]
+
+    def get_perspectives_page(self, after_id: int, limit: int) -> List[PerspectiveModel]:
+        self._execute("perspective_items_select_page",
+                      f"SELECT {_ROW_COLUMNS} FROM {_ASSEMBLED} WHERE id > %s ORDER BY id LIMIT %s;", (after_id, limit))
+        return [PerspectiveModel.from_dict(p) for p in self.db_curr.fetchall()]
+
+    def iter_perspectives(self, itersize: int = 1000) -> Iterator[PerspectiveModel]:
+        named_curr = self.db_conn.cursor(name='perspectives_stream', cursor_factory=DictCursor)
+        named_curr.itersize = itersize
+        try:
+            named_curr.execute(f"SELECT {_ROW_COLUMNS} FROM {_ASSEMBLED} ORDER BY id;")
+            for perspective in named_curr:
+                yield PerspectiveModel.from_dict(perspective)
+        finally:
+            named_curr.close()
+            self.db_conn.rollback()
+
+    def get_perspective_by_id(self, perspective_id: int) -> Optional[PerspectiveModel]:
+        self._execute("perspective_items_select_by_id", _ASSEMBLED_BY_ID_QUERY, (perspective_id,))
+        return PerspectiveModel.from_dict(self.db_curr.fetchone())
+
+    def get_perspective_by_username(self, username: str) -> Optional[PerspectiveModel]:
+        self._execute("perspective_items_select_by_username",
+                      f"SELECT {_ROW_COLUMNS} FROM {_ASSEMBLED} WHERE username = %s;", (username,))
+        return PerspectiveModel.from_dict(self.db_curr.fetchone())
+
+    def load_perspective_document(self, perspective_id: Optional[int] = None,
+                                  username: Optional[str] = None) -> Optional[Tuple[int, str, bytes, str]]:
+        if perspective_id is not None:
+            self._execute("perspective_items_document_by_id", _DOCUMENT_BY_ID_QUERY, (perspective_id,))
+        else:
+            self._execute("perspective_items_document_by_username", _DOCUMENT_BY_USERNAME_QUERY, (username,))
+        row = self.db_curr.fetchone()
+        if row is None:
+            return None
+        return row['id'], row['username'], row['body'].encode(), make_etag(row['id'], row['updated_time'])
+
+    def get_all_perspectives_json(self) -> Optional[str]:
+        self._execute("perspective_items_all_documents", _ALL_DOCUMENTS_QUERY)
+        return self.db_curr.fetchone()[0]
+
+    def get_perspectives_page_json(self, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+        self._execute("perspective_items_document_page", _DOCUMENT_PAGE_QUERY, (after_id, limit))
+        row = self.db_curr.fetchone()
+        return row['items'], row['last_id'] if row['n'] == limit else None
+
+    def iter_perspective_json(self, itersize: int = 1000) -> Iterator[str]:
+        named_curr = self.db_conn.cursor(name='perspectives_json_stream')
+        named_curr.itersize = itersize
+        try:
+            named_curr.execute(f"SELECT {_PERSPECTIVE_DOCUMENT}::text FROM {_ASSEMBLED} AS p ORDER BY p.id;")
+            for (document,) in named_curr:
+                yield document
+        finally:
+            named_curr.close()
+            self.db_conn.rollback()
+
+    def search_perspectives(self, column: Optional[str] = None, view: Optional[str] = None,
+                            filter_field: Optional[str] = None, after_id: int = 0,
+                            limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+        if column is None and view is None and filter_field is None:
+            raise ValueError("At least one of column, view or filter_field is required.")
+        params = {
+            'after_id': after_id,
+            'limit': limit,
+            'column_state': json.dumps({'defaultColumns': [column]}),
+            'column': column,
+            'view': json.dumps({'view': view}),
+            'filter_field': filter_field,
+        }
+        name, query = _item_search_statement(column is not None, view is not None, filter_field is not None)
+        self._execute(name, query, params)
+        rows = [dict(row) for row in self.db_curr.fetchall()]
+        return rows, rows[-1]['id'] if len(rows) == limit else None
+
+    def _write_items(self, perspective_id: int, section: str, items: List[dict]):
+        """Upserts `items` (unique keys) into a section: one row per item, untouched if unchanged."""
+        if items:
+            self._execute(f"perspective_items_upsert_{section}", _ITEM_UPSERT_QUERIES[section],
+                          {'id': perspective_id, 'items': json.dumps(items)})
+
+    def _write_section_diff(self, perspective_id: int, section: str, stored: List[dict], items: List[dict]):
+        """
+        Makes a section hold `items`, given that it holds `stored`. Deletes the rows of
+        the removed keys and writes the changed and new items; the other rows are left
+        alone. If the items kept from `stored` are reordered, the section is rewritten.
+        """
+        items = merge_section_items(section, [], items)
+        stored_by_key = {_item_key(section, item): item for item in stored}
+        keys = [_item_key(section, item) for item in items]
+        key_set = set(keys)
+        kept = [key for key in keys if key in stored_by_key]
+        if kept != [key for key in stored_by_key if key in key_set] or keys[:len(kept)] != kept:
+            self._execute(f"perspective_items_clear_{section}", _SECTION_CLEAR_QUERIES[section], (perspective_id,))
+            self._write_items(perspective_id, section, items)
+            return
+
+        removed = [list(key) for key in stored_by_key if key not in key_set]
+        if removed:
+            self._execute(f"perspective_items_delete_{section}", _ITEM_DELETE_QUERIES[section],
+                          {'id': perspective_id, 'keys': json.dumps(removed)})
+        self._write_items(perspective_id, section,
+                          [item for key, item in zip(keys, items) if stored_by_key.get(key) != item])
+
+    def _replace_section(self, perspective_id: int, section: str, items: List[dict]):
+        """Replaces a section of a perspective whose parent row this transaction has already locked."""
+        self._execute(f"perspective_items_section_{section}", _SECTION_ITEMS_QUERIES[section], (perspective_id,))
+        self._write_section_diff(perspective_id, section, self.db_curr.fetchone()['items'], items)
+
+    def _write_parent(self, username: str, layout_name: Optional[str], updated_by: Optional[str]) -> Optional[dict]:
+        """Creates or updates the parent row of a section save (see `upsert_section_items`) and locks it."""
+        params = {'username': username, 'layout_name': layout_name or None, 'updated_by': updated_by or None}
+        if layout_name and updated_by:
+            self._execute("perspective_items_parent_upsert", _PARENT_UPSERT_QUERY, params)
+        else:
+            self._execute("perspective_items_parent_update", _PARENT_UPDATE_QUERY, params)
+        row = self.db_curr.fetchone()
+        return dict(row) if row else None
+
+    def _read_assembled(self, perspective_id: int) -> dict:
+        self._execute("perspective_items_select_by_id", _ASSEMBLED_BY_ID_QUERY, (perspective_id,))
+        return dict(self.db_curr.fetchone())
+
+    def create_perspective(self, perspective_in: PerspectiveCreate) -> PerspectiveModel:
+        try:
+            self._execute(
+                "perspective_items_insert",
+                "INSERT INTO recsui.perspectives (username, layout_name, updated_by) VALUES (%s, %s, %s) RETURNING id;",
+                (perspective_in.username, perspective_in.layout_name, perspective_in.updated_by)
+            )
+            perspective_id = self.db_curr.fetchone()['id']
+            for section in SECTION_MERGE_KEYS:
+                self._write_items(perspective_id, section,
+                                  merge_section_items(section, [], section_items(getattr(perspective_in, section))))
+            new_perspective = self._read_assembled(perspective_id)
+            self.db_conn.commit()
+        except Exception as e:
+            self.db_conn.rollback()
+            raise e
+        self._invalidate_cache(perspective_id, new_perspective['username'])
+        return PerspectiveModel.from_dict(new_perspective)
+
+    def bulk_upsert_perspectives(self, perspectives: List[PerspectiveCreate], chunk_size: int = 1000) -> List[dict]:
+        """
+        Bulk upsert over the items layout: per chunk, one multi-row upsert of the parent
+        rows, one DELETE of their items and one multi-row INSERT of the new items,
+        committed together. Results are as for `PerspectiveService.bulk_upsert_perspectives`.
+        """
+        results = []
+        for start in range(0, len(perspectives), chunk_size):
+            chunk = perspectives[start:start + chunk_size]
+            try:
+                written = execute_values(
+                    self.db_curr, _PARENT_BULK_UPSERT_QUERY,
+                    [(p.username, p.layout_name, p.updated_by) for p in chunk], page_size=len(chunk), fetch=True
+                )
+                by_username = {row['username']: row for row in written}
+                self._execute("perspective_items_clear_many",
+                              "DELETE FROM recsui.perspective_items WHERE perspective_id = ANY(%s);",
+                              ([row['id'] for row in written],))
+                item_rows = [
+                    (by_username[p.username]['id'], section, *_item_key(section, item), position, json.dumps(item))
+                    for p in chunk
+                    for section in SECTION_MERGE_KEYS
+                    for position, item in enumerate(
+                        merge_section_items(section, [], section_items(getattr(p, section))), start=1)
+                ]
+                if item_rows:
+                    execute_values(self.db_curr, _ITEMS_INSERT_QUERY, item_rows, template=_ITEMS_INSERT_TEMPLATE,
+                                   page_size=len(item_rows))
+                self.db_conn.commit()
+            except psycopg2.Error as e:
+                self.db_conn.rollback()
+                results.extend({"username": p.username, "status": "failed", "error": str(e)} for p in chunk)
+                continue
+
+            for p in chunk:
+                row = by_username[p.username]
+                results.append({
+                    "username": p.username,
+                    "status": "created" if row['created'] else "updated",
+                    "id": row['id'],
+                })
+                self._invalidate_cache(row['id'], p.username)
+        return results
+
+    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[PerspectiveModel]:
+        return self._update(perspective_in, 'id', perspective_id, if_match)
+
+    def update_perspective_by_username(self, username: str, perspective_in: PerspectiveUpdate) -> Optional[
+        PerspectiveModel]:
+        return self._update(perspective_in, 'username', username, None)
+
+    def _update(self, perspective_in: PerspectiveUpdate, key_column: str, key: Any,
+                if_match: Optional[List[datetime]]) -> Optional[PerspectiveModel]:
+        """
+        `update_perspective` over the items layout: the parent row's UPDATE (guarded by
+        If-Match as before) locks it, then each changed section is diffed against its
+        stored items.
+        """
+        changes = changed_fields(perspective_in)
+        if not changes:
+            current = self.get_perspective_by_id(key) if key_column == 'id' else self.get_perspective_by_username(key)
+            # An empty update still checks the precondition.
+            if current is not None and if_match is not None and current.updated_time not in if_match:
+                raise PreconditionFailedError(f"Perspective with id {key} has been modified.")
+            return current
+
+        columns = tuple(c for c in changes if c not in SECTION_MERGE_KEYS)
+        name, query = _update_statement(key_column, columns, if_match is not None)
+        params = [*(changes[c] for c in columns), key]
+        if if_match is not None:
+            params.append(if_match)
+
+        try:
+            self._execute(name, query, params)
+            parent = self.db_curr.fetchone()
+            if parent is None:
+                self.db_conn.rollback()
+                if if_match is None:
+                    return None  # Does not exist (or was deleted)
+                raise PreconditionFailedError(f"Perspective with id {key} has been modified.")
+            for section in SECTION_MERGE_KEYS.keys() & changes.keys():
+                self._replace_section(parent['id'], section, changes[section])
+            updated = self._read_assembled(parent['id'])
+            self.db_conn.commit()
+        except Exception as e:
+            self.db_conn.rollback()
+            raise e
+        # Invalidating by id also drops the old username when the update renamed the user.
+        self._invalidate_cache(updated['id'], updated['username'])
+        return PerspectiveModel.from_dict(updated)
+
+    def upsert_section_items(self, section: str, username: str, items: List[dict],
+                             layout_name: Optional[str] = None,
+                             updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Merges `items` into a section by upserting one row per item; the section's
+        other rows are not touched. Creation rules and the result are those of
+        `PerspectiveService.upsert_section_items`.
+        """
+        try:
+            row = self._write_parent(username, layout_name, updated_by)
+            if row is None:
+                self.db_conn.rollback()
+                return None
+            self._write_items(row['id'], section, merge_section_items(section, [], items))
+            self._execute(f"perspective_items_section_{section}", _SECTION_ITEMS_QUERIES[section], (row['id'],))
+            row[section] = self.db_curr.fetchone()['items']
+            self.db_conn.commit()
+        except Exception as e:
+            self.db_conn.rollback()
+            raise e
+        self._invalidate_cache(row['id'], username)
+        return row
+
+    def replace_section_items(self, section: str, username: str, items: List[dict],
+                              layout_name: Optional[str] = None,
+                              updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Replaces a section, writing only the item rows that changed. Creation rules
+        and the result are those of `PerspectiveService.replace_section_items`.
+        """
+        try:
+            row = self._write_parent(username, layout_name, updated_by)
+            if row is None:
+                self.db_conn.rollback()
+                return None
+            self._replace_section(row['id'], section, items)
+            document = {**self._read_assembled(row['id']), 'created': row['created']}
+            self.db_conn.commit()
+        except Exception as e:
+            self.db_conn.rollback()
+            raise e
+        self._invalidate_cache(row['id'], username)
+        return document
+
+    def modify_section_items(self, section: str, username: str, mutate: Callable[[List[dict]], List[dict]],
+                             max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """
+        Read-modify-write of one section, guarded by the parent row's version as in
+        `PerspectiveService.modify_section_items`. Only the rows of the items that
+        `mutate` removed, changed or added are written. Returns the full updated row.
+        """
+        return self._modify(username, (section,), lambda current: {section: mutate(current[section])},
+                            None, max_retries, assemble=True)
+
+    def modify_perspective_fields(self, username: str, fields: Tuple[str, ...],
+                                  mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                                  if_match: Optional[Iterable[str]] = None,
+                                  max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """`PerspectiveService.modify_perspective_fields` over the items layout (see `_modify`)."""
+        return self._modify(username, fields, mutate, if_match, max_retries, assemble=False)
+
+    def _modify(self, username: str, fields: Tuple[str, ...], mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                if_match: Optional[Iterable[str]], max_retries: int, assemble: bool) -> Optional[dict]:
+        """
+        Version-guarded read-modify-write of `fields`. A successful compare-and-swap
+        on the parent row guarantees that the items read are still the stored ones,
+        so each section is written as a diff against them. Returns the full row if
+        `assemble`, otherwise the parent's id, username, updated_time and version.
+        """
+        (read_name, read_query), (cas_name, cas_query) = _item_field_statements(fields)
+        attempts = 0
+        while attempts <= max_retries:
+            attempts += 1
+            try:
+                self._execute(read_name, read_query, (username,))
+                current = self.db_curr.fetchone()
+                if current is None:
+                    self.db_conn.rollback()
+                    return None
+                if if_match is not None and not etag_matches(current['id'], current['updated_time'], if_match):
+                    self.db_conn.rollback()
+                    raise PreconditionFailedError(f"Perspective for user '{username}' has been modified.")
+
+                values = mutate({field: current[field] for field in fields})
+                params = [values[f] for f in fields if f not in SECTION_MERGE_KEYS]
+
+                self._execute(cas_name, cas_query, (*params, current['id'], current['version']))
+                updated = self.db_curr.fetchone()
+                if updated is not None:
+                    for section in (f for f in fields if f in SECTION_MERGE_KEYS):
+                        self._write_section_diff(current['id'], section, current[section], values[section])
+                    updated = self._read_assembled(current['id']) if assemble else dict(updated)
+                self.db_conn.commit()
+            except Exception as e:
+                self.db_conn.rollback()
+                raise e
+
+            if updated is not None:
+                concurrency_stats.record(attempts, succeeded=True)
+                self._invalidate_cache(updated['id'], username)
+                return updated
+            # Lost the race: back off briefly (with jitter) so competing writers spread out.
+            if attempts <= max_retries:
+                time.sleep(random.uniform(0, PERSPECTIVE_CAS_BACKOFF * attempts))
+
+        concurrency_stats.record(attempts, succeeded=False)
+        raise ConcurrentModificationError(
+            f"Perspective for user '{username}' kept changing; gave up after {attempts} attempts."
+        )
@@ -0,0 +1,263 @@
+"""
+JSON Patch (RFC 6902) for perspectives, with section items addressed by name.
+
+The first path segment is a patchable field: a section (column_state,
+sort_model, filter_model), layout_name or updated_by. Inside a section, an item
+is addressed by its merge key (SECTION_MERGE_KEYS) instead of its array index.
+That is one segment (name) for column_state, and two (name, view) for
+sort_model and filter_model. Whatever follows is a standard JSON Pointer into
+the item:
+
+    {"op": "remove",  "path": "/column_state/Default/defaultColumns/3"}
+    {"op": "add",     "path": "/column_state/Default/defaultColumns/-", "value": "price"}
+    {"op": "replace", "path": "/filter_model/Default/grid/filters/price/filter", "value": "100"}
+    {"op": "add",     "path": "/sort_model/Mine/grid", "value": {"filters": {}, "default": false}}
+
+Adding an item that already exists replaces it in place. A new item is
+appended. The item's key fields are taken from the path.
+
+Only the fields a patch touches are read and written (see `patch_fields`).
+Changed sections are validated against the item schemas before they are
+stored, and must not end up with two items under the same key.
+"""
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..schemas.perspective import ColumnState, PatchOperation, ViewSetting
+from .storage import SECTION_MERGE_KEYS
+
+# Top-level fields a patch may address; username identifies the perspective and cannot be patched.
+PATCHABLE_FIELDS = ('layout_name', 'updated_by', *SECTION_MERGE_KEYS)
+
+_ITEM_SCHEMAS = {'column_state': ColumnState, 'sort_model': ViewSetting, 'filter_model': ViewSetting}
+
+
+class InvalidPatchError(ValueError):
+    """The patch document is malformed or addresses something that cannot be patched."""
+
+
+class PatchConflictError(Exception):
+    """The patch cannot be applied to the stored perspective (a missing target or a failed test)."""
+
+
+class PatchResultError(ValueError):
+    """Applying the patch would store an invalid perspective."""
+
+    def __init__(self, message: str, detail: Optional[list] = None):
+        super().__init__(message)
+        self.detail = detail or []
+
+
+def _split(pointer: str) -> List[str]:
+    if not pointer.startswith('/'):
+        raise InvalidPatchError(f"Path '{pointer}' must start with '/'.")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _field(pointer: str) -> str:
+    field = _split(pointer)[0]
+    if field not in PATCHABLE_FIELDS:
+        raise InvalidPatchError(f"'{field}' cannot be patched; expected one of {', '.join(PATCHABLE_FIELDS)}.")
+    return field
+
+
+def patch_fields(operations: List[PatchOperation]) -> Tuple[str, ...]:
+    """The fields the operations read or write, in PATCHABLE_FIELDS order."""
+    touched = set()
+    for operation in operations:
+        touched.add(_field(operation.path))
+        if operation.from_ is not None:
+            touched.add(_field(operation.from_))
+    return tuple(field for field in PATCHABLE_FIELDS if field in touched)
+
+
+class _Target:
+    """
+    Where a pointer leads: a field of the document, an item of a section
+    (`container` is the section, `key` the item's merge key) or a member inside
+    an item (`container` is the enclosing dict or list).
+    """
+
+    def __init__(self, pointer: str, kind: str, container, key, section: Optional[str] = None):
+        self.pointer = pointer
+        self.kind = kind
+        self.container = container
+        self.key = key
+        self.section = section
+
+    def _index(self) -> Optional[int]:
+        keys = SECTION_MERGE_KEYS[self.section]
+        for index, item in enumerate(self.container):
+            if isinstance(item, dict) and tuple(item.get(k) for k in keys) == self.key:
+                return index
+        return None
+
+    def _list_index(self, allow_end: bool) -> int:
+        if allow_end and self.key == '-':
+            return len(self.container)
+        if not self.key.isdigit() or (len(self.key) > 1 and self.key[0] == '0'):
+            raise InvalidPatchError(f"'{self.key}' in '{self.pointer}' is not an array index.")
+        index = int(self.key)
+        if index > len(self.container) or (index == len(self.container) and not allow_end):
+            raise PatchConflictError(f"Index {index} in '{self.pointer}' is out of range.")
+        return index
+
+    def _keyed(self, value: Any) -> dict:
+        """An item value with its key fields taken from the path."""
+        if not isinstance(value, dict):
+            raise InvalidPatchError(f"The value for '{self.pointer}' must be an object.")
+        item = dict(value)
+        for name, key in zip(SECTION_MERGE_KEYS[self.section], self.key):
+            if item.setdefault(name, key) != key:
+                raise InvalidPatchError(f"The value's {name} does not match '{self.pointer}'.")
+        return item
+
+    def get(self) -> Any:
+        if self.kind == 'field':
+            return self.container[self.key]
+        if self.kind == 'item':
+            index = self._index()
+            if index is None:
+                raise PatchConflictError(f"'{self.pointer}' does not exist.")
+            return self.container[index]
+        if isinstance(self.container, dict):
+            if self.key not in self.container:
+                raise PatchConflictError(f"'{self.pointer}' does not exist.")
+            return self.container[self.key]
+        return self.container[self._list_index(allow_end=False)]
+
+    def add(self, value: Any):
+        value = copy.deepcopy(value)
+        if self.kind == 'field':
+            self.container[self.key] = value
+        elif self.kind == 'item':
+            index = self._index()
+            item = self._keyed(value)
+            if index is None:
+                self.container.append(item)
+            else:
+                self.container[index] = item
+        elif isinstance(self.container, dict):
+            self.container[self.key] = value
+        else:
+            self.container.insert(self._list_index(allow_end=True), value)
+
+    def remove(self) -> Any:
+        if self.kind == 'field':
+            raise InvalidPatchError(f"'{self.key}' cannot be removed.")
+        value = self.get()
+        if self.kind == 'item':
+            self.container.pop(self._index())
+        elif isinstance(self.container, dict):
+            del self.container[self.key]
+        else:
+            self.container.pop(self._list_index(allow_end=False))
+        return value
+
+    def replace(self, value: Any):
+        self.get()  # the target must exist
+        if self.kind == 'item':
+            self.container[self._index()] = self._keyed(copy.deepcopy(value))
+        elif self.kind == 'field' or isinstance(self.container, dict):
+            self.container[self.key] = copy.deepcopy(value)
+        else:
+            self.container[self._list_index(allow_end=False)] = copy.deepcopy(value)
+
+
+def _resolve(document: Dict[str, Any], pointer: str) -> _Target:
+    tokens = _split(pointer)
+    field = _field(pointer)
+    if len(tokens) == 1:
+        return _Target(pointer, 'field', document, field)
+    if field not in SECTION_MERGE_KEYS:
+        raise InvalidPatchError(f"'{field}' has no members.")
+
+    keys = SECTION_MERGE_KEYS[field]
+    if len(tokens) < 1 + len(keys):
+        raise InvalidPatchError(f"{field} items are addressed by {' and '.join(keys)}: '{pointer}'.")
+    section = document[field]
+    if not isinstance(section, list):
+        raise PatchConflictError(f"{field} is not an array: '{pointer}'.")
+    target = _Target(pointer, 'item', section, tuple(tokens[1:1 + len(keys)]), field)
+    members = tokens[1 + len(keys):]
+    if not members:
+        return target
+
+    container = target.get()
+    for token in members[:-1]:
+        container = _Target(pointer, 'member', container, token).get()
+        if not isinstance(container, (dict, list)):
+            raise PatchConflictError(f"'{pointer}' goes through a value that is neither an object nor an array.")
+    return _Target(pointer, 'member', container, members[-1])
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """JSON equality: unlike ==, booleans are not numbers."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    return type(a) is type(b) and a == b
+
+
+def _validated(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Checks every field of a patched document and returns it with sections in their canonical form."""
+    result = {}
+    for field, value in document.items():
+        if field not in SECTION_MERGE_KEYS:
+            if not isinstance(value, str) or not value:
+                raise PatchResultError(f"{field} must be a non-empty string.")
+            result[field] = value
+            continue
+        if not isinstance(value, list):
+            raise PatchResultError(f"{field} must be an array.")
+        schema = _ITEM_SCHEMAS[field]
+        items, seen, detail = [], set(), []
+        for position, item in enumerate(value):
+            try:
+                items.append(schema.model_validate(item).model_dump())
+            except ValueError as e:
+                detail.extend({**error, 'loc': (field, position, *error['loc'])}
+                              for error in e.errors(include_url=False, include_context=False))
+                continue
+            key = tuple(items[-1][k] for k in SECTION_MERGE_KEYS[field])
+            if key in seen:
+                raise PatchResultError(f"{field} would contain more than one item {'/'.join(key)}.")
+            seen.add(key)
+        if detail:
+            raise PatchResultError(f"The patched {field} is invalid.", detail)
+        result[field] = items
+    return result
+
+
+def apply_patch(current: Dict[str, Any], operations: List[PatchOperation]) -> Dict[str, Any]:
+    """
+    Applies `operations` in order to `current` (field -> stored value, for the
+    fields in `patch_fields(operations)`) and returns the new values. `current`
+    is not modified. The patch is atomic: any failing operation raises and
+    nothing is written.
+    """
+    document = copy.deepcopy(current)
+    for operation in operations:
+        target = _resolve(document, operation.path)
+        if operation.op == 'add':
+            target.add(operation.value)
+        elif operation.op == 'remove':
+            target.remove()
+        elif operation.op == 'replace':
+            target.replace(operation.value)
+        elif operation.op == 'test':
+            if not _json_equal(target.get(), operation.value):
+                raise PatchConflictError(f"Test failed: '{operation.path}' does not have the expected value.")
+        else:
+            if operation.op == 'move' and operation.path.startswith(operation.from_ + '/'):
+                raise InvalidPatchError(f"Cannot move '{operation.from_}' into itself.")
+            source = _resolve(document, operation.from_)
+            value = source.remove() if operation.op == 'move' else source.get()
+            # Resolve the destination after the source is gone, as RFC 6902 specifies.
+            _resolve(document, operation.path).add(value)
+    return _validated(document)
@@ -0,0 +1,295 @@
+import bisect
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..models.perspective import Perspective as PerspectiveModel
+from ..schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from .concurrency import concurrency_stats, PERSPECTIVE_CAS_MAX_RETRIES
+from .etag import etag_matches, make_etag
+from .storage import (PerspectiveStorage, PreconditionFailedError, SECTION_MERGE_KEYS, changed_fields,
+                      encode_document, merge_section_items, next_updated_time, project_document, row_matches,
+                      section_items)
+
+
+class InMemoryPerspectiveService(PerspectiveStorage):
+    """
+    Process-local perspective storage, used as the throughput upper bound.
+
+    Rows are plain dicts that are never mutated once stored: every write builds
+    a new row and swaps it in under one lock. Reads therefore take no lock and can
+    hand stored rows and sections straight to the DTOs. Each row's response
+    document and ETag are encoded once, at write time, so document reads are a
+    dict lookup. The shared read-through cache is bypassed because this store
+    already is one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[int, dict] = {}
+        self._ids_by_username: Dict[str, int] = {}
+        # Ids in ascending order, for keyset pagination.
+        self._ids: List[int] = []
+        # id -> (encoded document, ETag)
+        self._documents: Dict[int, Tuple[bytes, str]] = {}
+        self._next_id = 1
+
+    # Writes; callers hold self._lock.
+
+    def _store(self, row: dict):
+        previous = self._rows.get(row['id'])
+        if previous is None:
+            bisect.insort(self._ids, row['id'])
+        elif previous['username'] != row['username']:
+            del self._ids_by_username[previous['username']]
+        # The document is swapped in first, so a reader never pairs a new row with an older body.
+        self._documents[row['id']] = (encode_document(row), make_etag(row['id'], row['updated_time']))
+        self._rows[row['id']] = row
+        self._ids_by_username[row['username']] = row['id']
+
+    def _insert(self, username: str, layout_name: str, updated_by: str, column_state: List[dict],
+                sort_model: List[dict], filter_model: List[dict]) -> dict:
+        if username in self._ids_by_username:
+            raise ValueError(f"Perspective for user '{username}' already exists.")
+        row = {
+            'id': self._next_id,
+            'username': username,
+            'layout_name': layout_name,
+            'updated_by': updated_by,
+            'column_state': column_state,
+            'sort_model': sort_model,
+            'filter_model': filter_model,
+            'updated_time': next_updated_time(),
+            'version': 1,
+        }
+        self._next_id += 1
+        self._store(row)
+        return row
+
+    def _replace(self, row: dict, **changes) -> dict:
+        username = changes.get('username', row['username'])
+        if username != row['username'] and username in self._ids_by_username:
+            raise ValueError(f"Perspective for user '{username}' already exists.")
+        updated = {**row, **changes, 'updated_time': next_updated_time(row['updated_time']),
+                   'version': row['version'] + 1}
+        self._store(updated)
+        return updated
+
+    def _row(self, perspective_id: Optional[int] = None, username: Optional[str] = None) -> Optional[dict]:
+        if perspective_id is None:
+            perspective_id = self._ids_by_username.get(username)
+        return self._rows.get(perspective_id)
+
+    def _page_ids(self, after_id: int, limit: int) -> List[int]:
+        start = bisect.bisect_right(self._ids, after_id)
+        return self._ids[start:start + limit]
+
+    # Reads
+
+    def get_all_perspectives(self) -> List[PerspectiveModel]:
+        return [PerspectiveModel.from_dict(row) for row in list(self._rows.values())]
+
+    def get_perspectives_page(self, after_id: int, limit: int) -> List[PerspectiveModel]:
+        rows = (self._rows.get(i) for i in self._page_ids(after_id, limit))
+        return [PerspectiveModel.from_dict(row) for row in rows if row is not None]
+
+    def iter_perspectives(self, itersize: int = 1000) -> Iterator[PerspectiveModel]:
+        for perspective_id in list(self._ids):
+            row = self._rows.get(perspective_id)
+            if row is not None:
+                yield PerspectiveModel.from_dict(row)
+
+    def get_perspective_by_id(self, perspective_id: int) -> Optional[PerspectiveModel]:
+        return PerspectiveModel.from_dict(self._rows.get(perspective_id))
+
+    def get_perspective_by_username(self, username: str) -> Optional[PerspectiveModel]:
+        return PerspectiveModel.from_dict(self._row(username=username))
+
+    def load_perspective_document(self, perspective_id: Optional[int] = None,
+                                  username: Optional[str] = None) -> Optional[Tuple[int, str, bytes, str]]:
+        row = self._row(perspective_id, username)
+        if row is None:
+            return None
+        document = self._documents.get(row['id'])
+        if document is None:
+            return None  # Deleted since the row was read
+        return row['id'], row['username'], *document
+
+    def load_perspective_projection(self, fields: Tuple[str, ...], view: Optional[str] = None,
+                                    offset: int = 0, limit: Optional[int] = None,
+                                    perspective_id: Optional[int] = None,
+                                    username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        row = self._row(perspective_id, username)
+        if row is None:
+            return None
+        return project_document(row, fields, view, offset, limit), make_etag(row['id'], row['updated_time'])
+
+    def _get_perspective_json(self, perspective_id: Optional[int] = None,
+                              username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        loaded = self.load_perspective_document(perspective_id, username)
+        return loaded[2:] if loaded else None
+
+    def _documents_json(self, ids: List[int]) -> Tuple[str, int]:
+        documents = [self._documents.get(i) for i in ids]
+        return "[" + ",".join(d[0].decode() for d in documents if d is not None) + "]", len(ids)
+
+    def get_all_perspectives_json(self) -> Optional[str]:
+        if not self._ids:
+            return None
+        return self._documents_json(list(self._ids))[0]
+
+    def get_perspectives_page_json(self, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+        ids = self._page_ids(after_id, limit)
+        items, count = self._documents_json(ids)
+        return items, ids[-1] if count == limit else None
+
+    def iter_perspective_json(self, itersize: int = 1000) -> Iterator[str]:
+        for perspective_id in list(self._ids):
+            document = self._documents.get(perspective_id)
+            if document is not None:
+                yield document[0].decode()
+
+    def search_perspectives(self, column: Optional[str] = None, view: Optional[str] = None,
+                            filter_field: Optional[str] = None, after_id: int = 0,
+                            limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+        if column is None and view is None and filter_field is None:
+            raise ValueError("At least one of column, view or filter_field is required.")
+        rows = []
+        start = bisect.bisect_right(self._ids, after_id)
+        for perspective_id in self._ids[start:]:
+            row = self._rows.get(perspective_id)
+            if row is None or not row_matches(row, column, view, filter_field):
+                continue
+            rows.append({key: row[key] for key in ('id', 'username', 'layout_name', 'updated_by', 'updated_time')})
+            if len(rows) == limit:
+                break
+        return rows, rows[-1]['id'] if len(rows) == limit else None
+
+    def _load_perspective_etag(self, perspective_id: Optional[int] = None,
+                               username: Optional[str] = None) -> Optional[str]:
+        row = self._row(perspective_id, username)
+        return make_etag(row['id'], row['updated_time']) if row else None
+
+    def _get_perspective_etag(self, perspective_id: Optional[int] = None,
+                              username: Optional[str] = None) -> Optional[str]:
+        return self._load_perspective_etag(perspective_id, username)
+
+    def _invalidate_cache(self, perspective_id: Optional[int], *usernames: str):
+        pass  # Nothing is cached outside the store itself
+
+    # Writes
+
+    def create_perspective(self, perspective_in: PerspectiveCreate) -> PerspectiveModel:
+        with self._lock:
+            row = self._insert(
+                perspective_in.username, perspective_in.layout_name, perspective_in.updated_by,
+                section_items(perspective_in.column_state), section_items(perspective_in.sort_model),
+                section_items(perspective_in.filter_model),
+            )
+        return PerspectiveModel.from_dict(row)
+
+    def bulk_upsert_perspectives(self, perspectives: List[PerspectiveCreate], chunk_size: int = 1000) -> List[dict]:
+        results = []
+        for p in perspectives:
+            sections = {section: section_items(getattr(p, section)) for section in SECTION_MERGE_KEYS}
+            with self._lock:
+                existing = self._row(username=p.username)
+                if existing is None:
+                    row = self._insert(p.username, p.layout_name, p.updated_by, **sections)
+                else:
+                    row = self._replace(existing, layout_name=p.layout_name, updated_by=p.updated_by, **sections)
+            results.append({
+                "username": p.username,
+                "status": "created" if existing is None else "updated",
+                "id": row['id'],
+            })
+        return results
+
+    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[PerspectiveModel]:
+        changes = changed_fields(perspective_in)
+        with self._lock:
+            row = self._rows.get(perspective_id)
+            if row is None:
+                return None
+            if if_match is not None and row['updated_time'] not in if_match:
+                raise PreconditionFailedError(f"Perspective with id {perspective_id} has been modified.")
+            if changes:
+                row = self._replace(row, **changes)
+        return PerspectiveModel.from_dict(row)
+
+    def delete_perspective(self, perspective_id: int) -> bool:
+        with self._lock:
+            row = self._rows.pop(perspective_id, None)
+            if row is None:
+                return False
+            del self._ids_by_username[row['username']]
+            del self._documents[perspective_id]
+            self._ids.pop(bisect.bisect_left(self._ids, perspective_id))
+        return True
+
+    def update_perspective_by_username(self, username: str,
+                                       perspective_in: PerspectiveUpdate) -> Optional[PerspectiveModel]:
+        changes = changed_fields(perspective_in)
+        with self._lock:
+            row = self._row(username=username)
+            if row is None:
+                return None
+            if changes:
+                row = self._replace(row, **changes)
+        return PerspectiveModel.from_dict(row)
+
+    def upsert_section_items(self, section: str, username: str, items: List[dict],
+                             layout_name: Optional[str] = None,
+                             updated_by: Optional[str] = None) -> Optional[dict]:
+        row = self._write_section(section, username, items, layout_name, updated_by, merge=True)
+        if row is None:
+            return None
+        return {key: row[key] for key in
+                ('id', 'username', 'layout_name', 'updated_by', section, 'updated_time', 'version', 'created')}
+
+    def replace_section_items(self, section: str, username: str, items: List[dict],
+                              layout_name: Optional[str] = None,
+                              updated_by: Optional[str] = None) -> Optional[dict]:
+        return self._write_section(section, username, items, layout_name, updated_by, merge=False)
+
+    def _write_section(self, section: str, username: str, items: List[dict], layout_name: Optional[str],
+                       updated_by: Optional[str], merge: bool) -> Optional[dict]:
+        with self._lock:
+            existing = self._row(username=username)
+            if existing is None:
+                if not (layout_name and updated_by):
+                    return None
+                sections = {s: [] for s in SECTION_MERGE_KEYS}
+                sections[section] = items
+                return {**self._insert(username, layout_name, updated_by, **sections), 'created': True}
+
+            value = merge_section_items(section, existing[section], items) if merge else items
+            row = self._replace(existing, layout_name=layout_name or existing['layout_name'],
+                                updated_by=updated_by or existing['updated_by'], **{section: value})
+        return {**row, 'created': False}
+
+    def modify_section_items(self, section: str, username: str, mutate: Callable[[List[dict]], List[dict]],
+                             max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        # Writers are serialized by the lock, so the read-modify-write never has to be retried.
+        with self._lock:
+            row = self._row(username=username)
+            if row is None:
+                return None
+            row = self._replace(row, **{section: mutate(row[section])})
+        concurrency_stats.record(1, succeeded=True)
+        return dict(row)
+
+    def modify_perspective_fields(self, username: str, fields: Tuple[str, ...],
+                                  mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                                  if_match: Optional[Iterable[str]] = None,
+                                  max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        with self._lock:
+            row = self._row(username=username)
+            if row is None:
+                return None
+            if if_match is not None and not etag_matches(row['id'], row['updated_time'], if_match):
+                raise PreconditionFailedError(f"Perspective for user '{username}' has been modified.")
+            row = self._replace(row, **mutate({field: row[field] for field in fields}))
+        concurrency_stats.record(1, succeeded=True)
+        return {key: row[key] for key in ('id', 'username', 'updated_time', 'version')}
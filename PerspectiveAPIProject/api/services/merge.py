@@ -0,0 +1,158 @@
+"""
+Keyed merges of section items (column_state, sort_model and filter_model).
+
+An item is identified within its section by SECTION_MERGE_KEYS[section]:
+column_state items by name, sort_model and filter_model items by name + view.
+`SectionIndex` hashes the keys of a section once. Upserts, deletes and
+replacements of a batch then cost one dict lookup per item, so a save is
+linear in the section size plus the batch size, with thousands of items too.
+
+The Postgres backend runs the same upsert in SQL (`_merge_section_sql` in
+services/perspective.py); the embedded backends and the endpoints use this
+module. The semantics are the same:
+
+- Upsert: an existing item keeps its position and is replaced by the incoming
+  item with the same key; if the stored section repeats that key, every
+  occurrence is replaced. Incoming items without a match are appended in
+  request order. If the batch repeats a key, the last occurrence wins.
+- Delete: removes every item with one of the keys. Keys that match nothing are
+  reported back, so callers can reject the batch before writing it.
+- Replace: the batch becomes the section as given.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Keys that identify an item inside each JSONB section when merging:
+# column_state items are matched by name, sort_model/filter_model items by name + view.
+SECTION_MERGE_KEYS = {
+    'column_state': ('name',),
+    'sort_model': ('name', 'view'),
+    'filter_model': ('name', 'view'),
+}
+
+
+# Merge key of an item, per section; one tuple per call, without a generator.
+_KEY_FUNCTIONS = {
+    'column_state': lambda item: (item.get('name'),),
+    'sort_model': lambda item: (item.get('name'), item.get('view')),
+    'filter_model': lambda item: (item.get('name'), item.get('view')),
+}
+
+
+def item_key(section: str, item: dict) -> tuple:
+    """The merge key of an item: (name,) for column_state, (name, view) otherwise."""
+    return _KEY_FUNCTIONS[section](item)
+
+
+class SectionIndex:
+    """
+    The items of one section with a hash index from merge key to position.
+
+    Deleted items leave a hole (None) until `items()` compacts the list, so a
+    batch never shifts the positions the index points at.
+    """
+
+    def __init__(self, section: str, items: Iterable[dict] = ()):
+        self.section = section
+        self._key = _KEY_FUNCTIONS[section]
+        self._items: List[Optional[dict]] = []
+        # Key -> position of its first item.
+        self._positions: Dict[tuple, int] = {}
+        # Key -> positions of further items with that key (sections written by older code may repeat one).
+        self._repeats: Dict[tuple, List[int]] = {}
+        # Deleted positions not compacted yet.
+        self._holes = 0
+        self._extend(items)
+
+    def _extend(self, items: Iterable[dict]):
+        key_of, positions, stored = self._key, self._positions, self._items
+        for item in items:
+            key = key_of(item)
+            if key in positions:
+                self._repeats.setdefault(key, []).append(len(stored))
+            else:
+                positions[key] = len(stored)
+            stored.append(item)
+
+    def upsert(self, incoming: Iterable[dict]) -> 'SectionIndex':
+        """Merges a batch into the section (see the module docstring)."""
+        key_of, positions, stored = self._key, self._positions, self._items
+        latest: Dict[tuple, Tuple[int, dict]] = {}
+        for order, item in enumerate(incoming):
+            latest[key_of(item)] = (order, item)
+        appended = []
+        for key, entry in latest.items():
+            position = positions.get(key)
+            if position is None:
+                appended.append(entry)
+            else:
+                stored[position] = entry[1]
+                for repeat in self._repeats.get(key, ()):
+                    stored[repeat] = entry[1]
+        if appended:
+            appended.sort(key=lambda entry: entry[0])
+            self._extend([item for _, item in appended])
+        return self
+
+    def delete(self, keys: Iterable[tuple]) -> List[tuple]:
+        """Removes every item under each of `keys`; returns the keys that matched nothing."""
+        missing = []
+        for key in keys:
+            position = self._positions.pop(key, None)
+            if position is None:
+                missing.append(key)
+                continue
+            repeats = self._repeats.pop(key, ())
+            for deleted in (position, *repeats):
+                self._items[deleted] = None
+            self._holes += 1 + len(repeats)
+        return missing
+
+    def replace(self, items: Iterable[dict]) -> 'SectionIndex':
+        """Makes the batch the whole section."""
+        self._items = []
+        self._positions = {}
+        self._repeats = {}
+        self._holes = 0
+        self._extend(items)
+        return self
+
+    def items(self) -> List[dict]:
+        """The section as a list, in order."""
+        if not self._holes:
+            return list(self._items)
+        return [item for item in self._items if item is not None]
+
+
+def merge_section_items(section: str, existing: List[dict], incoming: List[dict]) -> List[dict]:
+    """Merges `incoming` into `existing` by SECTION_MERGE_KEYS[section] (upsert; see the module docstring)."""
+    return SectionIndex(section, existing).upsert(incoming).items()
+
+
+def delete_section_items(section: str, existing: List[dict],
+                         keys: Iterable[tuple]) -> Tuple[List[dict], List[tuple]]:
+    """Removes the items with `keys` from `existing`. Returns (remaining items, keys that matched nothing)."""
+    index = SectionIndex(section, existing)
+    missing = index.delete(keys)
+    return index.items(), missing
+
+
+def parse_item_keys(section: str, value) -> List[tuple]:
+    """
+    The merge keys named by a delete request: an object or a list of objects with
+    the key fields (name, and view for sort_model/filter_model). A bare string is
+    accepted for column_state. Repeated keys are kept once, in first-seen order.
+    Raises ValueError for anything else.
+    """
+    fields = SECTION_MERGE_KEYS[section]
+    values = value if isinstance(value, list) else [value]
+    if not values:
+        raise ValueError(f"At least one {section} item is required.")
+    keys = []
+    for entry in values:
+        if isinstance(entry, str) and fields == ('name',):
+            entry = {'name': entry}
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(k), str) and entry[k] for k in fields):
+            raise ValueError(f"Each {section} item must be an object with {' and '.join(repr(k) for k in fields)}.")
+        keys.append(tuple(entry[k] for k in fields))
+    # A key named twice would otherwise be reported missing by its second delete.
+    return list(dict.fromkeys(keys))
@@ -1,37 +1,461 @@
 import psycopg2
-from psycopg2.extras import DictCursor
-from typing import List, Optional
+from psycopg2.extras import DictCursor, execute_values
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import json
 from ..models.perspective import Perspective as PerspectiveModel
 from ..schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from ..database.prepared import execute_statement
+from .etag import etag_matches, make_etag
+from .storage import (PerspectiveStorage, PreconditionFailedError, DOCUMENT_FIELDS, PAGED_SECTION, SECTION_MERGE_KEYS,
+                      UPDATABLE_FIELDS, changed_fields)
+from .concurrency import (concurrency_stats, ConcurrentModificationError, PERSPECTIVE_CAS_MAX_RETRIES,
+                          PERSPECTIVE_CAS_BACKOFF)
 from psycopg2.extensions import connection, cursor
+import random
+from functools import lru_cache
+import time
+from datetime import datetime
 
 
-class PerspectiveService:
+def _merge_section_sql(section: str) -> str:
+    """
+    Builds a SQL expression that merges the JSONB array bound to %(items)s into
+    p.<section>, matching items by SECTION_MERGE_KEYS[section].
+
+    Existing items keep their position and are replaced by the incoming item with
+    the same key (every one of them, if the stored array repeats the key);
+    incoming items without a match are appended in request order.
+    If the request repeats a key, the last occurrence wins.
+    """
+    keys = SECTION_MERGE_KEYS[section]
+
+    def key_expr(alias):
+        return "jsonb_build_array({})".format(", ".join(f"{alias}.item -> '{k}'" for k in keys))
+
+    return f"""(
+        WITH incoming AS (
+            SELECT DISTINCT ON (i.key) i.item, i.key, i.ord
+            FROM (
+                SELECT i.item, {key_expr('i')} AS key, i.ord
+                FROM jsonb_array_elements(%(items)s::jsonb) WITH ORDINALITY AS i(item, ord)
+            ) AS i
+            ORDER BY i.key, i.ord DESC
+        ),
+        existing AS (
+            SELECT e.item, {key_expr('e')} AS key, e.ord
+            FROM jsonb_array_elements(COALESCE(p.{section}, '[]'::jsonb)) WITH ORDINALITY AS e(item, ord)
+        )
+        SELECT COALESCE(jsonb_agg(merged.item ORDER BY merged.grp, merged.ord), '[]'::jsonb)
+        FROM (
+            SELECT COALESCE(incoming.item, existing.item) AS item, 0 AS grp, existing.ord
+            FROM existing LEFT JOIN incoming ON incoming.key = existing.key
+            UNION ALL
+            SELECT incoming.item, 1 AS grp, incoming.ord
+            FROM incoming
+            WHERE NOT EXISTS (SELECT 1 FROM existing WHERE existing.key = incoming.key)
+        ) AS merged
+    )"""
+
+
+# Columns of a full perspective row. Statements name them instead of using `*`, so a
+# prepared statement keeps its result type when a migration adds a column.
+_ROW_COLUMNS = ", ".join(DOCUMENT_FIELDS)
+_P_ROW_COLUMNS = ", ".join(f"p.{column}" for column in DOCUMENT_FIELDS)
+
+
+def _build_section_write_queries(section: str, merge: bool):
+    """
+    Builds the (insert-or-write, update-only) statement pair for one JSONB section.
+
+    With `merge` the incoming items are merged into the stored ones and only the
+    section is returned; otherwise the section is replaced and the full row returned.
+    """
+    value = _merge_section_sql(section) if merge else "%(items)s::jsonb"
+    other_sections = [s for s in SECTION_MERGE_KEYS if s != section]
+    if merge:
+        returning = f"RETURNING p.id, p.username, p.layout_name, p.updated_by, p.{section}, p.updated_time, p.version"
+    else:
+        returning = f"RETURNING {_P_ROW_COLUMNS}"
+
+    upsert = f"""
+        INSERT INTO recsui.perspectives AS p
+            (username, layout_name, updated_by, {section}, {other_sections[0]}, {other_sections[1]})
+        VALUES (%(username)s, %(layout_name)s, %(updated_by)s, %(items)s::jsonb, '[]'::jsonb, '[]'::jsonb)
+        ON CONFLICT (username) DO UPDATE SET
+            layout_name = EXCLUDED.layout_name,
+            updated_by = EXCLUDED.updated_by,
+            {section} = {value},
+            updated_time = now(),
+            version = p.version + 1
+        {returning}, (p.xmax = 0) AS created;
+    """
+    update_only = f"""
+        UPDATE recsui.perspectives AS p SET
+            layout_name = COALESCE(%(layout_name)s, p.layout_name),
+            updated_by = COALESCE(%(updated_by)s, p.updated_by),
+            {section} = {value},
+            updated_time = now(),
+            version = p.version + 1
+        WHERE p.username = %(username)s
+        {returning}, FALSE AS created;
+    """
+    return upsert, update_only
+
+
+_SECTION_MERGE_QUERIES = {section: _build_section_write_queries(section, merge=True) for section in SECTION_MERGE_KEYS}
+_SECTION_REPLACE_QUERIES = {section: _build_section_write_queries(section, merge=False) for section in SECTION_MERGE_KEYS}
+
+
+_BULK_UPSERT_QUERY = """
+    INSERT INTO recsui.perspectives AS p (username, layout_name, updated_by, column_state, sort_model, filter_model)
+    VALUES %s
+    ON CONFLICT (username) DO UPDATE SET
+        layout_name = EXCLUDED.layout_name,
+        updated_by = EXCLUDED.updated_by,
+        column_state = EXCLUDED.column_state,
+        sort_model = EXCLUDED.sort_model,
+        filter_model = EXCLUDED.filter_model,
+        updated_time = now(),
+        version = p.version + 1
+    RETURNING p.id, p.username, (p.xmax = 0) AS created;
+"""
+_BULK_UPSERT_TEMPLATE = "(%s, %s, %s, %s::jsonb, %s::jsonb, %s::jsonb)"
+
+
+# Columns of the response document, in the key order of the Perspective schema.
+# Postgres assembles the JSON text itself, so reads never decode the JSONB columns
+# or build DTO/pydantic objects; payloads are validated when they are written.
+_PERSPECTIVE_DOCUMENT = """json_build_object(
+    'username', p.username,
+    'layout_name', p.layout_name,
+    'updated_by', p.updated_by,
+    'column_state', p.column_state,
+    'sort_model', p.sort_model,
+    'filter_model', p.filter_model,
+    'id', p.id,
+    'updated_time', to_char(p.updated_time AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"'),
+    'version', p.version
+)"""
+
+
+# Field names used as keys of a sort_model/filter_model item's `filters`, as a JSONB
+# array. Must stay identical to the perspectives_*_fields_gin index expressions
+# (migration 5) for those indexes to be used.
+_FILTER_FIELDS_EXPR = "jsonb_path_query_array(p.{section}, '$[*].filters ? (@.type() == \"object\").keyvalue().key')"
+
+_DOCUMENT_BY_ID_QUERY = (f"SELECT p.id, p.username, p.updated_time, {_PERSPECTIVE_DOCUMENT}::text AS body "
+                         f"FROM recsui.perspectives AS p WHERE p.id = %s;")
+_DOCUMENT_BY_USERNAME_QUERY = (f"SELECT p.id, p.username, p.updated_time, {_PERSPECTIVE_DOCUMENT}::text AS body "
+                               f"FROM recsui.perspectives AS p WHERE p.username = %s;")
+_ALL_DOCUMENTS_QUERY = f"SELECT json_agg({_PERSPECTIVE_DOCUMENT} ORDER BY p.id)::text FROM recsui.perspectives AS p;"
+_DOCUMENT_PAGE_QUERY = f"""
+    SELECT COALESCE(json_agg(page.doc ORDER BY page.id), '[]')::text AS items,
+           max(page.id) AS last_id, count(*) AS n
+    FROM (
+        SELECT p.id, {_PERSPECTIVE_DOCUMENT} AS doc
+        FROM recsui.perspectives AS p WHERE p.id > %s ORDER BY p.id LIMIT %s
+    ) AS page;
+"""
+
+_SELECT_ALL_QUERY = f"SELECT {_ROW_COLUMNS} FROM recsui.perspectives;"
+_SELECT_ORDERED_QUERY = f"SELECT {_ROW_COLUMNS} FROM recsui.perspectives ORDER BY id;"
+_SELECT_PAGE_QUERY = f"SELECT {_ROW_COLUMNS} FROM recsui.perspectives WHERE id > %s ORDER BY id LIMIT %s;"
+_SELECT_BY_ID_QUERY = f"SELECT {_ROW_COLUMNS} FROM recsui.perspectives WHERE id = %s;"
+_SELECT_BY_USERNAME_QUERY = f"SELECT {_ROW_COLUMNS} FROM recsui.perspectives WHERE username = %s;"
+_ETAG_BY_ID_QUERY = "SELECT id, updated_time FROM recsui.perspectives WHERE id = %s;"
+_ETAG_BY_USERNAME_QUERY = "SELECT id, updated_time FROM recsui.perspectives WHERE username = %s;"
+_DELETE_QUERY = "DELETE FROM recsui.perspectives WHERE id = %s RETURNING id;"
+
+# Document key -> SQL expression, for projections (see `_projection_statement`).
+_DOCUMENT_EXPRESSIONS = {
+    **{field: f"p.{field}" for field in DOCUMENT_FIELDS},
+    'updated_time': """to_char(p.updated_time AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')""",
+}
+
+_SECTION_READ_QUERIES = {
+    section: f"SELECT id, version, {section} FROM recsui.perspectives WHERE username = %s;"
+    for section in SECTION_MERGE_KEYS
+}
+_SECTION_CAS_QUERIES = {
+    section: f"""
+        UPDATE recsui.perspectives
+        SET {section} = %s::jsonb, updated_time = now(), version = version + 1
+        WHERE id = %s AND version = %s
+        RETURNING {_ROW_COLUMNS};
+    """
+    for section in SECTION_MERGE_KEYS
+}
+
+@lru_cache(maxsize=None)
+def _update_statement(key_column: str, columns: Tuple[str, ...], if_match: bool) -> Tuple[str, str]:
+    """
+    Returns the (prepared statement name, SQL) of the canonical UPDATE that sets
+    `columns` on the row matching `key_column`, optionally guarded by If-Match.
+    There is exactly one statement per combination, so each is prepared once per
+    connection however the request orders its fields.
+    """
+    mask = sum(1 << UPDATABLE_FIELDS.index(column) for column in columns)
+    assignments = [f"{c} = %s::jsonb" if c in SECTION_MERGE_KEYS else f"{c} = %s" for c in columns]
+    # Every write moves updated_time forward (which also changes the ETag) and bumps the version.
+    assignments += ["updated_time = now()", "version = version + 1"]
+    query = f"UPDATE recsui.perspectives SET {', '.join(assignments)} WHERE {key_column} = %s"
+    if if_match:
+        query += " AND updated_time = ANY(%s)"
+    query += f" RETURNING {_ROW_COLUMNS};"
+    return f"perspective_update_by_{key_column}_{mask}{'_if_match' if if_match else ''}", query
+
+
+@lru_cache(maxsize=None)
+def _field_statements(fields: Tuple[str, ...]) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+    """
+    Returns the (prepared statement name, SQL) of the read and of the
+    version-guarded write of `fields` (in UPDATABLE_FIELDS order), for
+    `modify_perspective_fields`.
+    """
+    mask = sum(1 << UPDATABLE_FIELDS.index(field) for field in fields)
+    read = f"SELECT id, version, updated_time, {', '.join(fields)} FROM recsui.perspectives WHERE username = %s;"
+    assignments = [f"{c} = %s::jsonb" if c in SECTION_MERGE_KEYS else f"{c} = %s" for c in fields]
+    cas = (f"UPDATE recsui.perspectives SET {', '.join(assignments)}, updated_time = now(), version = version + 1 "
+           f"WHERE id = %s AND version = %s RETURNING id, username, updated_time, version;")
+    return (f"perspective_read_fields_{mask}", read), (f"perspective_cas_fields_{mask}", cas)
+
+
+@lru_cache(maxsize=None)
+def _projection_statement(key_column: str, fields: Tuple[str, ...], view: bool, paged: bool,
+                          bounded: bool, source: Tuple[str, str] = ('perspective', 'recsui.perspectives')
+                          ) -> Tuple[str, str]:
+    """
+    Returns the (prepared statement name, SQL) of the document holding only `fields`
+    (in DOCUMENT_FIELDS order) of the row matching `key_column`. `source` is the
+    (statement name prefix, relation) read from.
+
+    Columns outside `fields` are not referenced, so their TOASTed JSONB values are
+    never fetched or decompressed. With `view`, each section keeps only the items
+    whose view is %(view)s. With `paged`, PAGED_SECTION keeps the items from index
+    %(first)s up to %(last)s (`bounded`) or to its end. Both are jsonpath filters
+    that run inside Postgres, so only the selected items are sent.
+    """
+    pairs = []
+    for field in fields:
+        expression = _DOCUMENT_EXPRESSIONS[field]
+        if field in SECTION_MERGE_KEYS and view:
+            expression = (f"jsonb_path_query_array({expression}, '$[*] ? (@.view == $view)', "
+                          f"jsonb_build_object('view', %(view)s::text))")
+        if field == PAGED_SECTION and paged:
+            bounds = "'first', %(first)s::int, 'last', %(last)s::int" if bounded else "'first', %(first)s::int"
+            expression = (f"jsonb_path_query_array({expression}, '$[$first to {'$last' if bounded else 'last'}]', "
+                          f"jsonb_build_object({bounds}))")
+        pairs.append(f"'{field}', {expression}")
+    prefix, relation = source
+    query = (f"SELECT p.id, p.updated_time, json_build_object({', '.join(pairs)})::text AS body "
+             f"FROM {relation} AS p WHERE p.{key_column} = %(key)s;")
+    mask = sum(1 << DOCUMENT_FIELDS.index(field) for field in fields)
+    return f"{prefix}_projection_by_{key_column}_{mask}_{int(view)}{int(paged)}{int(bounded)}", query
+
+
+@lru_cache(maxsize=None)
+def _search_statement(column: bool, view: bool, filter_field: bool) -> Tuple[str, str]:
+    """Returns the (prepared statement name, SQL) of the search for one combination of criteria."""
+    conditions = []
+    if column:
+        conditions.append(
+            f"(p.column_state @> %s::jsonb OR {_FILTER_FIELDS_EXPR.format(section='sort_model')} @> %s::jsonb "
+            f"OR {_FILTER_FIELDS_EXPR.format(section='filter_model')} @> %s::jsonb)"
+        )
+    if view:
+        conditions.append("(p.column_state @> %s::jsonb OR p.sort_model @> %s::jsonb OR p.filter_model @> %s::jsonb)")
+    if filter_field:
+        conditions.append(f"{_FILTER_FIELDS_EXPR.format(section='filter_model')} @> %s::jsonb")
+    query = f"""
+        SELECT p.id, p.username, p.layout_name, p.updated_by, p.updated_time
+        FROM recsui.perspectives AS p
+        WHERE p.id > %s AND {' AND '.join(conditions)}
+        ORDER BY p.id LIMIT %s;
+    """
+    return f"perspective_search_{int(column)}{int(view)}{int(filter_field)}", query
+
+
+def _changed_columns(perspective_in: PerspectiveUpdate) -> Dict[str, Any]:
+    """Column -> database value for every field set on `perspective_in`, in canonical order."""
+    values = changed_fields(perspective_in)
+    for column in SECTION_MERGE_KEYS.keys() & values.keys():
+        # Sections are passed to Postgres as JSON strings
+        values[column] = json.dumps(values[column])
+    return values
+
+
+class PerspectiveService(PerspectiveStorage):
     """Service class for performing CRUD operations on Perspective data using psycopg2."""
 
+    # (statement name prefix, relation) projections read from: a table or view with the
+    # columns of recsui.perspectives.
+    _projection_source = ('perspective', 'recsui.perspectives')
+
     def __init__(self, db_conn: connection, db_curr: cursor):
         self.db_conn = db_conn
         self.db_curr = db_curr
 
+    def _execute(self, name: str, query: str, params=None):
+        """Runs one of the service's fixed statements, prepared server-side on pooled connections."""
+        execute_statement(self.db_curr, name, query, params, conn=self.db_conn)
+
     def get_all_perspectives(self) -> List[PerspectiveModel]:
         """Retrieves all perspective records from the database."""
-        self.db_curr.execute("SELECT * FROM recsui.perspectives;")
+        self._execute("perspective_select_all", _SELECT_ALL_QUERY)
         perspectives = self.db_curr.fetchall()
         return [PerspectiveModel.from_dict(p) for p in perspectives]
 
+    def get_perspectives_page(self, after_id: int, limit: int) -> List[PerspectiveModel]:
+        """
+        Retrieves up to `limit` perspectives with an id greater than `after_id`, ordered by id.
+
+        Keyset pagination: the primary key index seeks straight to `after_id`, so
+        every page costs the same no matter how deep into the table it is.
+        """
+        self._execute("perspective_select_page", _SELECT_PAGE_QUERY, (after_id, limit))
+        return [PerspectiveModel.from_dict(p) for p in self.db_curr.fetchall()]
+
+    def iter_perspectives(self, itersize: int = 1000) -> Iterator[PerspectiveModel]:
+        """
+        Yields every perspective ordered by id through a named (server-side) cursor.
+
+        Rows are fetched `itersize` at a time, so memory stays flat regardless of the
+        table size. The connection must not be used for anything else until the
+        iterator is exhausted or closed.
+        """
+        named_curr = self.db_conn.cursor(name='perspectives_stream', cursor_factory=DictCursor)
+        named_curr.itersize = itersize
+        try:
+            named_curr.execute(_SELECT_ORDERED_QUERY)
+            for perspective in named_curr:
+                yield PerspectiveModel.from_dict(perspective)
+        finally:
+            named_curr.close()
+            self.db_conn.rollback()
+
     def get_perspective_by_id(self, perspective_id: int) -> Optional[PerspectiveModel]:
         """Retrieves a single perspective record by its ID."""
-        self.db_curr.execute("SELECT * FROM recsui.perspectives WHERE id = %s;", (perspective_id,))
+        self._execute("perspective_select_by_id", _SELECT_BY_ID_QUERY, (perspective_id,))
         perspective = self.db_curr.fetchone()
         return PerspectiveModel.from_dict(perspective)
 
     def get_perspective_by_username(self, username: str) -> Optional[PerspectiveModel]:
         """Retrieves a single perspective record by its username."""
-        self.db_curr.execute("SELECT * FROM recsui.perspectives WHERE username = %s;", (username,))
+        self._execute("perspective_select_by_username", _SELECT_BY_USERNAME_QUERY, (username,))
         perspective = self.db_curr.fetchone()
         return PerspectiveModel.from_dict(perspective)
 
+    def load_perspective_document(self, perspective_id: Optional[int] = None,
+                                  username: Optional[str] = None) -> Optional[Tuple[int, str, bytes, str]]:
+        """
+        Fetches one perspective as a finished JSON document built by Postgres.
+
+        Returns (id, username, body, etag), or None if it does not exist.
+        """
+        if perspective_id is not None:
+            self._execute("perspective_document_by_id", _DOCUMENT_BY_ID_QUERY, (perspective_id,))
+        else:
+            self._execute("perspective_document_by_username", _DOCUMENT_BY_USERNAME_QUERY, (username,))
+        row = self.db_curr.fetchone()
+        if row is None:
+            return None
+        return row['id'], row['username'], row['body'].encode(), make_etag(row['id'], row['updated_time'])
+
+    def load_perspective_projection(self, fields: Tuple[str, ...], view: Optional[str] = None,
+                                    offset: int = 0, limit: Optional[int] = None,
+                                    perspective_id: Optional[int] = None,
+                                    username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """
+        Fetches part of one perspective as a JSON document built by Postgres (see
+        `_projection_statement`). Only the requested columns are read, and the view
+        filter and column_state paging run in jsonpath.
+
+        Returns (body, etag), or None if it does not exist.
+        """
+        key_column, key = ('id', perspective_id) if perspective_id is not None else ('username', username)
+        paged = offset > 0 or limit is not None
+        name, query = _projection_statement(key_column, fields, view is not None, paged, limit is not None,
+                                           self._projection_source)
+        params = {'key': key, 'view': view, 'first': offset}
+        if limit is not None:
+            params['last'] = offset + limit - 1
+        self._execute(name, query, params)
+        row = self.db_curr.fetchone()
+        if row is None:
+            return None
+        return row['body'].encode(), make_etag(row['id'], row['updated_time'])
+
+    def get_all_perspectives_json(self) -> Optional[str]:
+        """Returns every perspective as one JSON array built by Postgres, or None if there are none."""
+        self._execute("perspective_all_documents", _ALL_DOCUMENTS_QUERY)
+        return self.db_curr.fetchone()[0]
+
+    def get_perspectives_page_json(self, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+        """
+        JSON counterpart of `get_perspectives_page`.
+
+        Returns (items, next_after_id): the page as a JSON array built by Postgres, and
+        the cursor for the following page (None when this page is the last one).
+        """
+        self._execute("perspective_document_page", _DOCUMENT_PAGE_QUERY, (after_id, limit))
+        row = self.db_curr.fetchone()
+        return row['items'], row['last_id'] if row['n'] == limit else None
+
+    def iter_perspective_json(self, itersize: int = 1000) -> Iterator[str]:
+        """
+        JSON counterpart of `iter_perspectives`: yields each perspective as a JSON
+        document built by Postgres, ordered by id, through a named cursor.
+        """
+        named_curr = self.db_conn.cursor(name='perspectives_json_stream')
+        named_curr.itersize = itersize
+        try:
+            named_curr.execute(f"SELECT {_PERSPECTIVE_DOCUMENT}::text FROM recsui.perspectives AS p ORDER BY p.id;")
+            for (document,) in named_curr:
+                yield document
+        finally:
+            named_curr.close()
+            self.db_conn.rollback()
+
+    def search_perspectives(self, column: Optional[str] = None, view: Optional[str] = None,
+                            filter_field: Optional[str] = None, after_id: int = 0,
+                            limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+        """
+        Finds the perspectives that reference a column, a view and/or a filter field.
+
+        - `column`: listed in a column_state item's defaultColumns, or used as a
+          sort_model/filter_model filters key.
+        - `view`: the view of any column_state, sort_model or filter_model item.
+        - `filter_field`: used as a filter_model filters key.
+
+        Criteria are combined with AND and answered from the GIN indexes with jsonb
+        containment. Results are keyset-paginated by id like `get_perspectives_page`.
+        Returns (rows of id, username, layout_name, updated_by, updated_time; next_after_id).
+        """
+        params = []
+        if column is not None:
+            params += [json.dumps([{'defaultColumns': [column]}]), json.dumps([column]), json.dumps([column])]
+        if view is not None:
+            params += [json.dumps([{'view': view}])] * 3
+        if filter_field is not None:
+            params.append(json.dumps([filter_field]))
+        if not params:
+            raise ValueError("At least one of column, view or filter_field is required.")
+
+        name, query = _search_statement(column is not None, view is not None, filter_field is not None)
+        self._execute(name, query, (after_id, *params, limit))
+        rows = [dict(row) for row in self.db_curr.fetchall()]
+        return rows, rows[-1]['id'] if len(rows) == limit else None
+
+    def _load_perspective_etag(self, perspective_id: Optional[int] = None,
+                               username: Optional[str] = None) -> Optional[str]:
+        """Reads the ETag from updated_time alone, without reading or decoding the JSONB columns."""
+        if perspective_id is not None:
+            self._execute("perspective_etag_by_id", _ETAG_BY_ID_QUERY, (perspective_id,))
+        else:
+            self._execute("perspective_etag_by_username", _ETAG_BY_USERNAME_QUERY, (username,))
+        row = self.db_curr.fetchone()
+        return make_etag(row['id'], row['updated_time']) if row else None
+
     def create_perspective(self, perspective_in: PerspectiveCreate) -> PerspectiveModel:
         """Creates a new perspective record in the database."""
         # Convert Pydantic models to JSON strings for database insertion
@@ -40,10 +464,11 @@ class PerspectiveService:
         filter_model_json = json.dumps([fm.model_dump() for fm in perspective_in.filter_model])
 
         try:
-            self.db_curr.execute(
-                """
+            self._execute(
+                "perspective_insert",
+                f"""
                 INSERT INTO recsui.perspectives (username, layout_name, updated_by, column_state, sort_model, filter_model)
-                VALUES (%s, %s, %s, %s, %s, %s) RETURNING *;
+                VALUES (%s, %s, %s, %s, %s, %s) RETURNING {_ROW_COLUMNS};
                 """,
                 (
                     perspective_in.username,
@@ -56,54 +481,94 @@ class PerspectiveService:
             )
             new_perspective = self.db_curr.fetchone()
             self.db_conn.commit()
+            self._invalidate_cache(new_perspective['id'], new_perspective['username'])
             return PerspectiveModel.from_dict(new_perspective)
         except Exception as e:
             self.db_conn.rollback()
             raise e
 
-    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate) -> Optional[PerspectiveModel]:
-        """Updates an existing perspective record."""
+    def bulk_upsert_perspectives(self, perspectives: List[PerspectiveCreate], chunk_size: int = 1000) -> List[dict]:
+        """
+        Creates or replaces many perspectives with multi-row INSERT ... ON CONFLICT statements.
+
+        Each chunk of `chunk_size` rows is written and committed in its own transaction,
+        so one failing chunk does not undo the others. Usernames must be unique within
+        the call. Returns one result per input, in input order:
+        {"username", "status": "created" | "updated" | "failed", "id" | "error"}.
+        """
+        results = []
+        for start in range(0, len(perspectives), chunk_size):
+            chunk = perspectives[start:start + chunk_size]
+            rows = [
+                (
+                    p.username,
+                    p.layout_name,
+                    p.updated_by,
+                    json.dumps([cs.model_dump() for cs in p.column_state]),
+                    json.dumps([sm.model_dump() for sm in p.sort_model]),
+                    json.dumps([fm.model_dump() for fm in p.filter_model]),
+                )
+                for p in chunk
+            ]
+            try:
+                written = execute_values(
+                    self.db_curr, _BULK_UPSERT_QUERY, rows, template=_BULK_UPSERT_TEMPLATE,
+                    page_size=len(rows), fetch=True
+                )
+                self.db_conn.commit()
+            except psycopg2.Error as e:
+                self.db_conn.rollback()
+                results.extend({"username": p.username, "status": "failed", "error": str(e)} for p in chunk)
+                continue
+
+            by_username = {row['username']: row for row in written}
+            for p in chunk:
+                row = by_username[p.username]
+                results.append({
+                    "username": p.username,
+                    "status": "created" if row['created'] else "updated",
+                    "id": row['id'],
+                })
+                self._invalidate_cache(row['id'], p.username)
+        return results
+
+    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[PerspectiveModel]:
+        """
+        Updates an existing perspective record.
+
+        If `if_match` is given, the update only applies while the row's updated_time
+        is one of those values (decoded from If-Match ETags); otherwise
+        PreconditionFailedError is raised.
+        """
         # Check if the perspective exists
         perspective_to_update = self.get_perspective_by_id(perspective_id)
         if not perspective_to_update:
             return None
 
-        # Build the update query dynamically
-        update_clauses = []
-        update_data = []
-
-        # Convert Pydantic models to JSON strings for database update
-        perspective_dict = perspective_in.model_dump(exclude_unset=True)
-
-        if 'username' in perspective_dict:
-            update_clauses.append("username = %s")
-            update_data.append(perspective_dict['username'])
-        if 'layout_name' in perspective_dict:
-            update_clauses.append("layout_name = %s")
-            update_data.append(perspective_dict['layout_name'])
-        if 'updated_by' in perspective_dict:
-            update_clauses.append("updated_by = %s")
-            update_data.append(perspective_dict['updated_by'])
-        if 'column_state' in perspective_dict:
-            update_clauses.append("column_state = %s")
-            update_data.append(json.dumps([cs.model_dump() for cs in perspective_in.column_state]))
-        if 'sort_model' in perspective_dict:
-            update_clauses.append("sort_model = %s")
-            update_data.append(json.dumps([sm.model_dump() for sm in perspective_in.sort_model]))
-        if 'filter_model' in perspective_dict:
-            update_clauses.append("filter_model = %s")
-            update_data.append(json.dumps([fm.model_dump() for fm in perspective_in.filter_model]))
-
-        if not update_clauses:
+        # The precondition holds for empty updates too: a stale ETag fails even when nothing would change.
+        if if_match is not None and perspective_to_update.updated_time not in if_match:
+            raise PreconditionFailedError(f"Perspective with id {perspective_id} has been modified.")
+
+        changes = _changed_columns(perspective_in)
+        if not changes:
             return perspective_to_update  # No changes to apply
 
-        query = f"UPDATE recsui.perspectives SET {', '.join(update_clauses)} WHERE id = %s RETURNING *;"
-        update_data.append(perspective_id)
+        name, query = _update_statement('id', tuple(changes), if_match is not None)
+        update_data = [*changes.values(), perspective_id]
+        if if_match is not None:
+            update_data.append(if_match)
 
         try:
-            self.db_curr.execute(query, tuple(update_data))
+            self._execute(name, query, update_data)
             updated_perspective = self.db_curr.fetchone()
+            if updated_perspective is None:
+                self.db_conn.rollback()
+                if if_match is None:
+                    return None  # Deleted since it was read
+                raise PreconditionFailedError(f"Perspective with id {perspective_id} has been modified.")
             self.db_conn.commit()
+            self._invalidate_cache(perspective_id, perspective_to_update.username, updated_perspective['username'])
             return PerspectiveModel.from_dict(updated_perspective)
         except Exception as e:
             self.db_conn.rollback()
@@ -112,10 +577,11 @@ class PerspectiveService:
     def delete_perspective(self, perspective_id: int) -> bool:
         """Deletes a perspective record by its ID."""
         try:
-            self.db_curr.execute("DELETE FROM recsui.perspectives WHERE id = %s RETURNING id;", (perspective_id,))
+            self._execute("perspective_delete", _DELETE_QUERY, (perspective_id,))
             deleted_row = self.db_curr.fetchone()
             if deleted_row:
                 self.db_conn.commit()
+                self._invalidate_cache(perspective_id)
                 return True
             else:
                 self.db_conn.rollback()
@@ -132,43 +598,169 @@ class PerspectiveService:
         if not perspective_to_update:
             return None
 
-        # Build the update query dynamically
-        update_clauses = []
-        update_data = []
-
-        # Convert Pydantic models to JSON strings for database update
-        perspective_dict = perspective_in.model_dump(exclude_unset=True)
-
-        if 'username' in perspective_dict:
-            update_clauses.append("username = %s")
-            update_data.append(perspective_dict['username'])
-        if 'layout_name' in perspective_dict:
-            update_clauses.append("layout_name = %s")
-            update_data.append(perspective_dict['layout_name'])
-        if 'updated_by' in perspective_dict:
-            update_clauses.append("updated_by = %s")
-            update_data.append(perspective_dict['updated_by'])
-        if 'column_state' in perspective_dict:
-            update_clauses.append("column_state = %s")
-            update_data.append(json.dumps([cs.model_dump() for cs in perspective_in.column_state]))
-        if 'sort_model' in perspective_dict:
-            update_clauses.append("sort_model = %s")
-            update_data.append(json.dumps([sm.model_dump() for sm in perspective_in.sort_model]))
-        if 'filter_model' in perspective_dict:
-            update_clauses.append("filter_model = %s")
-            update_data.append(json.dumps([fm.model_dump() for fm in perspective_in.filter_model]))
-
-        if not update_clauses:
-            return PerspectiveModel.from_dict(perspective_to_update)  # No changes to apply
-
-        query = f"UPDATE recsui.perspectives SET {', '.join(update_clauses)} WHERE username = %s RETURNING *;"
-        update_data.append(username)
+        changes = _changed_columns(perspective_in)
+        if not changes:
+            return perspective_to_update  # No changes to apply
+
+        name, query = _update_statement('username', tuple(changes), False)
+        update_data = [*changes.values(), username]
 
         try:
-            self.db_curr.execute(query, tuple(update_data))
+            self._execute(name, query, update_data)
             updated_perspective = self.db_curr.fetchone()
             self.db_conn.commit()
+            self._invalidate_cache(updated_perspective['id'], username, updated_perspective['username'])
             return PerspectiveModel.from_dict(updated_perspective)
         except Exception as e:
             self.db_conn.rollback()
-            raise e
\ No newline at end of file
+            raise e
+
+    def upsert_section_items(self, section: str, username: str, items: List[dict],
+                             layout_name: Optional[str] = None,
+                             updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Merges `items` into one JSONB section of a user's perspective in a single statement.
+
+        Items are matched by SECTION_MERGE_KEYS[section] and merged inside Postgres, so
+        concurrent saves for the same user cannot overwrite each other and the other
+        sections are never read or rewritten. If both `layout_name` and `updated_by`
+        are given, a missing perspective is created; otherwise only an existing one is
+        updated and None is returned when the user has no perspective.
+
+        Returns the row's id, username, layout_name, updated_by, updated_time, the merged
+        section and a `created` flag.
+        """
+        return self._write_section(f"perspective_merge_{section}", _SECTION_MERGE_QUERIES[section],
+                                   username, items, layout_name, updated_by)
+
+    def replace_section_items(self, section: str, username: str, items: List[dict],
+                              layout_name: Optional[str] = None,
+                              updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Replaces one JSONB section of a user's perspective in a single statement,
+        without reading the row first. Creation rules are the same as for
+        `upsert_section_items`. Returns the full row plus a `created` flag.
+        """
+        return self._write_section(f"perspective_replace_{section}", _SECTION_REPLACE_QUERIES[section],
+                                   username, items, layout_name, updated_by)
+
+    def _write_section(self, name: str, queries, username: str, items: List[dict],
+                       layout_name: Optional[str], updated_by: Optional[str]) -> Optional[dict]:
+        upsert, update_only = queries
+        if layout_name and updated_by:
+            name, query = f"{name}_upsert", upsert
+        else:
+            name, query = f"{name}_update", update_only
+        params = {
+            'username': username,
+            'layout_name': layout_name or None,
+            'updated_by': updated_by or None,
+            'items': json.dumps(items),
+        }
+        try:
+            self._execute(name, query, params)
+            row = self.db_curr.fetchone()
+            self.db_conn.commit()
+        except Exception as e:
+            self.db_conn.rollback()
+            raise e
+        if not row:
+            return None
+        self._invalidate_cache(row['id'], username)
+        return dict(row)
+
+    def modify_section_items(self, section: str, username: str, mutate: Callable[[List[dict]], List[dict]],
+                             max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """
+        Read-modify-write of one JSONB section guarded by the row's version number.
+
+        `mutate` receives the stored items and returns the new list (it may raise
+        ItemNotFoundError). The write is a compare-and-swap
+        `UPDATE ... WHERE version = <version read>`; if another writer got there
+        first the section is re-read and `mutate` re-applied, up to `max_retries`
+        times, after which ConcurrentModificationError is raised. No locks are taken.
+
+        Returns the full updated row, or None if the user has no perspective.
+        """
+        attempts = 0
+        while attempts <= max_retries:
+            attempts += 1
+            try:
+                self._execute(f"perspective_read_{section}", _SECTION_READ_QUERIES[section], (username,))
+                current = self.db_curr.fetchone()
+                if current is None:
+                    self.db_conn.rollback()
+                    return None
+
+                items = mutate(current[section] or [])
+
+                self._execute(f"perspective_cas_{section}", _SECTION_CAS_QUERIES[section],
+                              (json.dumps(items), current['id'], current['version']))
+                updated = self.db_curr.fetchone()
+                self.db_conn.commit()
+            except Exception as e:
+                self.db_conn.rollback()
+                raise e
+
+            if updated is not None:
+                concurrency_stats.record(attempts, succeeded=True)
+                self._invalidate_cache(updated['id'], username)
+                return dict(updated)
+            # Lost the race: back off briefly (with jitter) so competing writers spread out.
+            if attempts <= max_retries:
+                time.sleep(random.uniform(0, PERSPECTIVE_CAS_BACKOFF * attempts))
+
+        concurrency_stats.record(attempts, succeeded=False)
+        raise ConcurrentModificationError(
+            f"Perspective for user '{username}' kept changing; gave up after {attempts} attempts."
+        )
+
+    def modify_perspective_fields(self, username: str, fields: Tuple[str, ...],
+                                  mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                                  if_match: Optional[Iterable[str]] = None,
+                                  max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """
+        Read-modify-write of some columns of a user's perspective, guarded by the row's
+        version number like `modify_section_items`. Only `fields` are read and written.
+
+        With `if_match` (ETags), the row read must still carry one of them, otherwise
+        PreconditionFailedError is raised; a concurrent write between the read and the
+        write makes the retry fail that check. Returns the row's id, username,
+        updated_time and version, or None if the user has no perspective.
+        """
+        (read_name, read_query), (cas_name, cas_query) = _field_statements(fields)
+        attempts = 0
+        while attempts <= max_retries:
+            attempts += 1
+            try:
+                self._execute(read_name, read_query, (username,))
+                current = self.db_curr.fetchone()
+                if current is None:
+                    self.db_conn.rollback()
+                    return None
+                if if_match is not None and not etag_matches(current['id'], current['updated_time'], if_match):
+                    self.db_conn.rollback()
+                    raise PreconditionFailedError(f"Perspective for user '{username}' has been modified.")
+
+                values = mutate({field: current[field] for field in fields})
+                params = [json.dumps(values[f]) if f in SECTION_MERGE_KEYS else values[f] for f in fields]
+
+                self._execute(cas_name, cas_query, (*params, current['id'], current['version']))
+                updated = self.db_curr.fetchone()
+                self.db_conn.commit()
+            except Exception as e:
+                self.db_conn.rollback()
+                raise e
+
+            if updated is not None:
+                concurrency_stats.record(attempts, succeeded=True)
+                self._invalidate_cache(updated['id'], username)
+                return dict(updated)
+            # Lost the race: back off briefly (with jitter) so competing writers spread out.
+            if attempts <= max_retries:
+                time.sleep(random.uniform(0, PERSPECTIVE_CAS_BACKOFF * attempts))
+
+        concurrency_stats.record(attempts, succeeded=False)
+        raise ConcurrentModificationError(
+            f"Perspective for user '{username}' kept changing; gave up after {attempts} attempts."
+        )
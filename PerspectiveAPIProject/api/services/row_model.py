@@ -0,0 +1,474 @@
+"""
+Server-side row model: applies a user's saved filter_model and sort_model to a
+local dataset and returns one page of rows, so the grid no longer has to load
+and filter a whole dataset in the browser.
+
+Datasets live in ROW_MODEL_DATA_DIR as `<dataset_id>.npy` (a structured array),
+`<dataset_id>.parquet` (needs pyarrow) or `<dataset_id>.csv` (header row first).
+Ids are letters, digits, '_' and '-'; `stats` is reserved, because
+/row_model/stats serves the cache counters. All datasets are served from
+memory-mapped NumPy columns:
+
+- A structured `.npy` file is mapped as it is.
+- CSV and Parquet files are converted once into one `.npy` file per column under
+  ROW_MODEL_CACHE_DIR, keyed by the source file's mtime and size, and those are
+  mapped. CSV columns are int64 or float64 when every value parses (empty
+  numeric cells become NaN), and strings otherwise.
+
+Loaded datasets are kept in an LRU of ROW_MODEL_MAX_DATASETS entries and are
+reloaded when their source file changes. Lower-cased copies of string columns,
+used by the case-insensitive text filters, are built on first use and kept with
+the dataset.
+
+Filters: each `ViewSetting.filters` entry is a column -> FilterDetail pair. The
+types are those of the grid's text and number filters: equals, notEqual,
+contains, notContains, startsWith, endsWith, lessThan, lessThanOrEqual,
+greaterThan, greaterThanOrEqual, blank and notBlank. Text comparisons ignore
+case. Entries with an empty `filter` are ignored, except blank and notBlank.
+The entries of an item are ANDed into one boolean mask, one vectorized
+comparison per column. Compiled predicates are cached by a hash of the filters.
+
+Sorting: a sort_model item's filters map columns to {"type": "asc"|"desc"}, in
+priority order. They are applied with one stable `np.lexsort` over the matching
+rows; string columns sort by their rank (`np.unique`), so descending order is a
+negated key for every dtype. The resulting row order is cached per
+(dataset version, filter hash, sort hash), so paging through a result costs a
+slice and the conversion of one page.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pq = None
+
+# Directory holding the datasets, one file per dataset id.
+ROW_MODEL_DATA_DIR = os.getenv("ROW_MODEL_DATA_DIR", "datasets")
+# Where CSV and Parquet datasets are converted to per-column .npy files.
+ROW_MODEL_CACHE_DIR = os.getenv("ROW_MODEL_CACHE_DIR", os.path.join(ROW_MODEL_DATA_DIR, ".columns"))
+# Datasets kept open (memory-mapped) at once.
+ROW_MODEL_MAX_DATASETS = int(os.getenv("ROW_MODEL_MAX_DATASETS", "16"))
+# Compiled filter predicates kept, by filter hash.
+ROW_MODEL_MAX_PREDICATES = int(os.getenv("ROW_MODEL_MAX_PREDICATES", "1024"))
+# Total bytes of cached row orders (8 bytes per matching row).
+ROW_MODEL_ORDER_CACHE_MAX_BYTES = int(os.getenv("ROW_MODEL_ORDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+DATASET_FORMATS = ('.npy', '.parquet', '.csv')
+
+# Dataset ids are file names without an extension; no path separators or dots.
+_DATASET_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+# Path segments under /row_model/ taken by other routes (/row_model/stats); no dataset can use them.
+RESERVED_DATASET_IDS = ('stats',)
+
+TEXT_FILTERS = ('contains', 'notContains', 'startsWith', 'endsWith')
+COMPARISON_FILTERS = ('equals', 'notEqual', 'lessThan', 'lessThanOrEqual', 'greaterThan', 'greaterThanOrEqual')
+BLANK_FILTERS = ('blank', 'notBlank')
+SORT_DIRECTIONS = ('asc', 'desc')
+
+
+class DatasetNotFoundError(Exception):
+    """Raised when no file in ROW_MODEL_DATA_DIR matches a dataset id."""
+
+
+class RowModelError(ValueError):
+    """Raised when a saved filter or sort cannot be applied to a dataset (unknown column or filter type)."""
+
+
+def dataset_source(dataset_id: str) -> str:
+    """
+    The path of a dataset's file. Raises DatasetNotFoundError for unknown or
+    malformed ids and RowModelError for RESERVED_DATASET_IDS.
+    """
+    if not _DATASET_ID.match(dataset_id):
+        raise DatasetNotFoundError(f"Dataset '{dataset_id}' not found.")
+    if dataset_id in RESERVED_DATASET_IDS:
+        raise RowModelError(f"'{dataset_id}' is reserved and cannot be used as a dataset id.")
+    for extension in DATASET_FORMATS:
+        path = os.path.join(ROW_MODEL_DATA_DIR, dataset_id + extension)
+        if os.path.isfile(path):
+            return path
+    raise DatasetNotFoundError(f"Dataset '{dataset_id}' not found.")
+
+
+def _parse_csv_column(values: List[str]):
+    """int64 if every value is an integer, float64 if every non-empty value is a number, else strings."""
+    try:
+        return np.array([int(v) for v in values], dtype=np.int64)
+    except (ValueError, OverflowError):
+        pass
+    try:
+        return np.array([float(v) if v != '' else np.nan for v in values], dtype=np.float64)
+    except ValueError:
+        return np.array(values, dtype=str)
+
+
+def _read_csv(path: str) -> Dict[str, "np.ndarray"]:
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = [row + [''] * (len(header) - len(row)) for row in reader]
+    return {name: _parse_csv_column([row[i] for row in rows]) for i, name in enumerate(header)}
+
+
+def _read_parquet(path: str) -> Dict[str, "np.ndarray"]:
+    if pq is None:
+        raise RowModelError("Parquet datasets require pyarrow.")
+    table = pq.read_table(path)
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        values = column.to_numpy(zero_copy_only=False)
+        if values.dtype == object:
+            values = np.array(['' if v is None else str(v) for v in values], dtype=str)
+        columns[name] = values
+    return columns
+
+
+def _convert(path: str, target: str):
+    """Writes the columns of a CSV or Parquet file as <target>/<n>.npy plus a columns.json with their names."""
+    columns = _read_parquet(path) if path.endswith('.parquet') else _read_csv(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    staging = tempfile.mkdtemp(dir=os.path.dirname(target), prefix='.converting-')
+    try:
+        for position, values in enumerate(columns.values()):
+            np.save(os.path.join(staging, f"{position}.npy"), values)
+        with open(os.path.join(staging, 'columns.json'), 'w') as f:
+            json.dump(list(columns), f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another process converted the same version first.
+            if not os.path.isdir(target):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class Dataset:
+    """The memory-mapped columns of one version of a dataset."""
+
+    def __init__(self, dataset_id: str, version: Tuple[int, int], columns: Dict[str, "np.ndarray"]):
+        self.dataset_id = dataset_id
+        self.version = version
+        self.columns = columns
+        self.length = len(next(iter(columns.values()))) if columns else 0
+        self._folded: Dict[str, "np.ndarray"] = {}
+
+    def column(self, name: str) -> "np.ndarray":
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise RowModelError(f"Dataset '{self.dataset_id}' has no column '{name}'.") from None
+
+    def folded(self, name: str) -> "np.ndarray":
+        """A lower-cased copy of a string column, built once per dataset."""
+        folded = self._folded.get(name)
+        if folded is None:
+            folded = self._folded[name] = np.char.lower(self.column(name))
+        return folded
+
+
+def _remove_stale_conversions(dataset_id: str, current: str):
+    """Deletes the converted columns of a dataset's earlier versions (open mappings stay readable)."""
+    stale = re.compile(re.escape(dataset_id) + r'-\d+-\d+$')
+    for entry in os.listdir(ROW_MODEL_CACHE_DIR):
+        path = os.path.join(ROW_MODEL_CACHE_DIR, entry)
+        if stale.match(entry) and path != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _open_dataset(dataset_id: str, path: str, version: Tuple[int, int]) -> Dataset:
+    if path.endswith('.npy'):
+        array = np.load(path, mmap_mode='r')
+        if array.dtype.names is None:
+            raise RowModelError(f"Dataset '{dataset_id}' must be a structured array with named fields.")
+        return Dataset(dataset_id, version, {name: array[name] for name in array.dtype.names})
+    target = os.path.join(ROW_MODEL_CACHE_DIR, f"{dataset_id}-{version[0]}-{version[1]}")
+    if not os.path.isdir(target):
+        _convert(path, target)
+        _remove_stale_conversions(dataset_id, target)
+    with open(os.path.join(target, 'columns.json')) as f:
+        names = json.load(f)
+    return Dataset(dataset_id, version, {
+        name: np.load(os.path.join(target, f"{position}.npy"), mmap_mode='r') for position, name in enumerate(names)
+    })
+
+
+def _canonical_hash(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class _Condition:
+    """One column's FilterDetail, parsed once; `mask` evaluates it against a dataset."""
+    __slots__ = ('column', 'type', 'text', 'number')
+
+    def __init__(self, column: str, detail: dict):
+        filter_type = detail.get('type')
+        if filter_type not in TEXT_FILTERS + COMPARISON_FILTERS + BLANK_FILTERS:
+            raise RowModelError(f"Unsupported filter type '{filter_type}' for column '{column}'.")
+        self.column = column
+        self.type = filter_type
+        self.text = str(detail.get('filter') or '').lower()
+        try:
+            self.number = float(self.text)
+        except ValueError:
+            self.number = None
+
+    @property
+    def active(self) -> bool:
+        return self.type in BLANK_FILTERS or self.text != ''
+
+    def mask(self, dataset: Dataset) -> "np.ndarray":
+        values = dataset.column(self.column)
+        if values.dtype.kind in 'US':
+            return self._text_mask(dataset, values)
+        if values.dtype.kind in 'iufb':
+            return self._number_mask(values)
+        raise RowModelError(f"Column '{self.column}' has an unsupported dtype ({values.dtype}).")
+
+    def _text_mask(self, dataset: Dataset, values: "np.ndarray") -> "np.ndarray":
+        if self.type == 'blank':
+            return values == ''
+        if self.type == 'notBlank':
+            return values != ''
+        folded, text = dataset.folded(self.column), self.text
+        if self.type == 'contains':
+            return np.char.find(folded, text) >= 0
+        if self.type == 'notContains':
+            return np.char.find(folded, text) < 0
+        if self.type == 'startsWith':
+            return np.char.startswith(folded, text)
+        if self.type == 'endsWith':
+            return np.char.endswith(folded, text)
+        return _COMPARE[self.type](folded, text)
+
+    def _number_mask(self, values: "np.ndarray") -> "np.ndarray":
+        blank = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+        if self.type == 'blank':
+            return blank
+        if self.type == 'notBlank':
+            return ~blank
+        if self.type in TEXT_FILTERS:
+            raise RowModelError(f"Filter type '{self.type}' does not apply to numeric column '{self.column}'.")
+        if self.number is None:
+            raise RowModelError(f"Filter value '{self.text}' for numeric column '{self.column}' is not a number.")
+        # Blank (NaN) cells match no comparison; notEqual would otherwise let them through.
+        return _COMPARE[self.type](values, self.number) & ~blank
+
+
+_COMPARE: Dict[str, Callable] = {
+    'equals': lambda values, operand: values == operand,
+    'notEqual': lambda values, operand: values != operand,
+    'lessThan': lambda values, operand: values < operand,
+    'lessThanOrEqual': lambda values, operand: values <= operand,
+    'greaterThan': lambda values, operand: values > operand,
+    'greaterThanOrEqual': lambda values, operand: values >= operand,
+}
+
+
+class Predicate:
+    """The conditions of a filter_model item, ANDed; compiled once per filter hash."""
+
+    def __init__(self, filters: Dict[str, dict]):
+        conditions = [_Condition(column, detail) for column, detail in filters.items()]
+        self.conditions = [condition for condition in conditions if condition.active]
+
+    def mask(self, dataset: Dataset) -> Optional["np.ndarray"]:
+        """The rows that match, or None if every row does."""
+        mask = None
+        for condition in self.conditions:
+            matched = condition.mask(dataset)
+            mask = matched if mask is None else np.logical_and(mask, matched, out=mask)
+        return mask
+
+
+def compile_sort(filters: Dict[str, dict]) -> List[Tuple[str, bool]]:
+    """(column, descending) pairs of a sort_model item, in priority order."""
+    keys = []
+    for column, detail in filters.items():
+        direction = (detail.get('type') or '').lower()
+        if direction not in SORT_DIRECTIONS:
+            raise RowModelError(f"Unsupported sort direction '{detail.get('type')}' for column '{column}'.")
+        keys.append((column, direction == 'desc'))
+    return keys
+
+
+def _sort_key(values: "np.ndarray", descending: bool) -> "np.ndarray":
+    if values.dtype.kind in 'USb':
+        # Ranks make every key numeric, so a descending key is a negated one.
+        values = np.unique(values, return_inverse=True)[1].astype(np.int64)
+    elif values.dtype.kind == 'u':
+        values = values.astype(np.int64)
+    return -values if descending else values
+
+
+class _OrderCache:
+    """LRU of row orders by (dataset id, version, filter hash, sort hash), bounded by their total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[np.ndarray, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: tuple, order: "np.ndarray", total: int):
+        if order.nbytes > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = (order, total)
+        self._bytes += order.nbytes
+        while self._bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def discard(self, dataset_id: str):
+        for key in [key for key in self._entries if key[0] == dataset_id]:
+            self._bytes -= self._entries.pop(key)[0].nbytes
+
+
+class RowModel:
+    """Process-wide dataset, predicate and row-order caches behind `get_rows`."""
+
+    def __init__(self, max_datasets: int, max_predicates: int, order_cache_bytes: int):
+        self.max_datasets = max_datasets
+        self.max_predicates = max_predicates
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._predicates: "OrderedDict[str, Predicate]" = OrderedDict()
+        self._orders = _OrderCache(order_cache_bytes)
+        self._lock = threading.Lock()
+        # Serializes conversions, so concurrent first requests convert a file once.
+        self._open_lock = threading.Lock()
+        self.dataset_loads = 0
+        self.predicate_hits = 0
+        self.predicate_misses = 0
+
+    def dataset(self, dataset_id: str) -> Dataset:
+        """The dataset's current version, mapped on first use and remapped after its file changes."""
+        path = dataset_source(dataset_id)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None and dataset.version == version:
+                self._datasets.move_to_end(dataset_id)
+                return dataset
+        with self._open_lock:
+            dataset = _open_dataset(dataset_id, path, version)
+        with self._lock:
+            self.dataset_loads += 1
+            self._orders.discard(dataset_id)
+            self._datasets[dataset_id] = dataset
+            self._datasets.move_to_end(dataset_id)
+            while len(self._datasets) > self.max_datasets:
+                evicted, _ = self._datasets.popitem(last=False)
+                self._orders.discard(evicted)
+        return dataset
+
+    def predicate(self, filter_hash: str, filters: Dict[str, dict]) -> Predicate:
+        with self._lock:
+            predicate = self._predicates.get(filter_hash)
+            if predicate is not None:
+                self._predicates.move_to_end(filter_hash)
+                self.predicate_hits += 1
+                return predicate
+            self.predicate_misses += 1
+        predicate = Predicate(filters)
+        with self._lock:
+            self._predicates[filter_hash] = predicate
+            while len(self._predicates) > self.max_predicates:
+                self._predicates.popitem(last=False)
+        return predicate
+
+    def _order(self, dataset: Dataset, filters: Dict[str, dict], sort: Dict[str, dict]) -> "np.ndarray":
+        """Indices of the matching rows in sort order."""
+        # Sort columns are hashed in order: their order is their priority.
+        filter_hash, sort_hash = _canonical_hash(filters), _canonical_hash(list(sort.items()))
+        key = (dataset.dataset_id, dataset.version, filter_hash, sort_hash)
+        with self._lock:
+            cached = self._orders.get(key)
+        if cached is not None:
+            return cached[0]
+
+        mask = self.predicate(filter_hash, filters).mask(dataset)
+        order = np.arange(dataset.length) if mask is None else np.flatnonzero(mask)
+        sort_keys = compile_sort(sort)
+        if sort_keys:
+            # np.lexsort sorts by its last key first.
+            keys = [_sort_key(dataset.column(column)[order], descending)
+                    for column, descending in reversed(sort_keys)]
+            order = order[np.lexsort(keys)]
+        with self._lock:
+            self._orders.put(key, order, dataset.length)
+        return order
+
+    def get_rows(self, dataset_id: str, filters: Dict[str, dict], sort: Dict[str, dict],
+                 offset: int, limit: int) -> dict:
+        """
+        One page of a dataset after applying `filters` (a filter_model item's
+        filters) and `sort` (a sort_model item's filters). Returns the column
+        names, the rows as objects, and the total and matching row counts.
+        """
+        dataset = self.dataset(dataset_id)
+        order = self._order(dataset, filters, sort)
+        page = order[offset:offset + limit]
+        names = list(dataset.columns)
+        values = []
+        for name in names:
+            column = dataset.columns[name][page]
+            if column.dtype.kind == 'f':
+                # NaN is not valid JSON; blank numeric cells are sent as null.
+                column = np.where(np.isnan(column), None, column)
+            values.append(column.tolist())
+        return {
+            "columns": names,
+            "total": dataset.length,
+            "matched": int(len(order)),
+            "rows": [dict(zip(names, row)) for row in zip(*values)],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "datasets": len(self._datasets),
+                "dataset_loads": self.dataset_loads,
+                "predicates": len(self._predicates),
+                "predicate_hits": self.predicate_hits,
+                "predicate_misses": self.predicate_misses,
+                "orders": len(self._orders._entries),
+                "order_bytes": self._orders._bytes,
+                "order_hits": self._orders.hits,
+                "order_misses": self._orders.misses,
+            }
+
+
+def select_item(items: List[dict], name: Optional[str] = None) -> Optional[dict]:
+    """The item named `name`, else the default item, else the first; None if there are none."""
+    if name is not None:
+        return next((item for item in items if item.get('name') == name), None)
+    return next((item for item in items if item.get('default')), items[0] if items else None)
+
+
+# Process-wide row model shared by every request.
+row_model = RowModel(ROW_MODEL_MAX_DATASETS, ROW_MODEL_MAX_PREDICATES, ROW_MODEL_ORDER_CACHE_MAX_BYTES)
@@ -0,0 +1,387 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..database.sqlite import get_sqlite_connection, SQLITE_PATH
+from ..models.perspective import Perspective as PerspectiveModel
+from ..schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from .concurrency import concurrency_stats, PERSPECTIVE_CAS_MAX_RETRIES
+from .etag import etag_matches, make_etag
+from .storage import (PerspectiveStorage, PreconditionFailedError, PAGED_SECTION, SECTION_MERGE_KEYS, changed_fields,
+                      format_timestamp, merge_section_items, next_updated_time, section_items)
+
+# Response document built by SQLite's JSON1, in the key order of the Perspective schema
+# (the counterpart of _PERSPECTIVE_DOCUMENT in the Postgres backend).
+_PERSPECTIVE_DOCUMENT = """json_object(
+    'username', p.username,
+    'layout_name', p.layout_name,
+    'updated_by', p.updated_by,
+    'column_state', json(p.column_state),
+    'sort_model', json(p.sort_model),
+    'filter_model', json(p.filter_model),
+    'id', p.id,
+    'updated_time', p.updated_time,
+    'version', p.version
+)"""
+
+
+def _projection_expression(field: str, view: bool, paged: bool) -> str:
+    """SQL for one key of a projected document (see `load_perspective_projection`)."""
+    if field not in SECTION_MERGE_KEYS:
+        return f"p.{field}"
+    if not view and not (paged and field == PAGED_SECTION):
+        return f"json(p.{field})"
+    where = "WHERE json_extract(value, '$.view') = :view" if view else ""
+    page = "LIMIT :limit OFFSET :offset" if paged and field == PAGED_SECTION else ""
+    return (f"(SELECT json_group_array(json(items.value)) FROM "
+            f"(SELECT value FROM json_each(p.{field}) {where} ORDER BY key {page}) AS items)")
+
+
+_SEARCH_COLUMN = """(
+    EXISTS (SELECT 1 FROM json_each(p.column_state) AS cs, json_each(cs.value, '$.defaultColumns') AS c
+            WHERE c.value = :column)
+    OR EXISTS (SELECT 1 FROM json_each(p.sort_model) AS sm, json_each(sm.value, '$.filters') AS f
+               WHERE json_type(sm.value, '$.filters') = 'object' AND f.key = :column)
+    OR EXISTS (SELECT 1 FROM json_each(p.filter_model) AS fm, json_each(fm.value, '$.filters') AS f
+               WHERE json_type(fm.value, '$.filters') = 'object' AND f.key = :column)
+)"""
+_SEARCH_VIEW = """(
+    EXISTS (SELECT 1 FROM json_each(p.column_state) WHERE json_extract(value, '$.view') = :view)
+    OR EXISTS (SELECT 1 FROM json_each(p.sort_model) WHERE json_extract(value, '$.view') = :view)
+    OR EXISTS (SELECT 1 FROM json_each(p.filter_model) WHERE json_extract(value, '$.view') = :view)
+)"""
+_SEARCH_FILTER_FIELD = """EXISTS (
+    SELECT 1 FROM json_each(p.filter_model) AS fm, json_each(fm.value, '$.filters') AS f
+    WHERE json_type(fm.value, '$.filters') = 'object' AND f.key = :filter_field
+)"""
+
+
+def _dumps(items: List[dict]) -> str:
+    return json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+
+
+def _to_dict(row: sqlite3.Row, decode_sections: bool = True) -> dict:
+    """A row in the shape the Postgres backend returns it: datetime updated_time, decoded sections."""
+    data = dict(row)
+    data['updated_time'] = datetime.fromisoformat(data['updated_time'])
+    if decode_sections:
+        for section in SECTION_MERGE_KEYS.keys() & data.keys():
+            data[section] = json.loads(data[section])
+    return data
+
+
+def _to_model(row: Optional[sqlite3.Row]) -> Optional[PerspectiveModel]:
+    # Sections stay JSON text; the DTO decodes them on first access
+    return PerspectiveModel.from_dict(_to_dict(row, decode_sections=False)) if row else None
+
+
+class SQLitePerspectiveService(PerspectiveStorage):
+    """
+    Perspective storage in an embedded SQLite database (WAL mode, JSON1).
+
+    Documents and searches are built by SQLite's JSON functions, like the Postgres
+    backend builds them with jsonb. Section merges run in Python (see
+    `merge_section_items`) inside a BEGIN IMMEDIATE transaction, which takes the
+    database write lock up front, so concurrent saves are serialized and never
+    lost without any retries.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        return get_sqlite_connection(self.path)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self.db
+        db.execute("BEGIN IMMEDIATE;")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK;")
+            raise
+        db.execute("COMMIT;")
+
+    def _select_row(self, db: sqlite3.Connection, perspective_id: Optional[int] = None,
+                    username: Optional[str] = None) -> Optional[sqlite3.Row]:
+        if perspective_id is not None:
+            return db.execute("SELECT * FROM perspectives WHERE id = ?;", (perspective_id,)).fetchone()
+        return db.execute("SELECT * FROM perspectives WHERE username = ?;", (username,)).fetchone()
+
+    def _insert(self, db: sqlite3.Connection, username: str, layout_name: str, updated_by: str,
+                sections: dict) -> int:
+        cursor = db.execute(
+            """
+            INSERT INTO perspectives (username, layout_name, updated_by, column_state, sort_model, filter_model,
+                                      updated_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?);
+            """,
+            (username, layout_name, updated_by, _dumps(sections.get('column_state', [])),
+             _dumps(sections.get('sort_model', [])), _dumps(sections.get('filter_model', [])),
+             format_timestamp(next_updated_time()))
+        )
+        return cursor.lastrowid
+
+    def _update(self, db: sqlite3.Connection, row: sqlite3.Row, changes: dict) -> int:
+        """Writes `changes` (field -> value, sections as lists) to `row` and moves its updated_time/version on."""
+        values = {field: _dumps(value) if field in SECTION_MERGE_KEYS else value for field, value in changes.items()}
+        values['updated_time'] = format_timestamp(next_updated_time(datetime.fromisoformat(row['updated_time'])))
+        assignments = ", ".join(f"{field} = :{field}" for field in values)
+        db.execute(f"UPDATE perspectives SET {assignments}, version = version + 1 WHERE id = :id;",
+                   {**values, 'id': row['id']})
+        return row['id']
+
+    # Reads
+
+    def get_all_perspectives(self) -> List[PerspectiveModel]:
+        return [_to_model(row) for row in self.db.execute("SELECT * FROM perspectives ORDER BY id;")]
+
+    def get_perspectives_page(self, after_id: int, limit: int) -> List[PerspectiveModel]:
+        rows = self.db.execute("SELECT * FROM perspectives WHERE id > ? ORDER BY id LIMIT ?;", (after_id, limit))
+        return [_to_model(row) for row in rows]
+
+    def iter_perspectives(self, itersize: int = 1000) -> Iterator[PerspectiveModel]:
+        cursor = self.db.execute("SELECT * FROM perspectives ORDER BY id;")
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows:
+                return
+            for row in rows:
+                yield _to_model(row)
+
+    def get_perspective_by_id(self, perspective_id: int) -> Optional[PerspectiveModel]:
+        return _to_model(self._select_row(self.db, perspective_id=perspective_id))
+
+    def get_perspective_by_username(self, username: str) -> Optional[PerspectiveModel]:
+        return _to_model(self._select_row(self.db, username=username))
+
+    def load_perspective_document(self, perspective_id: Optional[int] = None,
+                                  username: Optional[str] = None) -> Optional[Tuple[int, str, bytes, str]]:
+        where, key = ("p.id = ?", perspective_id) if perspective_id is not None else ("p.username = ?", username)
+        row = self.db.execute(
+            f"SELECT p.id, p.username, p.updated_time, {_PERSPECTIVE_DOCUMENT} AS body "
+            f"FROM perspectives AS p WHERE {where};", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return (row['id'], row['username'], row['body'].encode(),
+                make_etag(row['id'], datetime.fromisoformat(row['updated_time'])))
+
+    def load_perspective_projection(self, fields: Tuple[str, ...], view: Optional[str] = None,
+                                    offset: int = 0, limit: Optional[int] = None,
+                                    perspective_id: Optional[int] = None,
+                                    username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        paged = offset > 0 or limit is not None
+        pairs = ", ".join(f"'{field}', {_projection_expression(field, view is not None, paged)}" for field in fields)
+        where, key = ("p.id = :key", perspective_id) if perspective_id is not None else ("p.username = :key", username)
+        row = self.db.execute(
+            f"SELECT p.id, p.updated_time, json_object({pairs}) AS body FROM perspectives AS p WHERE {where};",
+            {'key': key, 'view': view, 'offset': offset, 'limit': -1 if limit is None else limit}
+        ).fetchone()
+        if row is None:
+            return None
+        return row['body'].encode(), make_etag(row['id'], datetime.fromisoformat(row['updated_time']))
+
+    def get_all_perspectives_json(self) -> Optional[str]:
+        row = self.db.execute(
+            f"""
+            SELECT CASE WHEN count(*) > 0 THEN json_group_array(json(page.doc)) END
+            FROM (SELECT {_PERSPECTIVE_DOCUMENT} AS doc FROM perspectives AS p ORDER BY p.id) AS page;
+            """
+        ).fetchone()
+        return row[0]
+
+    def get_perspectives_page_json(self, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+        row = self.db.execute(
+            f"""
+            SELECT json_group_array(json(page.doc)) AS items, max(page.id) AS last_id, count(*) AS n
+            FROM (
+                SELECT p.id, {_PERSPECTIVE_DOCUMENT} AS doc
+                FROM perspectives AS p WHERE p.id > ? ORDER BY p.id LIMIT ?
+            ) AS page;
+            """,
+            (after_id, limit)
+        ).fetchone()
+        return row['items'], row['last_id'] if row['n'] == limit else None
+
+    def iter_perspective_json(self, itersize: int = 1000) -> Iterator[str]:
+        cursor = self.db.execute(f"SELECT {_PERSPECTIVE_DOCUMENT} FROM perspectives AS p ORDER BY p.id;")
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if not rows:
+                return
+            for (document,) in rows:
+                yield document
+
+    def search_perspectives(self, column: Optional[str] = None, view: Optional[str] = None,
+                            filter_field: Optional[str] = None, after_id: int = 0,
+                            limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+        conditions = [condition for value, condition in (
+            (column, _SEARCH_COLUMN), (view, _SEARCH_VIEW), (filter_field, _SEARCH_FILTER_FIELD)
+        ) if value is not None]
+        if not conditions:
+            raise ValueError("At least one of column, view or filter_field is required.")
+
+        rows = self.db.execute(
+            f"""
+            SELECT p.id, p.username, p.layout_name, p.updated_by, p.updated_time
+            FROM perspectives AS p
+            WHERE p.id > :after_id AND {' AND '.join(conditions)}
+            ORDER BY p.id LIMIT :limit;
+            """,
+            {'column': column, 'view': view, 'filter_field': filter_field, 'after_id': after_id, 'limit': limit}
+        ).fetchall()
+        rows = [_to_dict(row) for row in rows]
+        return rows, rows[-1]['id'] if len(rows) == limit else None
+
+    def _load_perspective_etag(self, perspective_id: Optional[int] = None,
+                               username: Optional[str] = None) -> Optional[str]:
+        if perspective_id is not None:
+            row = self.db.execute("SELECT id, updated_time FROM perspectives WHERE id = ?;",
+                                  (perspective_id,)).fetchone()
+        else:
+            row = self.db.execute("SELECT id, updated_time FROM perspectives WHERE username = ?;",
+                                  (username,)).fetchone()
+        return make_etag(row['id'], datetime.fromisoformat(row['updated_time'])) if row else None
+
+    # Writes
+
+    def create_perspective(self, perspective_in: PerspectiveCreate) -> PerspectiveModel:
+        sections = {section: section_items(getattr(perspective_in, section)) for section in SECTION_MERGE_KEYS}
+        with self._transaction() as db:
+            perspective_id = self._insert(db, perspective_in.username, perspective_in.layout_name,
+                                          perspective_in.updated_by, sections)
+            row = self._select_row(db, perspective_id=perspective_id)
+        self._invalidate_cache(perspective_id, perspective_in.username)
+        return _to_model(row)
+
+    def bulk_upsert_perspectives(self, perspectives: List[PerspectiveCreate], chunk_size: int = 1000) -> List[dict]:
+        results = []
+        for start in range(0, len(perspectives), chunk_size):
+            chunk = perspectives[start:start + chunk_size]
+            written = []
+            try:
+                with self._transaction() as db:
+                    for p in chunk:
+                        sections = {section: section_items(getattr(p, section)) for section in SECTION_MERGE_KEYS}
+                        existing = self._select_row(db, username=p.username)
+                        if existing is None:
+                            written.append((self._insert(db, p.username, p.layout_name, p.updated_by, sections),
+                                            "created"))
+                        else:
+                            changes = {'layout_name': p.layout_name, 'updated_by': p.updated_by, **sections}
+                            written.append((self._update(db, existing, changes), "updated"))
+            except sqlite3.Error as e:
+                results.extend({"username": p.username, "status": "failed", "error": str(e)} for p in chunk)
+                continue
+
+            for p, (perspective_id, status) in zip(chunk, written):
+                results.append({"username": p.username, "status": status, "id": perspective_id})
+                self._invalidate_cache(perspective_id, p.username)
+        return results
+
+    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[PerspectiveModel]:
+        changes = changed_fields(perspective_in)
+        with self._transaction() as db:
+            row = self._select_row(db, perspective_id=perspective_id)
+            if row is None:
+                return None
+            if if_match is not None and row['updated_time'] not in {format_timestamp(t) for t in if_match}:
+                raise PreconditionFailedError(f"Perspective with id {perspective_id} has been modified.")
+            if not changes:
+                return _to_model(row)  # No changes to apply
+            self._update(db, row, changes)
+            updated = self._select_row(db, perspective_id=perspective_id)
+        self._invalidate_cache(perspective_id, row['username'], updated['username'])
+        return _to_model(updated)
+
+    def delete_perspective(self, perspective_id: int) -> bool:
+        with self._transaction() as db:
+            deleted = db.execute("DELETE FROM perspectives WHERE id = ?;", (perspective_id,)).rowcount
+        if deleted:
+            self._invalidate_cache(perspective_id)
+        return bool(deleted)
+
+    def update_perspective_by_username(self, username: str,
+                                       perspective_in: PerspectiveUpdate) -> Optional[PerspectiveModel]:
+        changes = changed_fields(perspective_in)
+        with self._transaction() as db:
+            row = self._select_row(db, username=username)
+            if row is None or not changes:
+                return _to_model(row)
+            self._update(db, row, changes)
+            updated = self._select_row(db, perspective_id=row['id'])
+        self._invalidate_cache(row['id'], username, updated['username'])
+        return _to_model(updated)
+
+    def upsert_section_items(self, section: str, username: str, items: List[dict],
+                             layout_name: Optional[str] = None,
+                             updated_by: Optional[str] = None) -> Optional[dict]:
+        row = self._write_section(section, username, items, layout_name, updated_by, merge=True)
+        if row is None:
+            return None
+        return {key: row[key] for key in
+                ('id', 'username', 'layout_name', 'updated_by', section, 'updated_time', 'version', 'created')}
+
+    def replace_section_items(self, section: str, username: str, items: List[dict],
+                              layout_name: Optional[str] = None,
+                              updated_by: Optional[str] = None) -> Optional[dict]:
+        return self._write_section(section, username, items, layout_name, updated_by, merge=False)
+
+    def _write_section(self, section: str, username: str, items: List[dict], layout_name: Optional[str],
+                       updated_by: Optional[str], merge: bool) -> Optional[dict]:
+        with self._transaction() as db:
+            existing = self._select_row(db, username=username)
+            if existing is None:
+                if not (layout_name and updated_by):
+                    return None
+                perspective_id = self._insert(db, username, layout_name, updated_by, {section: items})
+            else:
+                value = merge_section_items(section, json.loads(existing[section]), items) if merge else items
+                perspective_id = self._update(db, existing, {
+                    'layout_name': layout_name or existing['layout_name'],
+                    'updated_by': updated_by or existing['updated_by'],
+                    section: value,
+                })
+            row = self._select_row(db, perspective_id=perspective_id)
+        self._invalidate_cache(perspective_id, username)
+        return {**_to_dict(row), 'created': existing is None}
+
+    def modify_section_items(self, section: str, username: str, mutate: Callable[[List[dict]], List[dict]],
+                             max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        # BEGIN IMMEDIATE holds the write lock across the read, so the read-modify-write never has to be retried.
+        with self._transaction() as db:
+            row = self._select_row(db, username=username)
+            if row is None:
+                return None
+            self._update(db, row, {section: mutate(json.loads(row[section]))})
+            updated = self._select_row(db, perspective_id=row['id'])
+        concurrency_stats.record(1, succeeded=True)
+        self._invalidate_cache(updated['id'], username)
+        return _to_dict(updated)
+
+    def modify_perspective_fields(self, username: str, fields: Tuple[str, ...],
+                                  mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                                  if_match: Optional[Iterable[str]] = None,
+                                  max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        # BEGIN IMMEDIATE holds the write lock across the read, so the read-modify-write never has to be retried.
+        with self._transaction() as db:
+            row = self._select_row(db, username=username)
+            if row is None:
+                return None
+            if if_match is not None and not etag_matches(
+                    row['id'], datetime.fromisoformat(row['updated_time']), if_match):
+                raise PreconditionFailedError(f"Perspective for user '{username}' has been modified.")
+            current = {field: json.loads(row[field]) if field in SECTION_MERGE_KEYS else row[field]
+                       for field in fields}
+            self._update(db, row, mutate(current))
+            updated = db.execute("SELECT id, username, updated_time, version FROM perspectives WHERE id = ?;",
+                                 (row['id'],)).fetchone()
+        concurrency_stats.record(1, succeeded=True)
+        self._invalidate_cache(updated['id'], username)
+        return _to_dict(updated)
@@ -0,0 +1,432 @@
+"""
+Storage backends for perspectives.
+
+`PerspectiveStorage` is the interface the endpoints program against. Four
+implementations exist, selected with PERSPECTIVE_STORAGE:
+
+- `postgres` (default): `PerspectiveService` in services/perspective.py.
+- `postgres_items`: `ItemPerspectiveService` in services/item_perspective.py,
+  which keeps every section item in its own row of recsui.perspective_items
+  (migration 6) instead of in the JSONB columns.
+- `sqlite`: `SQLitePerspectiveService`, an embedded database file in WAL mode
+  that uses JSON1 for documents and search. No Postgres server is needed.
+- `memory`: `InMemoryPerspectiveService`, a process-local store with no I/O.
+  It gives the upper bound that throughput numbers can be compared against.
+  Its data is lost when the process exits.
+
+Postgres merges JSONB sections in SQL. The embedded backends use the Python
+helpers in this module and in services/merge.py, which have the same semantics.
+"""
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..database.database import get_db, get_db_connection, release_db_connection
+from ..models.perspective import Perspective as PerspectiveModel
+from ..schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from .cache import perspective_cache, PERSPECTIVE_CACHE_ENABLED
+from .concurrency import PERSPECTIVE_CAS_MAX_RETRIES
+# Re-exported: the backends and endpoints import them from here.
+from .merge import SECTION_MERGE_KEYS, merge_section_items
+
+# Backend serving the API: postgres, postgres_items, sqlite or memory.
+PERSPECTIVE_STORAGE = os.getenv("PERSPECTIVE_STORAGE", "postgres")
+
+# Fields an update may set, in the canonical (column) order.
+UPDATABLE_FIELDS = ('username', 'layout_name', 'updated_by', 'column_state', 'sort_model', 'filter_model')
+
+# Keys of the response document, in the key order of the Perspective schema; a projection selects a subset.
+DOCUMENT_FIELDS = (*UPDATABLE_FIELDS, 'id', 'updated_time', 'version')
+
+# The section whose items a projection can page through with offset/limit.
+PAGED_SECTION = 'column_state'
+
+
+class PreconditionFailedError(Exception):
+    """Raised when a conditional write's If-Match ETags no longer match the stored row."""
+
+
+def section_items(items) -> List[dict]:
+    """A validated section (list of pydantic models, or None) as plain dicts."""
+    return [item.model_dump() for item in items or []]
+
+
+def changed_fields(perspective_in: PerspectiveUpdate) -> Dict[str, Any]:
+    """Field -> new value for every field set on `perspective_in`, in canonical order, sections as dicts."""
+    values = {}
+    for field in UPDATABLE_FIELDS:
+        if field not in perspective_in.model_fields_set:
+            continue
+        value = getattr(perspective_in, field)
+        values[field] = section_items(value) if field in SECTION_MERGE_KEYS else value
+    return values
+
+
+def format_timestamp(value: datetime) -> str:
+    """updated_time as it appears in response documents (UTC, microseconds, "Z")."""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def next_updated_time(previous: Optional[datetime] = None) -> datetime:
+    """
+    The updated_time of a write. Strictly later than `previous`, so the ETag of a
+    row changes on every write even if the clock has not moved on.
+    """
+    now = datetime.now(timezone.utc)
+    if previous is not None and now <= previous:
+        now = previous + timedelta(microseconds=1)
+    return now
+
+
+def encode_document(row: dict) -> bytes:
+    """Encodes a row as the response document, in the key order of the Perspective schema."""
+    return json.dumps({
+        'username': row['username'],
+        'layout_name': row['layout_name'],
+        'updated_by': row['updated_by'],
+        'column_state': row['column_state'],
+        'sort_model': row['sort_model'],
+        'filter_model': row['filter_model'],
+        'id': row['id'],
+        'updated_time': format_timestamp(row['updated_time']),
+        'version': row['version'],
+    }, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def project_document(row: dict, fields: Tuple[str, ...], view: Optional[str] = None,
+                     offset: int = 0, limit: Optional[int] = None) -> bytes:
+    """
+    Python counterpart of `PerspectiveStorage.load_perspective_projection`: encodes
+    only `fields` of a row (in DOCUMENT_FIELDS order), keeping only the section
+    items of `view` and the `offset`/`limit` slice of PAGED_SECTION.
+    """
+    document = {}
+    for field in fields:
+        value = row[field]
+        if field in SECTION_MERGE_KEYS:
+            if view is not None:
+                value = [item for item in value if item.get('view') == view]
+            if field == PAGED_SECTION:
+                value = value[offset:None if limit is None else offset + limit]
+        elif field == 'updated_time':
+            value = format_timestamp(value)
+        document[field] = value
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _filter_fields(items: Iterable[dict]) -> Iterator[str]:
+    for item in items:
+        filters = item.get('filters')
+        if isinstance(filters, dict):
+            yield from filters
+
+
+def row_matches(row: dict, column: Optional[str], view: Optional[str], filter_field: Optional[str]) -> bool:
+    """Python counterpart of the search criteria of `PerspectiveStorage.search_perspectives`."""
+    if column is not None and not (
+            any(column in (item.get('defaultColumns') or ()) for item in row['column_state'])
+            or column in _filter_fields(row['sort_model'])
+            or column in _filter_fields(row['filter_model'])):
+        return False
+    if view is not None and not any(
+            item.get('view') == view for section in SECTION_MERGE_KEYS for item in row[section]):
+        return False
+    if filter_field is not None and filter_field not in _filter_fields(row['filter_model']):
+        return False
+    return True
+
+
+def _refresh_cached_perspective(perspective_id: int):
+    """Reloads one cached perspective with its own service session (stale-while-revalidate)."""
+    try:
+        with perspective_service_session() as service:
+            token = perspective_cache.load_token()
+            loaded = service.load_perspective_document(perspective_id=perspective_id)
+            if loaded is None:
+                perspective_cache.invalidate(perspective_id=perspective_id)
+            else:
+                perspective_cache.put(*loaded, token)
+    except Exception as e:
+        print(f"Error refreshing cached perspective {perspective_id}: {e}")
+    finally:
+        # A put discarded by a concurrent invalidation leaves the stale entry in place.
+        perspective_cache.release_refresh(perspective_id)
+
+
+class PerspectiveStorage(ABC):
+    """
+    Operations on perspectives that every storage backend provides.
+
+    The read-through cache of encoded documents and ETags is implemented here on
+    top of `load_perspective_document` / `_load_perspective_etag`. Backends only
+    implement the storage access.
+    """
+
+    @abstractmethod
+    def get_all_perspectives(self) -> List[PerspectiveModel]:
+        """Retrieves all perspectives."""
+
+    @abstractmethod
+    def get_perspectives_page(self, after_id: int, limit: int) -> List[PerspectiveModel]:
+        """Retrieves up to `limit` perspectives with an id greater than `after_id`, ordered by id."""
+
+    @abstractmethod
+    def iter_perspectives(self, itersize: int = 1000) -> Iterator[PerspectiveModel]:
+        """Yields every perspective ordered by id, `itersize` rows at a time."""
+
+    @abstractmethod
+    def get_perspective_by_id(self, perspective_id: int) -> Optional[PerspectiveModel]:
+        """Retrieves a single perspective by its ID."""
+
+    @abstractmethod
+    def get_perspective_by_username(self, username: str) -> Optional[PerspectiveModel]:
+        """Retrieves a single perspective by its username."""
+
+    @abstractmethod
+    def load_perspective_document(self, perspective_id: Optional[int] = None,
+                                  username: Optional[str] = None) -> Optional[Tuple[int, str, bytes, str]]:
+        """Fetches one perspective as an encoded JSON document: (id, username, body, etag), or None."""
+
+    @abstractmethod
+    def load_perspective_projection(self, fields: Tuple[str, ...], view: Optional[str] = None,
+                                    offset: int = 0, limit: Optional[int] = None,
+                                    perspective_id: Optional[int] = None,
+                                    username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """
+        Fetches part of one perspective as an encoded JSON document: (body, etag), or None.
+
+        - `fields`: the document keys to include, in DOCUMENT_FIELDS order. Columns
+          that are not requested are not read.
+        - `view`: keep only the section items of that view.
+        - `offset`/`limit`: the slice of PAGED_SECTION items to return (after the
+          view filter).
+
+        The ETag is the perspective's, whatever the projection. Projections bypass
+        the read-through cache, which holds whole documents.
+        """
+
+    @abstractmethod
+    def get_all_perspectives_json(self) -> Optional[str]:
+        """Returns every perspective as one JSON array, or None if there are none."""
+
+    @abstractmethod
+    def get_perspectives_page_json(self, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+        """JSON counterpart of `get_perspectives_page`: (items JSON array, next_after_id or None)."""
+
+    @abstractmethod
+    def iter_perspective_json(self, itersize: int = 1000) -> Iterator[str]:
+        """JSON counterpart of `iter_perspectives`: one JSON document per perspective, ordered by id."""
+
+    @abstractmethod
+    def search_perspectives(self, column: Optional[str] = None, view: Optional[str] = None,
+                            filter_field: Optional[str] = None, after_id: int = 0,
+                            limit: int = 100) -> Tuple[List[dict], Optional[int]]:
+        """
+        Finds the perspectives that reference a column, a view and/or a filter field.
+
+        - `column`: listed in a column_state item's defaultColumns, or used as a
+          sort_model/filter_model filters key.
+        - `view`: the view of any column_state, sort_model or filter_model item.
+        - `filter_field`: used as a filter_model filters key.
+
+        Criteria are combined with AND; results are keyset-paginated by id.
+        Returns (rows of id, username, layout_name, updated_by, updated_time; next_after_id).
+        """
+
+    @abstractmethod
+    def _load_perspective_etag(self, perspective_id: Optional[int] = None,
+                               username: Optional[str] = None) -> Optional[str]:
+        """Reads a perspective's current ETag from storage."""
+
+    @abstractmethod
+    def create_perspective(self, perspective_in: PerspectiveCreate) -> PerspectiveModel:
+        """Creates a new perspective."""
+
+    @abstractmethod
+    def bulk_upsert_perspectives(self, perspectives: List[PerspectiveCreate], chunk_size: int = 1000) -> List[dict]:
+        """
+        Creates or replaces many perspectives, one transaction per chunk of `chunk_size`.
+        Returns one {"username", "status": "created" | "updated" | "failed", "id" | "error"}
+        per input, in input order.
+        """
+
+    @abstractmethod
+    def update_perspective(self, perspective_id: int, perspective_in: PerspectiveUpdate,
+                           if_match: Optional[List[datetime]] = None) -> Optional[PerspectiveModel]:
+        """
+        Updates an existing perspective. With `if_match`, only while its updated_time
+        is one of those values; otherwise PreconditionFailedError is raised.
+        """
+
+    @abstractmethod
+    def delete_perspective(self, perspective_id: int) -> bool:
+        """Deletes a perspective by its ID."""
+
+    @abstractmethod
+    def update_perspective_by_username(self, username: str,
+                                       perspective_in: PerspectiveUpdate) -> Optional[PerspectiveModel]:
+        """Updates an existing perspective by its username."""
+
+    @abstractmethod
+    def upsert_section_items(self, section: str, username: str, items: List[dict],
+                             layout_name: Optional[str] = None,
+                             updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Merges `items` into one section of a user's perspective (see `merge_section_items`).
+
+        If both `layout_name` and `updated_by` are given, a missing perspective is
+        created; otherwise None is returned when the user has no perspective.
+        Returns the row's id, username, layout_name, updated_by, updated_time, version,
+        the merged section and a `created` flag.
+        """
+
+    @abstractmethod
+    def replace_section_items(self, section: str, username: str, items: List[dict],
+                              layout_name: Optional[str] = None,
+                              updated_by: Optional[str] = None) -> Optional[dict]:
+        """
+        Replaces one section of a user's perspective. Creation rules are the same as
+        for `upsert_section_items`. Returns the full row plus a `created` flag.
+        """
+
+    @abstractmethod
+    def modify_section_items(self, section: str, username: str, mutate: Callable[[List[dict]], List[dict]],
+                             max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """
+        Read-modify-write of one section: `mutate` receives the stored items and returns
+        the new list (it may raise ItemNotFoundError). Concurrent writes are never lost.
+        Returns the full updated row, or None if the user has no perspective.
+        """
+
+    @abstractmethod
+    def modify_perspective_fields(self, username: str, fields: Tuple[str, ...],
+                                  mutate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                                  if_match: Optional[Iterable[str]] = None,
+                                  max_retries: int = PERSPECTIVE_CAS_MAX_RETRIES) -> Optional[dict]:
+        """
+        Read-modify-write of some fields of a user's perspective. Only `fields` are read
+        and written: `mutate` receives field -> stored value (sections as lists) and
+        returns the new values. With `if_match` (ETags), the stored row must still have
+        one of those ETags, otherwise PreconditionFailedError is raised. Concurrent
+        writes are never lost.
+        Returns the row's id, username, updated_time and version, or None if the user
+        has no perspective.
+        """
+
+    def get_perspective_json_by_id(self, perspective_id: int) -> Optional[Tuple[bytes, str]]:
+        """Returns the encoded JSON body and ETag of a perspective by ID, from the cache when possible."""
+        return self._get_perspective_json(perspective_id=perspective_id)
+
+    def get_perspective_json_by_username(self, username: str) -> Optional[Tuple[bytes, str]]:
+        """Returns the encoded JSON body and ETag of a user's perspective, from the cache when possible."""
+        return self._get_perspective_json(username=username)
+
+    def _get_perspective_json(self, perspective_id: Optional[int] = None,
+                              username: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """Read-through lookup: serves cached bodies and caches freshly encoded ones on a miss."""
+        if PERSPECTIVE_CACHE_ENABLED:
+            entry, refresh_id = perspective_cache.get(perspective_id, username)
+            if refresh_id is not None:
+                threading.Thread(target=_refresh_cached_perspective, args=(refresh_id,), daemon=True).start()
+            if entry is not None:
+                return entry.body, entry.etag
+
+        token = perspective_cache.load_token()
+        loaded = self.load_perspective_document(perspective_id, username)
+        if loaded is None:
+            return None
+
+        loaded_id, loaded_username, body, etag = loaded
+        if PERSPECTIVE_CACHE_ENABLED:
+            perspective_cache.put(loaded_id, loaded_username, body, etag, token)
+        return body, etag
+
+    def get_perspective_etag_by_id(self, perspective_id: int) -> Optional[str]:
+        """Returns a perspective's current ETag without reading or decoding its sections."""
+        return self._get_perspective_etag(perspective_id=perspective_id)
+
+    def get_perspective_etag_by_username(self, username: str) -> Optional[str]:
+        """Returns the current ETag of a user's perspective without reading or decoding its sections."""
+        return self._get_perspective_etag(username=username)
+
+    def _get_perspective_etag(self, perspective_id: Optional[int] = None,
+                              username: Optional[str] = None) -> Optional[str]:
+        if PERSPECTIVE_CACHE_ENABLED:
+            entry, _ = perspective_cache.get(perspective_id, username)
+            if entry is not None:
+                return entry.etag
+        return self._load_perspective_etag(perspective_id, username)
+
+    def _invalidate_cache(self, perspective_id: Optional[int], *usernames: str):
+        """Drops cached bodies after a committed write."""
+        perspective_cache.invalidate(perspective_id=perspective_id)
+        for username in usernames:
+            perspective_cache.invalidate(username=username)
+
+
+_embedded_service: Optional[PerspectiveStorage] = None
+_embedded_lock = threading.Lock()
+
+
+def _get_embedded_service() -> PerspectiveStorage:
+    """Returns the process-wide SQLite or in-memory service, creating it on first use."""
+    global _embedded_service
+    if _embedded_service is None:
+        with _embedded_lock:
+            if _embedded_service is None:
+                if PERSPECTIVE_STORAGE == 'sqlite':
+                    from .sqlite_perspective import SQLitePerspectiveService
+                    _embedded_service = SQLitePerspectiveService()
+                elif PERSPECTIVE_STORAGE == 'memory':
+                    from .memory_perspective import InMemoryPerspectiveService
+                    _embedded_service = InMemoryPerspectiveService()
+                else:
+                    raise ValueError(
+                        f"Unknown PERSPECTIVE_STORAGE '{PERSPECTIVE_STORAGE}'; expected postgres, postgres_items, sqlite or memory."
+                    )
+    return _embedded_service
+
+
+_POSTGRES_BACKENDS = ('postgres', 'postgres_items')
+
+
+def _postgres_service_class():
+    """The Postgres service class for the configured layout (JSONB columns or item rows)."""
+    if PERSPECTIVE_STORAGE == 'postgres_items':
+        from .item_perspective import ItemPerspectiveService
+        return ItemPerspectiveService
+    from .perspective import PerspectiveService
+    return PerspectiveService
+
+
+def get_perspective_service() -> PerspectiveStorage:
+    """
+    Returns the service for the current request, backed by the configured storage.
+    For Postgres it uses the request-local pooled connection (see `get_db`).
+    """
+    if PERSPECTIVE_STORAGE in _POSTGRES_BACKENDS:
+        conn, curr = get_db()
+        return _postgres_service_class()(conn, curr)
+    return _get_embedded_service()
+
+
+@contextmanager
+def perspective_service_session() -> Iterator[PerspectiveStorage]:
+    """
+    A service that does not depend on the request context, e.g. for streamed
+    responses and background refreshes. For Postgres it checks out (and returns)
+    its own pooled connection.
+    """
+    if PERSPECTIVE_STORAGE not in _POSTGRES_BACKENDS:
+        yield _get_embedded_service()
+        return
+
+    conn, curr = get_db_connection()
+    try:
+        yield _postgres_service_class()(conn, curr)
+    finally:
+        release_db_connection(conn, curr)
@@ -0,0 +1,318 @@
+"""
+Opt-in write-behind buffer for column_state saves (WRITE_BEHIND_ENABLED=1).
+
+The grid calls /column_state/singleSaveUpdate on every column resize, drag or
+hide, often many times a second per user. Each save replaces the user's whole
+column_state, so only the last one of a burst matters. With write-behind on:
+
+- A save for an existing perspective is merged into the user's pending write
+  and answered at once with 202. The latest column_state wins, and layout_name
+  and updated_by keep the latest value that was given.
+- A background thread writes a pending save once the user has been idle for
+  WRITE_BEHIND_DELAY_MS, or at the latest WRITE_BEHIND_MAX_DELAY_MS after the
+  first save of the burst. Each pending save is one `replace_section_items`
+  call, so a burst of saves costs one transaction.
+- Before a request reads or changes a perspective, it writes that user's
+  pending save first (`settle_pending_write`). Reads therefore see their own
+  writes, and ETags and versions stay those of stored rows. If that write
+  fails the request is answered 503 (PendingWriteError) rather than served
+  without it; the save stays pending and is retried. Listings and searches
+  are not settled and may lag by the debounce window.
+- Saves that would create a perspective, and saves arriving while
+  WRITE_BEHIND_MAX_PENDING users are already pending, are written
+  synchronously as before.
+- Pending saves are written at interpreter exit (atexit). A failed write is
+  retried up to WRITE_BEHIND_MAX_ATTEMPTS times, then dropped and logged.
+
+The buffer lives in the memory of one process. Read-your-writes only holds
+for requests served by the process that buffered the save: with several
+worker processes (gunicorn -w N) a read served by another worker does not see
+a pending save, and may be overwritten by it when it is written. Enable
+write-behind only with a single worker process (threads are fine).
+
+Counts of buffered, coalesced, flushed, failed, dropped and bypassed saves are
+served at /api/v1/perspectives/write_behind/stats and in /metrics.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from ..metrics import Counter, Gauge, register
+from .etag import parse_etag
+from .storage import PerspectiveStorage, perspective_service_session
+
+logger = logging.getLogger(__name__)
+
+# Per-process buffer: only safe with a single worker process (see the module docstring).
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "0") == "1"
+# A pending save is written once its user has been idle this long...
+WRITE_BEHIND_DELAY_MS = float(os.getenv("WRITE_BEHIND_DELAY_MS", "300"))
+# ...or at the latest this long after the first save it absorbed.
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "2000"))
+# Users with a pending save; further users are written synchronously.
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+# Tries per pending save before it is dropped.
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+
+WRITE_BEHIND_SAVES = register(Counter(
+    "perspective_write_behind_saves_total",
+    "column_state saves by outcome: buffered (acknowledged before being written), coalesced (absorbed by "
+    "another pending save), bypassed (written synchronously), flushed, failed and dropped (pending writes).",
+    ("outcome",)))
+WRITE_BEHIND_PENDING = register(Gauge(
+    "perspective_write_behind_pending", "Users with a column_state save waiting to be written.", ()))
+
+_OUTCOMES = ('buffered', 'coalesced', 'bypassed', 'flushed', 'failed', 'dropped')
+
+
+class PendingWriteError(Exception):
+    """Raised when a user's buffered save could not be written before their request is served."""
+
+
+class PendingWrite:
+    """The coalesced column_state save of one user, waiting to be written."""
+
+    def __init__(self, username: str, perspective_id: int, column_state: List[dict],
+                 layout_name: Optional[str], updated_by: Optional[str], now: float):
+        self.username = username
+        self.perspective_id = perspective_id
+        self.column_state = column_state
+        self.layout_name = layout_name
+        self.updated_by = updated_by
+        self.first_at = now
+        self.last_at = now
+        # Saves merged into this write.
+        self.saves = 1
+        self.attempts = 0
+
+    def merge(self, column_state: List[dict], layout_name: Optional[str], updated_by: Optional[str], now: float):
+        self.column_state = column_state
+        self.layout_name = layout_name or self.layout_name
+        self.updated_by = updated_by or self.updated_by
+        self.last_at = now
+        self.saves += 1
+
+    def due_at(self) -> float:
+        return min(self.last_at + WRITE_BEHIND_DELAY_MS / 1000, self.first_at + WRITE_BEHIND_MAX_DELAY_MS / 1000)
+
+
+class WriteBehindBuffer:
+    """
+    Pending column_state saves by username, written by a background thread.
+
+    A user's save is written by one thread at a time (`_flushing`). Whoever
+    wants to write it waits for a write already in progress, so an older
+    column_state never lands after a newer one.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: Dict[str, PendingWrite] = {}
+        self._usernames_by_id: Dict[int, str] = {}
+        self._flushing: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._counts = dict.fromkeys(_OUTCOMES, 0)
+
+    def _count(self, outcome: str, amount: int = 1):
+        # Callers hold self._cond.
+        self._counts[outcome] += amount
+        WRITE_BEHIND_SAVES.inc((outcome,), amount)
+
+    def pending_id(self, username: str) -> Optional[int]:
+        """The perspective id of the user's pending save, if there is one."""
+        pending = self._pending.get(username)
+        return pending.perspective_id if pending is not None else None
+
+    def submit(self, username: str, perspective_id: int, column_state: List[dict],
+               layout_name: Optional[str] = None, updated_by: Optional[str] = None) -> Optional[PendingWrite]:
+        """
+        Merges a save into the user's pending write. Returns that write, or None
+        when the buffer is full or closed and the caller must write synchronously.
+        """
+        now = time.monotonic()
+        with self._cond:
+            pending = self._pending.get(username)
+            if pending is not None:
+                pending.merge(column_state, layout_name, updated_by, now)
+                self._count('coalesced')
+            elif self._closed or len(self._pending) >= WRITE_BEHIND_MAX_PENDING:
+                self._count('bypassed')
+                return None
+            else:
+                pending = PendingWrite(username, perspective_id, column_state, layout_name, updated_by, now)
+                self._put(pending)
+            self._count('buffered')
+            self._start()
+            self._cond.notify_all()
+            return pending
+
+    def _put(self, pending: PendingWrite):
+        self._pending[pending.username] = pending
+        self._usernames_by_id[pending.perspective_id] = pending.username
+        WRITE_BEHIND_PENDING.inc(())
+
+    def _take(self, username: str) -> PendingWrite:
+        """Removes a user's pending write and marks it as being written. Callers hold self._cond."""
+        pending = self._pending.pop(username)
+        self._usernames_by_id.pop(pending.perspective_id, None)
+        self._flushing.add(username)
+        WRITE_BEHIND_PENDING.dec(())
+        return pending
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            # Registered after the first save has looked its user up, so after the connection
+            # pool's own atexit hook, and therefore run before the pool is closed.
+            atexit.register(self.close)
+
+    def flush(self, username: Optional[str] = None, perspective_id: Optional[int] = None,
+              service: Optional[PerspectiveStorage] = None) -> Optional[bool]:
+        """
+        Writes the pending save of one user (by username or perspective id) now,
+        after any write of it already in progress. Returns whether it was
+        written, or None if the user had nothing pending.
+        """
+        if not self._pending and not self._flushing:
+            return None
+        with self._cond:
+            if username is None:
+                username = self._usernames_by_id.get(perspective_id)
+                if username is None:
+                    return None
+            while username in self._flushing:
+                self._cond.wait()
+            if username not in self._pending:
+                return None
+            pending = self._take(username)
+        return self._write_all([pending], service)
+
+    def flush_all(self) -> bool:
+        """Writes every pending save now."""
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            batch = [self._take(username) for username in list(self._pending)]
+        return self._write_all(batch) if batch else False
+
+    def close(self):
+        """Stops the background thread and writes what is pending; later saves are written synchronously."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    waiting = [p for p in self._pending.values() if p.username not in self._flushing]
+                    batch = [self._take(p.username) for p in waiting if p.due_at() <= now]
+                    if batch:
+                        break
+                    # Woken early by a new save, or by a finished write releasing a user.
+                    next_due = min((p.due_at() for p in waiting), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+            self._write_all(batch)
+
+    def _write_all(self, batch: List[PendingWrite], service: Optional[PerspectiveStorage] = None) -> bool:
+        """Writes `batch` with `service`, or with its own service session. Returns whether all were written."""
+        if service is not None:
+            return all([self._write(pending, service) for pending in batch])
+        try:
+            with perspective_service_session() as session:
+                return all([self._write(pending, session) for pending in batch])
+        except Exception as e:
+            # No session could be opened; the writes were not attempted.
+            for pending in batch:
+                if pending.username in self._flushing:
+                    self._failed(pending, e)
+            return False
+
+    def _write(self, pending: PendingWrite, service: PerspectiveStorage) -> bool:
+        try:
+            service.replace_section_items('column_state', pending.username, pending.column_state,
+                                          pending.layout_name, pending.updated_by)
+        except Exception as e:
+            self._failed(pending, e)
+            return False
+        with self._cond:
+            self._count('flushed')
+            self._flushing.discard(pending.username)
+            self._cond.notify_all()
+        return True
+
+    def _failed(self, pending: PendingWrite, error: Exception):
+        """Puts a failed write back for another try, unless a newer save or the attempt limit supersedes it."""
+        with self._cond:
+            self._count('failed')
+            self._flushing.discard(pending.username)
+            pending.attempts += 1
+            newer = self._pending.get(pending.username)
+            if newer is not None:
+                newer.layout_name = newer.layout_name or pending.layout_name
+                newer.updated_by = newer.updated_by or pending.updated_by
+            elif pending.attempts < WRITE_BEHIND_MAX_ATTEMPTS and not self._closed:
+                pending.first_at = pending.last_at = time.monotonic()
+                self._put(pending)
+            else:
+                self._count('dropped')
+                logger.error("Dropped the buffered column_state of '%s' after %d failed writes: %s",
+                             pending.username, pending.attempts, error)
+            self._cond.notify_all()
+        logger.warning("Writing the buffered column_state of '%s' failed (attempt %d): %s",
+                       pending.username, pending.attempts, error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": WRITE_BEHIND_ENABLED,
+                "delay_ms": WRITE_BEHIND_DELAY_MS,
+                "max_delay_ms": WRITE_BEHIND_MAX_DELAY_MS,
+                "pending": len(self._pending),
+                **self._counts,
+            }
+
+
+write_behind = WriteBehindBuffer()
+
+
+def buffer_column_state(service: PerspectiveStorage, username: str, column_state: List[dict],
+                        layout_name: Optional[str] = None,
+                        updated_by: Optional[str] = None) -> Optional[PendingWrite]:
+    """
+    Buffers a column_state save when write-behind is on and the user's perspective
+    exists. Returns the pending write it went into, or None if the caller must
+    write it synchronously.
+    """
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    perspective_id = write_behind.pending_id(username)
+    if perspective_id is None:
+        # Only the first save of a burst looks the perspective up, from the cache when possible.
+        etag = service.get_perspective_etag_by_username(username)
+        if etag is None:
+            return None
+        perspective_id = parse_etag(etag)[0]
+    return write_behind.submit(username, perspective_id, column_state, layout_name, updated_by)
+
+
+def settle_pending_write(service: PerspectiveStorage, username: Optional[str] = None,
+                         perspective_id: Optional[int] = None):
+    """
+    Writes the user's buffered save (if any) before a request reads or changes their
+    perspective. Raises PendingWriteError if that write fails.
+    """
+    if WRITE_BEHIND_ENABLED and write_behind.flush(username, perspective_id, service) is False:
+        owner = f"user '{username}'" if username is not None else f"perspective {perspective_id}"
+        raise PendingWriteError(f"The buffered column_state of {owner} could not be written; try again later.")
@@ -1,33 +1,182 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g
+import hmac
+import json
 import psycopg2
 from pydantic import ValidationError
-from typing import List
-from ...database.database import get_db
-from ...schemas.perspective import Perspective, PerspectiveCreate, PerspectiveUpdate
-from ...services.perspective import PerspectiveService
+from werkzeug.exceptions import HTTPException
+from typing import List, Optional, Tuple
+from ...schemas.perspective import Perspective, PerspectiveCreate, PerspectiveUpdate, PatchOperation, PatchResult
+from ...services.storage import (DOCUMENT_FIELDS, PAGED_SECTION, PreconditionFailedError, get_perspective_service,
+                                 perspective_service_session)
+from ...services.cache import perspective_cache
+from ...services.concurrency import concurrency_stats, ConcurrentModificationError
+from ...database.profiling import (DB_QUERY_BUDGET, DB_SLOW_QUERY_ADMIN_TOKEN, DB_SLOW_QUERY_MS, DB_TIME_BUDGET_MS,
+                                   slow_queries)
+from ...services.etag import make_etag, strip_encoding, updated_times_for
+from ...services.write_behind import PendingWriteError, settle_pending_write, write_behind
+from ...services.row_model import row_model
+from ...services.json_patch import (InvalidPatchError, PatchConflictError, PatchResultError, apply_patch,
+                                    patch_fields)
+from ...json_provider import get_request_json
+from ...compression import compressed_body_cache, set_compression_cache_key
+from ...metrics import timed
 
 # Create a Blueprint for this module
 perspective_bp = Blueprint('perspective_bp', __name__)
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Page size bounds for keyset-paginated listing.
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+# Rows fetched per round trip by the server-side cursor behind NDJSON streaming.
+STREAM_ITERSIZE = 1000
+# Bulk create/upsert limits: items per request and rows per INSERT/transaction.
+BULK_MAX_ITEMS = 20000
+BULK_CHUNK_SIZE = 1000
+# Most column_state items one projected GET returns (?limit=).
+MAX_ITEMS_LIMIT = 1000
+
 
 @perspective_bp.route('/', methods=['GET'])
 def get_all_perspectives_route():
     """
     Handles GET requests to retrieve all perspectives.
+
+    - `?after_id=<id>&limit=<n>` returns one keyset-paginated page plus the
+      `next_after_id` cursor for the following page.
+    - `?stream=ndjson` (or `Accept: application/x-ndjson`) streams every
+      perspective as newline-delimited JSON from a server-side cursor.
+    - Without either, the whole table is returned as a single JSON array.
     """
+    if request.args.get('stream') == 'ndjson' or request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return _stream_perspectives_ndjson()
+    if 'after_id' in request.args or 'limit' in request.args:
+        return _get_perspectives_page()
+
     try:
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
-        perspectives = service.get_all_perspectives()
-        if not perspectives:
+        service = get_perspective_service()
+        # The array is built by Postgres and passed through without decoding it
+        perspectives_json = service.get_all_perspectives_json()
+        if perspectives_json is None:
             return jsonify({"message": "No perspectives found"}), 404
+        return Response(perspectives_json, mimetype='application/json'), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Manually validate and serialize each item using Pydantic's from_attributes
-        validated_perspectives = [Perspective.model_validate(p, from_attributes=True) for p in perspectives]
 
-        return jsonify([p.model_dump(mode='json') for p in validated_perspectives]), 200
-    except ValidationError as e:
-        return jsonify({"detail": e.errors()}), 400
+def _get_perspectives_page():
+    """Returns one page of perspectives ordered by id, starting after `after_id`."""
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_LIMIT, type=int)
+    if after_id < 0 or not 1 <= limit <= MAX_PAGE_LIMIT:
+        return jsonify({"error": f"after_id must be >= 0 and limit between 1 and {MAX_PAGE_LIMIT}."}), 400
+
+    try:
+        service = get_perspective_service()
+        items_json, next_after_id = service.get_perspectives_page_json(after_id, limit)
+        body = f'{{"items": {items_json}, "next_after_id": {json.dumps(next_after_id)}}}'
+        return Response(body, mimetype='application/json'), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _stream_perspectives_ndjson():
+    """Streams every perspective as one JSON document per line."""
+
+    def generate():
+        # The response body is produced after the request's teardown has run, so the
+        # stream uses its own session (for Postgres, its own pooled connection).
+        with perspective_service_session() as service:
+            for document in service.iter_perspective_json(itersize=STREAM_ITERSIZE):
+                yield document + "\n"
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+def _json_body_response(body: bytes, etag: str, projection: Optional[dict] = None):
+    """Wraps an already-encoded perspective body (or a projection of it) in a 200 response carrying its ETag."""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # The body only depends on the ETag's (id, updated_time) and the projection, so compress it once per version
+    cache_key = etag if projection is None else f"{etag};{json.dumps(projection, sort_keys=True)}"
+    set_compression_cache_key(response, cache_key)
+    return response, 200
+
+
+def _requested_projection() -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Reads the projection of a single-perspective GET from the query string:
+
+    - `?fields=column_state,filter_model`: only these document keys (any of
+      DOCUMENT_FIELDS), so the other columns are never read;
+    - `?view=<view>`: only the section items of that view;
+    - `?offset=<n>&limit=<n>`: a slice of the column_state items (after the view filter).
+
+    Returns (keyword arguments for `load_perspective_projection`, None), (None, None)
+    when the whole document is wanted, or (None, error message).
+    """
+    args = request.args
+    if not any(name in args for name in ('fields', 'view', 'offset', 'limit')):
+        return None, None
+
+    fields = DOCUMENT_FIELDS
+    if 'fields' in args:
+        requested = {field.strip() for field in args['fields'].split(',') if field.strip()}
+        unknown = requested.difference(DOCUMENT_FIELDS)
+        if not requested or unknown:
+            return None, f"fields must be a comma-separated list of {', '.join(DOCUMENT_FIELDS)}."
+        fields = tuple(field for field in DOCUMENT_FIELDS if field in requested)
+
+    offset = args.get('offset', 0, type=int)
+    limit = args.get('limit', type=int)
+    if offset < 0 or (limit is not None and not 1 <= limit <= MAX_ITEMS_LIMIT):
+        return None, f"offset must be >= 0 and limit between 1 and {MAX_ITEMS_LIMIT}."
+    if (offset or limit is not None) and PAGED_SECTION not in fields:
+        return None, f"offset and limit page through {PAGED_SECTION}, which fields does not include."
+    return {'fields': fields, 'view': args.get('view'), 'offset': offset, 'limit': limit}, None
+
+
+def _if_none_match_tag(etag: str) -> Optional[str]:
+    """
+    The If-None-Match tag naming the current version `etag`, in whichever
+    Content-Encoding the client's copy came (see compression.py), or None.
+    """
+    if request.if_none_match.star_tag:
+        return etag
+    for tag in request.if_none_match.as_set(include_weak=True):
+        if strip_encoding(tag) == etag:
+            return tag
+    return None
+
+
+def _not_modified(etag: str):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+@perspective_bp.route('/search', methods=['GET'])
+def search_perspectives_route():
+    """
+    Handles GET requests to find the perspectives that reference a column, view or filter field.
+
+    `?column=<name>`, `?view=<name>` and `?filter=<field>` (combined with AND) plus the
+    same `after_id`/`limit` keyset pagination as the listing.
+    """
+    column = request.args.get('column')
+    view = request.args.get('view')
+    filter_field = request.args.get('filter')
+    if column is None and view is None and filter_field is None:
+        return jsonify({"error": "At least one of column, view or filter is required."}), 400
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_LIMIT, type=int)
+    if after_id < 0 or not 1 <= limit <= MAX_PAGE_LIMIT:
+        return jsonify({"error": f"after_id must be >= 0 and limit between 1 and {MAX_PAGE_LIMIT}."}), 400
+
+    try:
+        service = get_perspective_service()
+        items, next_after_id = service.search_perspectives(column, view, filter_field, after_id, limit)
+        return jsonify({"items": items, "next_after_id": next_after_id}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -36,39 +185,136 @@ def get_all_perspectives_route():
 def get_perspective_by_username_route(username):
     """
     Handles GET requests to retrieve a single perspective by username.
+
+    `?fields=`, `?view=` and `?offset=`/`?limit=` return a projection of it (see
+    `_requested_projection`), read straight from storage.
     """
+    projection, error = _requested_projection()
+    if error is not None:
+        return jsonify({"error": error}), 400
     try:
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
-        perspective = service.get_perspective_by_username(username)
-        if not perspective:
-            return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+        service = get_perspective_service()
+        settle_pending_write(service, username=username)
+        # Conditional GET: answer 304 from the cache or a cheap updated_time lookup
+        if request.if_none_match:
+            etag = service.get_perspective_etag_by_username(username)
+            if etag is None:
+                return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+            matched = _if_none_match_tag(etag)
+            if matched is not None:
+                return _not_modified(matched)
+
+        if projection is not None:
+            loaded = service.load_perspective_projection(**projection, username=username)
+            if loaded is None:
+                return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+            return _json_body_response(*loaded, projection=projection)
 
-        # Validate and serialize the single item
-        validated_perspective = Perspective.model_validate(perspective, from_attributes=True)
-        return jsonify(validated_perspective.model_dump(mode='json')), 200
+        # Served from the read-through cache as an already-encoded body when possible
+        cached = service.get_perspective_json_by_username(username)
+        if cached is None:
+            return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+        return _json_body_response(*cached)
     except ValidationError as e:
         return jsonify({"detail": e.errors()}), 400
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@perspective_bp.route('/user/<string:username>', methods=['PATCH'])
+def patch_perspective_by_username_route(username):
+    """
+    Handles PATCH requests that apply a JSON Patch (RFC 6902) to a user's perspective.
+
+    Section items are addressed by name (and view) instead of by index, see
+    services/json_patch.py. Only the fields the patch touches are read and
+    rewritten, in a version-checked read-modify-write. With If-Match, the patch
+    only applies to that version of the perspective (412 otherwise).
+    The response carries only the new id, version and updated_time, plus the ETag.
+    Errors: 400 malformed patch, 404 unknown user, 409 missing target or failed
+    test, 422 the result would be an invalid perspective.
+    """
+    try:
+        data = get_request_json()
+        if not isinstance(data, list) or not data:
+            return jsonify({"error": "Body must be a non-empty JSON Patch array."}), 400
+        with timed('validation'):
+            operations = [PatchOperation.model_validate(operation) for operation in data]
+        fields = patch_fields(operations)
+
+        if_match = None
+        if request.if_match and not request.if_match.star_tag:
+            if_match = request.if_match.as_set()
+
+        service = get_perspective_service()
+        settle_pending_write(service, username=username)
+        updated = service.modify_perspective_fields(
+            username, fields, lambda current: apply_patch(current, operations), if_match=if_match
+        )
+        if updated is None:
+            return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+
+        response = jsonify(PatchResult.model_validate(updated))
+        response.set_etag(make_etag(updated['id'], updated['updated_time']))
+        return response, 200
+    except ValidationError as e:
+        return jsonify({"detail": e.errors(include_url=False, include_context=False)}), 400
+    except InvalidPatchError as e:
+        return jsonify({"error": str(e)}), 400
+    except PreconditionFailedError as e:
+        return jsonify({"error": str(e)}), 412
+    except (PatchConflictError, ConcurrentModificationError) as e:
+        return jsonify({"error": str(e)}), 409
+    except PatchResultError as e:
+        return jsonify({"error": str(e), "detail": e.detail}), 422
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
 @perspective_bp.route('/<int:perspective_id>', methods=['GET'])
 def get_perspective_by_id_route(perspective_id):
     """
     Handles GET requests to retrieve a single perspective by its ID.
+
+    `?fields=`, `?view=` and `?offset=`/`?limit=` return a projection of it (see
+    `_requested_projection`), read straight from storage.
     """
+    projection, error = _requested_projection()
+    if error is not None:
+        return jsonify({"error": error}), 400
     try:
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
-        perspective = service.get_perspective_by_id(perspective_id)
-        if not perspective:
-            return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
+        service = get_perspective_service()
+        settle_pending_write(service, perspective_id=perspective_id)
+        # Conditional GET: answer 304 from the cache or a cheap updated_time lookup
+        if request.if_none_match:
+            etag = service.get_perspective_etag_by_id(perspective_id)
+            if etag is None:
+                return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
+            matched = _if_none_match_tag(etag)
+            if matched is not None:
+                return _not_modified(matched)
+
+        if projection is not None:
+            loaded = service.load_perspective_projection(**projection, perspective_id=perspective_id)
+            if loaded is None:
+                return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
+            return _json_body_response(*loaded, projection=projection)
 
-        # Validate and serialize the single item
-        validated_perspective = Perspective.model_validate(perspective, from_attributes=True)
-        return jsonify(validated_perspective.model_dump(mode='json')), 200
+        # Served from the read-through cache as an already-encoded body when possible
+        cached = service.get_perspective_json_by_id(perspective_id)
+        if cached is None:
+            return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
+        return _json_body_response(*cached)
     except ValidationError as e:
         return jsonify({"detail": e.errors()}), 400
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -79,16 +325,79 @@ def create_perspective_route():
     Handles POST requests to create a new perspective.
     """
     try:
-        data = request.json
-        perspective_in = PerspectiveCreate.model_validate(data)
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
+        data = get_request_json()
+        with timed('validation'):
+            perspective_in = PerspectiveCreate.model_validate(data)
+        service = get_perspective_service()
         new_perspective = service.create_perspective(perspective_in)
 
-        validated_new_perspective = Perspective.model_validate(new_perspective, from_attributes=True)
-        return jsonify(validated_new_perspective.model_dump(mode='json')), 201
+        with timed('validation'):
+            validated_new_perspective = Perspective.model_validate(new_perspective.to_dict())
+        return jsonify(validated_new_perspective), 201
     except ValidationError as e:
         return jsonify({"detail": e.errors()}), 400
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@perspective_bp.route('/bulk', methods=['POST'])
+def bulk_create_perspectives_route():
+    """
+    Handles POST requests to create or replace many perspectives at once.
+
+    The body is a JSON array of perspective payloads (or {"perspectives": [...]}).
+    Every item is validated in one pass; valid items are written with multi-row
+    upserts in chunked transactions. The response lists a status per item, in
+    request order: created, updated, invalid, duplicate (a later item has the same
+    username and wins) or failed. It is 200 if every item was written, 207 otherwise.
+    """
+    try:
+        data = get_request_json()
+        items = data.get('perspectives') if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({"error": "Body must be a JSON array of perspectives."}), 400
+        if len(items) > BULK_MAX_ITEMS:
+            return jsonify({"error": f"At most {BULK_MAX_ITEMS} perspectives per request."}), 413
+
+        results = [None] * len(items)
+        valid = {}
+        for index, item in enumerate(items):
+            try:
+                with timed('validation'):
+                    perspective_in = PerspectiveCreate.model_validate(item)
+            except ValidationError as e:
+                results[index] = {"index": index, "status": "invalid", "detail": e.errors(include_url=False)}
+                continue
+            previous = valid.get(perspective_in.username)
+            if previous is not None:
+                results[previous[0]] = {
+                    "index": previous[0],
+                    "username": perspective_in.username,
+                    "status": "duplicate",
+                    "error": f"Superseded by item {index} with the same username.",
+                }
+            valid[perspective_in.username] = (index, perspective_in)
+
+        if valid:
+            service = get_perspective_service()
+            for username in valid:
+                settle_pending_write(service, username=username)
+            indexes, perspectives = zip(*valid.values())
+            written = service.bulk_upsert_perspectives(list(perspectives), chunk_size=BULK_CHUNK_SIZE)
+            for index, result in zip(indexes, written):
+                results[index] = {"index": index, **result}
+
+        summary = {}
+        for result in results:
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        all_written = all(r["status"] in ("created", "updated") for r in results)
+        return jsonify({"summary": summary, "results": results}), 200 if all_written else 207
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -99,18 +408,36 @@ def update_perspective_route(perspective_id):
     Handles PUT requests to update an existing perspective.
     """
     try:
-        data = request.json
-        perspective_in = PerspectiveUpdate.model_validate(data)
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
-        updated_perspective = service.update_perspective(perspective_id, perspective_in)
+        data = get_request_json()
+        with timed('validation'):
+            perspective_in = PerspectiveUpdate.model_validate(data)
+
+        # Conditional PUT: only write while the row still matches one of the If-Match ETags
+        if_match = None
+        if request.if_match and not request.if_match.star_tag:
+            if_match = updated_times_for(perspective_id, request.if_match.as_set())
+            if not if_match:
+                return jsonify({"error": "If-Match does not match the current perspective."}), 412
+
+        service = get_perspective_service()
+        settle_pending_write(service, perspective_id=perspective_id)
+        updated_perspective = service.update_perspective(perspective_id, perspective_in, if_match=if_match)
         if not updated_perspective:
             return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
 
-        validated_updated_perspective = Perspective.model_validate(updated_perspective, from_attributes=True)
-        return jsonify(validated_updated_perspective.model_dump(mode='json')), 200
+        with timed('validation'):
+            validated_updated_perspective = Perspective.model_validate(updated_perspective.to_dict())
+        response = jsonify(validated_updated_perspective)
+        response.set_etag(make_etag(updated_perspective.id, updated_perspective.updated_time))
+        return response, 200
+    except PreconditionFailedError as e:
+        return jsonify({"error": str(e)}), 412
     except ValidationError as e:
         return jsonify({"detail": e.errors()}), 400
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -121,11 +448,93 @@ def delete_perspective_route(perspective_id):
     Handles DELETE requests to delete a perspective.
     """
     try:
-        conn, curr = get_db()
-        service = PerspectiveService(conn, curr)
+        service = get_perspective_service()
+        settle_pending_write(service, perspective_id=perspective_id)
         deleted = service.delete_perspective(perspective_id)
         if not deleted:
             return jsonify({"message": f"Perspective with id {perspective_id} not found"}), 404
         return jsonify({"message": f"Perspective with id {perspective_id} deleted successfully"}), 200
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@perspective_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats_route():
+    """
+    Handles GET requests for the perspective cache's size and hit/miss counters.
+    """
+    return jsonify(perspective_cache.stats()), 200
+
+
+@perspective_bp.route('/concurrency/stats', methods=['GET'])
+def get_concurrency_stats_route():
+    """
+    Handles GET requests for the optimistic-concurrency conflict and retry counters.
+    """
+    return jsonify(concurrency_stats.stats()), 200
+
+
+@perspective_bp.route('/compression/stats', methods=['GET'])
+def get_compression_stats_route():
+    """
+    Handles GET requests for the compressed-body cache's size and hit/miss counters.
+    """
+    return jsonify(compressed_body_cache.stats()), 200
+
+
+@perspective_bp.route('/write_behind/stats', methods=['GET'])
+def get_write_behind_stats_route():
+    """
+    Handles GET requests for the write-behind buffer's pending count and buffered/coalesced/flushed counters.
+    """
+    return jsonify(write_behind.stats()), 200
+
+
+@perspective_bp.route('/row_model/stats', methods=['GET'])
+def get_row_model_stats_route():
+    """
+    Handles GET requests for the row model's open datasets and its predicate and row-order cache counters.
+    """
+    return jsonify(row_model.stats()), 200
+
+
+def _slow_queries_denied() -> Optional[Tuple[Response, int]]:
+    """The error response for a caller without the slow-query admin token, or None if it has it."""
+    if not DB_SLOW_QUERY_ADMIN_TOKEN:
+        return jsonify({"message": "The slow-query log is disabled (DB_SLOW_QUERY_ADMIN_TOKEN is not set)."}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), DB_SLOW_QUERY_ADMIN_TOKEN.encode()):
+        return jsonify({"error": "A valid X-Admin-Token header is required."}), 403
+    return None
+
+
+@perspective_bp.route('/db/slow_queries', methods=['GET'])
+def get_slow_queries_route():
+    """
+    Handles GET requests for the most recent slow statements and their EXPLAIN plans, newest first.
+    Requires the X-Admin-Token header to match DB_SLOW_QUERY_ADMIN_TOKEN.
+    """
+    denied = _slow_queries_denied()
+    if denied is not None:
+        return denied
+    return jsonify({
+        "slow_query_ms": DB_SLOW_QUERY_MS,
+        "query_budget": DB_QUERY_BUDGET,
+        "time_budget_ms": DB_TIME_BUDGET_MS,
+        "capacity": slow_queries.capacity,
+        "slow_queries": slow_queries.entries(),
+    }), 200
+
+
+@perspective_bp.route('/db/slow_queries', methods=['DELETE'])
+def clear_slow_queries_route():
+    """
+    Handles DELETE requests to empty the slow-query buffer.
+    Requires the X-Admin-Token header to match DB_SLOW_QUERY_ADMIN_TOKEN.
+    """
+    denied = _slow_queries_denied()
+    if denied is not None:
+        return denied
+    slow_queries.clear()
+    return jsonify({"message": "Slow-query buffer cleared."}), 200
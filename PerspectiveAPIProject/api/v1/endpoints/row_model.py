@@ -0,0 +1,73 @@
+from flask import Blueprint, current_app, jsonify, request
+from ...services.storage import get_perspective_service
+from ...services.write_behind import PendingWriteError, settle_pending_write
+from ...services.row_model import DatasetNotFoundError, RowModelError, np, row_model, select_item
+
+row_model_bp = Blueprint('row_model', __name__)
+
+# Page size bounds for row model pages.
+DEFAULT_ROW_LIMIT = 100
+MAX_ROW_LIMIT = 1000
+
+
+@row_model_bp.route('/<string:dataset_id>', methods=['GET'])
+def get_rows_route(dataset_id):
+    """
+    Handles GET requests for one page of a dataset, filtered and sorted server-side
+    by a user's saved filter_model and sort_model (see services/row_model.py).
+
+    `?username=` and `?view=` select the perspective and view. The view's default
+    filter_model and sort_model items are applied (else its first ones);
+    `?filter_name=` and `?sort_name=` pick an item by name instead.
+    `?offset=`/`?limit=` page through the sorted result.
+    """
+    if np is None:
+        return jsonify({"error": "The row model requires numpy."}), 501
+    args = request.args
+    username = args.get('username')
+    view = args.get('view')
+    if not username or not view:
+        return jsonify({"error": "username and view are required."}), 400
+    offset = args.get('offset', 0, type=int)
+    limit = args.get('limit', DEFAULT_ROW_LIMIT, type=int)
+    if offset < 0 or not 1 <= limit <= MAX_ROW_LIMIT:
+        return jsonify({"error": f"offset must be >= 0 and limit between 1 and {MAX_ROW_LIMIT}."}), 400
+
+    try:
+        service = get_perspective_service()
+        settle_pending_write(service, username=username)
+        loaded = service.load_perspective_projection(('sort_model', 'filter_model'), view=view, username=username)
+        if loaded is None:
+            return jsonify({"message": f"Perspective for user '{username}' not found"}), 404
+        perspective = current_app.json.loads(loaded[0])
+
+        filter_item = select_item(perspective.get('filter_model') or [], args.get('filter_name'))
+        sort_item = select_item(perspective.get('sort_model') or [], args.get('sort_name'))
+        for kind, name, item in (('filter_model', args.get('filter_name'), filter_item),
+                                 ('sort_model', args.get('sort_name'), sort_item)):
+            if name is not None and item is None:
+                return jsonify({"message": f"{kind} item '{name}' not found in view '{view}'."}), 404
+
+        page = row_model.get_rows(dataset_id,
+                                  (filter_item.get('filters') or {}) if filter_item else {},
+                                  (sort_item.get('filters') or {}) if sort_item else {},
+                                  offset, limit)
+        return jsonify({
+            "dataset": dataset_id,
+            "username": username,
+            "view": view,
+            "filter_model": filter_item['name'] if filter_item else None,
+            "sort_model": sort_item['name'] if sort_item else None,
+            "offset": offset,
+            "limit": limit,
+            **page,
+        }), 200
+
+    except DatasetNotFoundError as e:
+        return jsonify({"message": str(e)}), 404
+    except RowModelError as e:
+        return jsonify({"error": str(e)}), 400
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
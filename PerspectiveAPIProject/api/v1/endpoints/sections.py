@@ -0,0 +1,159 @@
+"""
+Shared bodies of the section routes (column_state, filter_model, sort_model).
+
+Each blueprint keeps its own URLs and docstrings and calls one of these with
+its section name and item schema:
+
+- `save_section`: replace the whole section (/save, /singleSaveUpdate), or
+  upsert a batch of items by merge key (/save_single_*).
+- `delete_section_items_route`: remove items by merge key (/delete_single).
+
+Both create the perspective when the user has none and the body carries
+layout_name and updated_by, and answer 400 otherwise.
+"""
+from typing import Callable, List, Optional, Type
+
+from flask import jsonify
+from pydantic import BaseModel, ValidationError
+from werkzeug.exceptions import HTTPException
+
+from ...schemas.perspective import Perspective
+from ...services.storage import get_perspective_service
+from ...services.concurrency import ConcurrentModificationError, ItemNotFoundError
+from ...services.merge import SECTION_MERGE_KEYS, delete_section_items, parse_item_keys
+from ...services.write_behind import PendingWriteError, buffer_column_state, settle_pending_write
+from ...json_provider import get_request_json
+from ...metrics import timed
+
+
+def _label(section: str) -> str:
+    return section.replace('_', ' ')
+
+
+def _missing_message(section: str, missing: List[tuple]) -> str:
+    if SECTION_MERGE_KEYS[section] == ('name',):
+        names = "', '".join(name for name, in missing)
+        return f"{_label(section).capitalize()} with name '{names}' not found."
+    names = ", ".join(f"'{name}' (view '{view}')" for name, view in missing)
+    return f"{_label(section).capitalize()} item {names} not found."
+
+
+def save_section(section: str, item_schema: Type[BaseModel], merge: bool,
+                 result_schema: Type[BaseModel] = Perspective,
+                 prepare: Optional[Callable[[dict], dict]] = None, buffered: bool = False):
+    """
+    Saves the `section` items of the request body.
+
+    merge=False replaces the section with the list given; merge=True upserts one
+    item or a list of them by SECTION_MERGE_KEYS[section]. `prepare` rewrites
+    each validated item before it is written. buffered=True lets write-behind
+    absorb the save (column_state only; see services/write_behind.py).
+    """
+    try:
+        data = get_request_json()
+        username = data.get('username')
+        section_data = data.get(section) if merge else data.get(section, [])
+
+        if not username:
+            return jsonify({"error": "Username is required."}), 400
+
+        if merge:
+            if section_data is None:
+                return jsonify({"error": f"{section} data is required."}), 400
+            section_data = section_data if isinstance(section_data, list) else [section_data]
+            keys = SECTION_MERGE_KEYS[section]
+            for item in section_data:
+                if not isinstance(item, dict) or not all(key in item for key in keys):
+                    fields = (f"a '{keys[0]}' field" if len(keys) == 1
+                              else f"{' and '.join(repr(key) for key in keys)} fields")
+                    return jsonify({"error": f"Each {_label(section)} item must be a single JSON object "
+                                             f"with {fields}."}), 400
+        elif not isinstance(section_data, list):
+            return jsonify({"error": f"{section} must be a list."}), 400
+
+        try:
+            with timed('validation'):
+                validated_items = [item_schema.model_validate(item) for item in section_data]
+        except ValidationError as e:
+            return jsonify({"error": f"Invalid {section} data", "detail": e.errors()}), 400
+
+        items = [item.model_dump() for item in validated_items]
+        if prepare is not None:
+            items = [prepare(item) for item in items]
+        layout_name = data.get('layout_name')
+        updated_by = data.get('updated_by')
+
+        service = get_perspective_service()
+        if buffered:
+            pending = buffer_column_state(service, username, items, layout_name, updated_by)
+            if pending is not None:
+                return jsonify({"username": username, section: pending.column_state, "buffered": True}), 202
+        settle_pending_write(service, username=username)
+
+        # If the perspective exists its section is changed in place; otherwise a new perspective is created.
+        write = service.upsert_section_items if merge else service.replace_section_items
+        saved = write(section, username, items, layout_name, updated_by)
+
+        if saved is None:
+            # The user has no perspective and the body lacks what is needed to create one.
+            if not layout_name:
+                return jsonify({"error": "layout_name is required for new perspectives."}), 400
+            return jsonify({"error": "updated_by is required for new perspectives."}), 400
+
+        with timed('validation'):
+            result = result_schema.model_validate(saved)
+        return jsonify(result), 201 if saved['created'] else 200
+
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def delete_section_items_route(section: str, body_key: str):
+    """
+    Removes the `section` items named by `body_key` in the request body (see
+    `parse_item_keys`). Nothing is deleted unless every item exists.
+    """
+    try:
+        data = get_request_json()
+        username = data.get('username')
+        requested = data.get(body_key)
+
+        if not username or not requested:
+            return jsonify({"error": f"Username and {body_key} are required."}), 400
+        try:
+            keys = parse_item_keys(section, requested)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def remove_items(existing):
+            remaining, missing = delete_section_items(section, existing, keys)
+            if missing:
+                raise ItemNotFoundError(_missing_message(section, missing))
+            return remaining
+
+        service = get_perspective_service()
+        settle_pending_write(service, username=username)
+
+        # Version-checked read-modify-write; retried automatically if another save wins the race.
+        updated_row = service.modify_section_items(section, username, remove_items)
+        if updated_row is None:
+            return jsonify({"message": f"Perspective for user '{username}' not found."}), 404
+
+        with timed('validation'):
+            validated_updated_perspective = Perspective.model_validate(updated_row)
+        return jsonify(validated_updated_perspective), 200
+
+    except ItemNotFoundError as e:
+        return jsonify({"message": str(e)}), 404
+    except ConcurrentModificationError as e:
+        return jsonify({"error": str(e)}), 409
+    except PendingWriteError as e:
+        return jsonify({"error": str(e)}), 503
+    except HTTPException as e:
+        return jsonify({"error": e.description}), e.code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,39 @@
+from flask import Blueprint
+from ...schemas.perspective import ViewSetting, SortModelSaveResult
+from .sections import delete_section_items_route, save_section
+
+sort_model_bp = Blueprint('sort_model', __name__)
+
+
+@sort_model_bp.route('/save', methods=['POST'])
+def save_sort_model_route():
+    """
+    Handles POST requests to save a whole sort_model.
+    If the user does not exist, a new perspective is created.
+    If the user exists, the existing perspective's sort_model is replaced.
+    """
+    return save_section('sort_model', ViewSetting, merge=False)
+
+
+@sort_model_bp.route('/save_single_sort', methods=['POST'])
+def save_single_sort_model_route():
+    """
+    Handles POST requests to save or update one or more sort_model items.
+    Items are upserted by the combination of 'name' and 'view' (see services/merge.py):
+    - If a sort_model item with the same name and view exists, it is updated.
+    - If not, a new sort_model item is added.
+    - If the user does not exist, a new perspective is created.
+    Only the merged sort_model is returned.
+    """
+    return save_section('sort_model', ViewSetting, merge=True, result_schema=SortModelSaveResult)
+
+
+@sort_model_bp.route('/delete_single', methods=['DELETE'])
+def delete_single_sort_model_route():
+    """
+    Handles DELETE requests to remove sort_model items.
+    The request body must contain the username and `sort_model`: one
+    {"name", "view"} object or a list of them. Nothing is deleted unless every
+    item exists.
+    """
+    return delete_section_items_route('sort_model', 'sort_model')
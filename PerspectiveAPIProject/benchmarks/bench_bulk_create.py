@@ -0,0 +1,63 @@
+"""
+Time to create N perspectives through POST /api/v1/perspectives/bulk versus one POST per user.
+
+Run from the PerspectiveAPIProject directory against a migrated database:
+
+    python -m benchmarks.bench_bulk_create --count 10000 --single-count 500
+"""
+import argparse
+import time
+import uuid
+
+import main
+
+
+def _payload(username: str, columns: int) -> dict:
+    return {
+        "username": username,
+        "layout_name": "Onboarding Layout",
+        "updated_by": "benchmark@example.com",
+        "column_state": [{
+            "name": "default",
+            "view": "grid",
+            "defaultColumns": [f"col_{i}" for i in range(columns)],
+            "default": True,
+        }],
+        "sort_model": [],
+        "filter_model": [],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="perspectives created through /bulk")
+    parser.add_argument("--single-count", type=int, default=500, help="perspectives created one POST at a time")
+    parser.add_argument("--columns", type=int, default=20, help="defaultColumns per perspective")
+    args = parser.parse_args()
+
+    client = main.app.test_client()
+    run_id = uuid.uuid4().hex[:8]
+
+    payloads = [_payload(f"bulk_{run_id}_{i}", args.columns) for i in range(args.count)]
+    start = time.perf_counter()
+    response = client.post("/api/v1/perspectives/bulk", json=payloads)
+    bulk_elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"Bulk request failed ({response.status_code}): {response.get_json()['summary']}")
+
+    start = time.perf_counter()
+    for i in range(args.single_count):
+        single = client.post("/api/v1/perspectives/", json=_payload(f"single_{run_id}_{i}", args.columns))
+        if single.status_code != 201:
+            raise RuntimeError(f"Single create failed ({single.status_code}): {single.get_json()}")
+    single_elapsed = time.perf_counter() - start
+
+    bulk_rate = args.count / bulk_elapsed
+    single_rate = args.single_count / single_elapsed if args.single_count else float("nan")
+    print(f"{'mode':<14}{'items':>8}{'seconds':>10}{'items/s':>12}")
+    print(f"{'bulk':<14}{args.count:>8}{bulk_elapsed:>10.2f}{bulk_rate:>12.0f}")
+    print(f"{'one-by-one':<14}{args.single_count:>8}{single_elapsed:>10.2f}{single_rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main_cli()
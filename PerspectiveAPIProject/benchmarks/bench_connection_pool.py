@@ -0,0 +1,102 @@
+"""
+Requests/sec for GET /api/v1/perspectives/user/<username> with and without the connection pool.
+
+The "connect-per-request" mode reproduces the previous behaviour: a fresh
+psycopg2 connection (plus `SET search_path`) for every request, closed again
+in the teardown hook.
+
+Run from the PerspectiveAPIProject directory against a database that holds
+the recsui.perspectives table:
+
+    python -m benchmarks.bench_connection_pool --requests 2000 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import DictCursor
+
+import main
+from api.database import database
+
+BENCH_USERNAME = "benchmark_pool_user"
+
+
+def _connect_per_request():
+    """The pre-pool get_db_connection: one physical connection per request."""
+    conn = psycopg2.connect(
+        dbname=database.DB_NAME,
+        user=database.DB_USER,
+        password=database.DB_PASSWORD,
+        host=database.DB_HOST,
+        port=database.DB_PORT,
+    )
+    curr = conn.cursor(cursor_factory=DictCursor)
+    curr.execute(f"SET search_path TO {database.DB_SCHEMA};")
+    return conn, curr
+
+
+def _close_per_request(conn, curr):
+    if curr:
+        curr.close()
+    if conn:
+        conn.close()
+
+
+def _ensure_user(client):
+    response = client.get(f"/api/v1/perspectives/user/{BENCH_USERNAME}")
+    if response.status_code == 404:
+        client.post("/api/v1/perspectives/", json={
+            "username": BENCH_USERNAME,
+            "layout_name": "Benchmark Layout",
+            "updated_by": "benchmark@example.com",
+        })
+
+
+def _run(total_requests: int, threads: int) -> float:
+    """Fires `total_requests` GETs from `threads` workers and returns requests/sec."""
+    url = f"/api/v1/perspectives/user/{BENCH_USERNAME}"
+
+    def worker(count):
+        client = main.app.test_client()
+        for _ in range(count):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"Unexpected status {response.status_code}: {response.get_data(as_text=True)}")
+
+    per_thread = [total_requests // threads] * threads
+    per_thread[0] += total_requests % threads
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, per_thread))
+    return total_requests / (time.perf_counter() - start)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    _ensure_user(main.app.test_client())
+
+    pooled_get, pooled_release = database.get_db_connection, main.release_db_connection
+
+    database.get_db_connection, main.release_db_connection = _connect_per_request, _close_per_request
+    try:
+        before = _run(args.requests, args.threads)
+    finally:
+        database.get_db_connection, main.release_db_connection = pooled_get, pooled_release
+
+    after = _run(args.requests, args.threads)
+
+    print(f"{'mode':<22}{'req/s':>12}")
+    print(f"{'connect-per-request':<22}{before:>12.1f}")
+    print(f"{'pooled':<22}{after:>12.1f}")
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,149 @@
+"""
+Memory per perspective DTO: the previous eager, dict-backed objects versus the
+lazy __slots__ DTOs in api/models/perspective.py, on a 200-column layout.
+
+No database is needed; rows are synthesized in the shape psycopg2 returns them
+(sections decoded to lists), and in the shape the sqlite backend hands over
+(sections as JSON text).
+
+    python -m benchmarks.bench_dto_memory --count 200 --columns 200 --views 8
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from datetime import datetime, timezone
+
+from api.models.perspective import Perspective
+
+
+class _EagerColumnState:
+    def __init__(self, name, view, defaultColumns, default):
+        self.name = name
+        self.view = view
+        self.defaultColumns = defaultColumns
+        self.default = default
+
+
+class _EagerFilterDetail:
+    def __init__(self, type, filter):
+        self.type = type
+        self.filter = filter
+
+
+class _EagerViewSetting:
+    def __init__(self, name, view, filters, default):
+        self.name = name
+        self.view = view
+        self.filters = filters
+        self.default = default
+
+
+class _EagerPerspective:
+    """The DTO as it was before lazy decoding: every nested object built up front."""
+
+    def __init__(self, data):
+        self.id = data['id']
+        self.username = data['username']
+        self.layout_name = data['layout_name']
+        self.updated_by = data['updated_by']
+        self.column_state = [_EagerColumnState(**cs) for cs in data['column_state']]
+        self.sort_model = [self._view_setting(sm) for sm in data['sort_model']]
+        self.filter_model = [self._view_setting(fm) for fm in data['filter_model']]
+        self.updated_time = data['updated_time']
+        self.version = data['version']
+
+    @staticmethod
+    def _view_setting(data):
+        filters = {k: _EagerFilterDetail(**v) for k, v in data['filters'].items()}
+        return _EagerViewSetting(data['name'], data['view'], filters, data['default'])
+
+
+def _row(i: int, columns: int, views: int) -> dict:
+    return {
+        "id": i,
+        "username": f"user_{i}",
+        "layout_name": "Trading Blotter",
+        "updated_by": "someone@example.com",
+        "column_state": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "defaultColumns": [f"column_{c}" for c in range(columns)],
+            "default": v == 0,
+        } for v in range(views)],
+        "sort_model": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "filters": {f"column_{c}": {"type": "asc", "filter": ""} for c in range(3)},
+            "default": v == 0,
+        } for v in range(views)],
+        "filter_model": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "filters": {f"column_{c}": {"type": "contains", "filter": f"value_{c}"} for c in range(columns // 10)},
+            "default": v == 0,
+        } for v in range(views)],
+        "updated_time": datetime.now(timezone.utc),
+        "version": 1,
+    }
+
+
+def _text_row(i: int, columns: int, views: int) -> dict:
+    row = _row(i, columns, views)
+    for section in ('column_state', 'sort_model', 'filter_model'):
+        row[section] = json.dumps(row[section])
+    return row
+
+
+def _measure(make_row, count: int, columns: int, views: int, build, touch=None) -> float:
+    """
+    Bytes per perspective that stay allocated once the DTOs are built (and
+    touched, when `touch` is given) and the source rows are dropped.
+
+    The rows are built inside the traced region and deleted before measuring,
+    so whatever a DTO keeps of its row (the lazy DTO holds on to the decoded
+    sections) is counted, and what it copied out of a dropped row is too.
+    """
+    gc.collect()
+    tracemalloc.start()
+    rows = [make_row(i, columns, views) for i in range(count)]
+    dtos = [build(row) for row in rows]
+    if touch is not None:
+        for dto in dtos:
+            touch(dto)
+    del rows
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del dtos
+    return size / count
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="perspectives built per measurement")
+    parser.add_argument("--columns", type=int, default=200, help="defaultColumns per column_state item")
+    parser.add_argument("--views", type=int, default=8, help="items per JSONB section")
+    args = parser.parse_args()
+
+    def measure(build, touch=None, make_row=_row):
+        return _measure(make_row, args.count, args.columns, args.views, build, touch)
+
+    read_all = lambda p: (p.column_state, p.sort_model, p.filter_model)
+    results = [
+        ("decoded row (reference)", measure(lambda row: row)),
+        ("eager dict-backed", measure(_EagerPerspective)),
+        ("lazy, untouched", measure(Perspective.from_dict)),
+        ("lazy, column_state read", measure(Perspective.from_dict, lambda p: p.column_state)),
+        ("lazy, all sections read", measure(Perspective.from_dict, read_all)),
+        ("text row (reference)", measure(lambda row: row, make_row=_text_row)),
+        ("lazy text, untouched", measure(Perspective.from_dict, make_row=_text_row)),
+        ("lazy text, all read", measure(Perspective.from_dict, read_all, make_row=_text_row)),
+    ]
+    print(f"{'DTO':<26}{'bytes/perspective':>20}")
+    for label, size in results:
+        print(f"{label:<26}{size:>20.0f}")
+
+
+if __name__ == "__main__":
+    main_cli()
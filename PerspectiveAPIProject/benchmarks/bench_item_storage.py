@@ -0,0 +1,118 @@
+"""
+JSONB-array sections (PerspectiveService) against one row per item
+(ItemPerspectiveService, migration 6) as sections grow. For each section size
+it times single-item writes, a section rewrite with one changed item and
+document reads, and reports the WAL each call generates: the array layout
+rewrites the whole section on every write, the item layout only the item's row.
+
+Run from the PerspectiveAPIProject directory against a migrated database:
+
+    python -m benchmarks.bench_item_storage --perspectives 200 --iterations 500 --views 8 64 256
+"""
+import argparse
+import random
+import time
+import uuid
+
+from api.database.database import get_db_connection, release_db_connection
+from api.services.concurrency import ItemNotFoundError
+from api.services.item_perspective import ItemPerspectiveService
+from api.services.perspective import PerspectiveService
+from benchmarks.bench_storage_backends import _payload
+
+LAYOUTS = {"jsonb": PerspectiveService, "items": ItemPerspectiveService}
+
+
+def _wal_lsn(curr) -> str:
+    curr.execute("SELECT pg_current_wal_lsn()::text;")
+    lsn = curr.fetchone()[0]
+    curr.connection.rollback()
+    return lsn
+
+
+def _wal_bytes(curr, start: str) -> int:
+    curr.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s::pg_lsn);", (start,))
+    written = int(curr.fetchone()[0])
+    curr.connection.rollback()
+    return written
+
+
+def _time(layout: str, views: int, label: str, iterations: int, fn, curr):
+    fn()  # warm up
+    lsn = _wal_lsn(curr)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    wal = _wal_bytes(curr, lsn) / iterations
+    print(f"{layout:<8}{views:>6}  {label:<28}{iterations:>7}{iterations / elapsed:>10.0f}{wal:>12.0f}")
+
+
+def _remove_last(items):
+    if not items:
+        raise ItemNotFoundError("empty section")
+    return items[:-1]
+
+
+def _run(layout: str, views: int, args):
+    conn, curr = get_db_connection()
+    service = LAYOUTS[layout](conn, curr)
+    try:
+        run_id = uuid.uuid4().hex[:8]
+        usernames = [f"items_{run_id}_{i}" for i in range(args.perspectives)]
+        written = service.bulk_upsert_perspectives([_payload(u, views, args.columns) for u in usernames])
+        ids = [result["id"] for result in written]
+        counter = iter(range(10 ** 9))
+
+        def one_item():
+            n = next(counter)
+            return {"name": f"layout_{n % views}", "view": f"view_{n % 4}",
+                    "defaultColumns": [f"col_{n}"], "default": False}
+
+        def changed_section():
+            section = [{"name": f"layout_{v}", "view": f"view_{v % 4}",
+                        "defaultColumns": [f"col_{i}" for i in range(args.columns)], "default": v == 0}
+                       for v in range(views)]
+            section[0] = dict(section[0], defaultColumns=[f"col_{next(counter)}"])
+            return section
+
+        def add_then_delete():
+            username = random.choice(usernames)
+            service.upsert_section_items("column_state", username, [dict(one_item(), name="extra")])
+            service.modify_section_items("column_state", username, _remove_last)
+
+        _time(layout, views, "upsert one item", args.iterations,
+              lambda: service.upsert_section_items("column_state", random.choice(usernames), [one_item()]), curr)
+        _time(layout, views, "add + delete one item", args.iterations // 2, add_then_delete, curr)
+        _time(layout, views, "replace, one item changed", args.iterations,
+              lambda: service.replace_section_items("column_state", random.choice(usernames), changed_section()),
+              curr)
+        _time(layout, views, "load document", args.iterations,
+              lambda: service.load_perspective_document(username=random.choice(usernames)), curr)
+        _time(layout, views, "load column_state of a view", args.iterations,
+              lambda: service.load_perspective_projection(("column_state",), view="view_1",
+                                                          username=random.choice(usernames)), curr)
+
+        for perspective_id in ids:
+            service.delete_perspective(perspective_id)
+    finally:
+        release_db_connection(conn, curr)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--perspectives", type=int, default=200, help="perspectives written per layout and size")
+    parser.add_argument("--iterations", type=int, default=500, help="calls per operation")
+    parser.add_argument("--views", type=int, nargs="+", default=[8, 64, 256], help="items per section")
+    parser.add_argument("--columns", type=int, default=30, help="defaultColumns per column_state item")
+    args = parser.parse_args()
+
+    print(f"{'layout':<8}{'items':>6}  {'operation':<28}{'calls':>7}{'calls/s':>10}{'WAL B/call':>12}")
+    for views in args.views:
+        for layout in args.layouts:
+            _run(layout, views, args)
+
+
+if __name__ == "__main__":
+    main_cli()
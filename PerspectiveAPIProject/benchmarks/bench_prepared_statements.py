@@ -0,0 +1,95 @@
+"""
+Per-call latency of the PerspectiveService statements on a plain psycopg2
+connection (every statement parsed and planned on each call) versus a
+PreparingConnection (prepared once, then only EXECUTE).
+
+Run from the PerspectiveAPIProject directory against a migrated database:
+
+    python -m benchmarks.bench_prepared_statements --iterations 2000 --views 20 --columns 50
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import psycopg2
+from psycopg2.extras import DictCursor
+
+from api.database.database import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+from api.database.prepared import PreparingConnection
+from api.schemas.perspective import PerspectiveCreate, PerspectiveUpdate
+from api.services.perspective import PerspectiveService
+
+
+def _payload(username: str, views: int, columns: int) -> PerspectiveCreate:
+    return PerspectiveCreate.model_validate({
+        "username": username,
+        "layout_name": "Benchmark Layout",
+        "updated_by": "benchmark@example.com",
+        "column_state": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "defaultColumns": [f"col_{i}" for i in range(columns)],
+            "default": v == 0,
+        } for v in range(views)],
+        "sort_model": [],
+        "filter_model": [],
+    })
+
+
+def _connect(connection_factory=None):
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                            connection_factory=connection_factory)
+    return conn, conn.cursor(cursor_factory=DictCursor)
+
+
+def _time(iterations: int, fn) -> list:
+    fn()  # warm up (and prepare)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _operations(service: PerspectiveService, perspective_id: int, username: str):
+    column_state = [{"name": "layout_bench", "view": "grid", "defaultColumns": ["col_0"], "default": False}]
+    return [
+        ("get_perspective_by_id", lambda: service.get_perspective_by_id(perspective_id)),
+        ("load_perspective_document", lambda: service.load_perspective_document(username=username)),
+        ("update_perspective", lambda: service.update_perspective(
+            perspective_id, PerspectiveUpdate(updated_by="benchmark@example.com"))),
+        ("upsert_section_items", lambda: service.upsert_section_items('column_state', username, column_state)),
+    ]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per operation and mode")
+    parser.add_argument("--views", type=int, default=20, help="column_state items on the benchmark perspective")
+    parser.add_argument("--columns", type=int, default=50, help="defaultColumns per column_state item")
+    args = parser.parse_args()
+
+    username = f"prepared_{uuid.uuid4().hex[:8]}"
+    plain_conn, plain_curr = _connect()
+    prepared_conn, prepared_curr = _connect(PreparingConnection)
+    try:
+        plain, prepared = PerspectiveService(plain_conn, plain_curr), PerspectiveService(prepared_conn, prepared_curr)
+        perspective_id = plain.create_perspective(_payload(username, args.views, args.columns)).id
+
+        print(f"{'operation':<28}{'plain p50 ms':>14}{'prepared p50 ms':>17}{'speedup':>9}")
+        for (label, run_plain), (_, run_prepared) in zip(_operations(plain, perspective_id, username),
+                                                         _operations(prepared, perspective_id, username)):
+            old = statistics.median(_time(args.iterations, run_plain))
+            new = statistics.median(_time(args.iterations, run_prepared))
+            print(f"{label:<28}{old * 1000:>14.3f}{new * 1000:>17.3f}{old / new:>8.2f}x")
+
+        plain.delete_perspective(perspective_id)
+    finally:
+        plain_conn.close()
+        prepared_conn.close()
+
+
+if __name__ == "__main__":
+    main_cli()
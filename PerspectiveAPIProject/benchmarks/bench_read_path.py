@@ -0,0 +1,98 @@
+"""
+Single-perspective and page reads: the rehydrating path (DictCursor row -> DTO ->
+pydantic -> JSON) versus the JSON document built by Postgres.
+
+Run from the PerspectiveAPIProject directory against a migrated database:
+
+    python -m benchmarks.bench_read_path --iterations 2000 --views 20 --columns 50
+"""
+import argparse
+import time
+import uuid
+
+from api.database.database import get_db_connection, release_db_connection
+from api.schemas.perspective import Perspective, PerspectiveCreate
+from api.services.perspective import PerspectiveService
+
+PAGE_SIZE = 100
+
+
+def _payload(username: str, views: int, columns: int) -> PerspectiveCreate:
+    return PerspectiveCreate.model_validate({
+        "username": username,
+        "layout_name": "Benchmark Layout",
+        "updated_by": "benchmark@example.com",
+        "column_state": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "defaultColumns": [f"col_{i}" for i in range(columns)],
+            "default": v == 0,
+        } for v in range(views)],
+        "sort_model": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "filters": {f"col_{i}": {"type": "asc", "filter": ""} for i in range(5)},
+            "default": v == 0,
+        } for v in range(views)],
+        "filter_model": [{
+            "name": f"layout_{v}",
+            "view": "grid",
+            "filters": {f"col_{i}": {"type": "contains", "filter": f"value_{i}"} for i in range(5)},
+            "default": v == 0,
+        } for v in range(views)],
+    })
+
+
+def _rehydrate_one(service: PerspectiveService, perspective_id: int) -> bytes:
+    perspective = service.get_perspective_by_id(perspective_id)
+    return Perspective.model_validate(perspective, from_attributes=True).model_dump_json().encode()
+
+
+def _rehydrate_page(service: PerspectiveService, after_id: int) -> bytes:
+    perspectives = service.get_perspectives_page(after_id, PAGE_SIZE)
+    items = [Perspective.model_validate(p, from_attributes=True).model_dump_json() for p in perspectives]
+    return ("[" + ",".join(items) + "]").encode()
+
+
+def _time(label: str, iterations: int, fn):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<26}{iterations:>8}{elapsed:>10.2f}{iterations / elapsed:>12.0f}{len(body):>12}")
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="single reads per mode")
+    parser.add_argument("--page-iterations", type=int, default=200, help=f"{PAGE_SIZE}-row page reads per mode")
+    parser.add_argument("--views", type=int, default=20, help="items per JSONB section")
+    parser.add_argument("--columns", type=int, default=50, help="defaultColumns per column_state item")
+    args = parser.parse_args()
+
+    conn, curr = get_db_connection()
+    try:
+        service = PerspectiveService(conn, curr)
+        run_id = uuid.uuid4().hex[:8]
+        written = service.bulk_upsert_perspectives(
+            [_payload(f"read_{run_id}_{i}", args.views, args.columns) for i in range(PAGE_SIZE)]
+        )
+        first_id = min(r["id"] for r in written)
+
+        print(f"{'mode':<26}{'reads':>8}{'seconds':>10}{'reads/s':>12}{'bytes':>12}")
+        old = _time("rehydrate single", args.iterations, lambda: _rehydrate_one(service, first_id))
+        new = _time("postgres json single", args.iterations,
+                    lambda: service.load_perspective_document(perspective_id=first_id)[2])
+        print(f"single speedup: {old / new:.1f}x")
+        old = _time("rehydrate page", args.page_iterations, lambda: _rehydrate_page(service, first_id - 1))
+        new = _time("postgres json page", args.page_iterations,
+                    lambda: service.get_perspectives_page_json(first_id - 1, PAGE_SIZE)[0].encode())
+        print(f"page speedup: {old / new:.1f}x")
+    finally:
+        release_db_connection(conn, curr)
+
+
+if __name__ == "__main__":
+    main_cli()
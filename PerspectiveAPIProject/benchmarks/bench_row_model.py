@@ -0,0 +1,87 @@
+"""
+Server-side row model (services/row_model.py) against filtering and sorting the
+same rows in Python, as the grid did in the browser. For each dataset size it
+writes a synthetic CSV to a temporary directory and times:
+
+- python: list comprehension filter + sorted() over row dicts, per request;
+- cold: first request for a filter/sort pair on a mapped dataset (compile the
+  predicate, build the mask, lexsort, cache the order);
+- warm page: a later page of the same result (a slice of the cached order).
+
+Run from the PerspectiveAPIProject directory:
+
+    python -m benchmarks.bench_row_model --rows 10000 100000 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+FRUITS = ["apple", "Banana", "cherry", "Date", "elderberry", "fig", "grape", ""]
+FILTERS = {"fruit": {"type": "contains", "filter": "an"}, "price": {"type": "greaterThan", "filter": "25"}}
+SORT = {"side": {"type": "desc", "filter": ""}, "price": {"type": "asc", "filter": ""}}
+
+
+def _write_csv(path: str, rows: int):
+    rng = random.Random(rows)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "fruit", "price", "side"])
+        for i in range(rows):
+            writer.writerow([i, rng.choice(FRUITS), f"{rng.uniform(0, 100):.2f}", rng.choice("xy")])
+
+
+def _python_page(rows, offset: int, limit: int):
+    matched = [r for r in rows if "an" in r["fruit"].lower() and r["price"] > 25]
+    matched.sort(key=lambda r: r["price"])
+    matched.sort(key=lambda r: r["side"], reverse=True)
+    return matched[offset:offset + limit]
+
+
+def _time(label: str, rows: int, iterations: int, fn):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    per_call = (time.perf_counter() - start) / iterations * 1000
+    print(f"{rows:>9}  {label:<12}{iterations:>7}{per_call:>12.3f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="dataset sizes")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per measurement")
+    parser.add_argument("--limit", type=int, default=100, help="rows per page")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["ROW_MODEL_DATA_DIR"] = data_dir
+        os.environ["ROW_MODEL_CACHE_DIR"] = os.path.join(data_dir, ".columns")
+        # Imported here so the module reads the temporary directory from the environment.
+        from api.services.row_model import RowModel
+
+        print(f"{'rows':>9}  {'mode':<12}{'calls':>7}{'ms/call':>12}")
+        for rows in args.rows:
+            dataset_id = f"bench_{rows}"
+            path = os.path.join(data_dir, dataset_id + ".csv")
+            _write_csv(path, rows)
+            with open(path, newline="") as f:
+                parsed = [dict(r, price=float(r["price"])) for r in csv.DictReader(f)]
+
+            model = RowModel(max_datasets=4, max_predicates=1024, order_cache_bytes=256 * 1024 * 1024)
+            model.dataset(dataset_id)  # convert and map once
+
+            _time("python", rows, max(1, args.iterations // 4),
+                  lambda i: _python_page(parsed, 0, args.limit))
+            # A distinct filter value per call, so every call compiles, masks and sorts.
+            _time("cold", rows, args.iterations,
+                  lambda i: model.get_rows(dataset_id, dict(FILTERS, id={"type": "notEqual", "filter": str(-i - 1)}),
+                                           SORT, 0, args.limit))
+            model.get_rows(dataset_id, FILTERS, SORT, 0, args.limit)  # cache the order
+            _time("warm page", rows, args.iterations,
+                  lambda i: model.get_rows(dataset_id, FILTERS, SORT, i * args.limit, args.limit))
+
+
+if __name__ == "__main__":
+    main_cli()
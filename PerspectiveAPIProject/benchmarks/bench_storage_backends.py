@@ -0,0 +1,118 @@
+"""
+Throughput of the same operation mix against each storage backend: Postgres,
+embedded SQLite (WAL) and in-memory. The in-memory numbers are the upper bound
+that the other two can be compared against. The read-through cache is bypassed
+(documents are loaded with `load_perspective_document`), so every read reaches
+the backend.
+
+Run from the PerspectiveAPIProject directory. The Postgres backend needs a
+migrated database; leave it out with --backends sqlite memory:
+
+    python -m benchmarks.bench_storage_backends --perspectives 1000 --iterations 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from api.schemas.perspective import PerspectiveCreate
+from api.services.memory_perspective import InMemoryPerspectiveService
+from api.services.sqlite_perspective import SQLitePerspectiveService
+
+PAGE_SIZE = 100
+
+
+def _payload(username: str, views: int, columns: int) -> PerspectiveCreate:
+    return PerspectiveCreate.model_validate({
+        "username": username,
+        "layout_name": "Benchmark Layout",
+        "updated_by": "benchmark@example.com",
+        "column_state": [{
+            "name": f"layout_{v}",
+            "view": f"view_{v % 4}",
+            "defaultColumns": [f"col_{i}" for i in range(columns)],
+            "default": v == 0,
+        } for v in range(views)],
+        "sort_model": [],
+        "filter_model": [{
+            "name": f"layout_{v}",
+            "view": f"view_{v % 4}",
+            "filters": {f"col_{i}": {"type": "contains", "filter": f"value_{i}"} for i in range(3)},
+            "default": v == 0,
+        } for v in range(views)],
+    })
+
+
+@contextmanager
+def _service(backend: str):
+    if backend == "memory":
+        yield InMemoryPerspectiveService()
+    elif backend == "sqlite":
+        with tempfile.TemporaryDirectory() as directory:
+            yield SQLitePerspectiveService(os.path.join(directory, "bench.sqlite3"))
+    else:
+        from api.database.database import get_db_connection, release_db_connection
+        from api.services.perspective import PerspectiveService
+        conn, curr = get_db_connection()
+        try:
+            yield PerspectiveService(conn, curr)
+        finally:
+            release_db_connection(conn, curr)
+
+
+def _time(backend: str, label: str, iterations: int, fn):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{backend:<10}{label:<26}{iterations:>8}{elapsed:>10.2f}{iterations / elapsed:>12.0f}")
+
+
+def _run(backend: str, args):
+    with _service(backend) as service:
+        run_id = uuid.uuid4().hex[:8]
+        usernames = [f"backend_{run_id}_{i}" for i in range(args.perspectives)]
+        written = service.bulk_upsert_perspectives([_payload(u, args.views, args.columns) for u in usernames])
+        ids = [result["id"] for result in written]
+        first_id = min(ids) - 1
+        item = {"name": "layout_0", "view": "view_0", "defaultColumns": ["col_0"], "default": True}
+
+        _time(backend, "load document", args.iterations,
+              lambda: service.load_perspective_document(username=random.choice(usernames)))
+        _time(backend, "get DTO by username", args.iterations,
+              lambda: service.get_perspective_by_username(random.choice(usernames)).to_dict())
+        _time(backend, f"page of {PAGE_SIZE} (JSON)", max(1, args.iterations // 20),
+              lambda: service.get_perspectives_page_json(first_id, PAGE_SIZE))
+        _time(backend, "search filter field", max(1, args.iterations // 20),
+              lambda: service.search_perspectives(filter_field="col_1", after_id=first_id, limit=PAGE_SIZE))
+        _time(backend, "upsert section item", args.iterations,
+              lambda: service.upsert_section_items("column_state", random.choice(usernames), [item]))
+        _time(backend, "replace section", args.iterations,
+              lambda: service.replace_section_items("column_state", random.choice(usernames), [item]))
+
+        if backend == "postgres":
+            for perspective_id in ids:
+                service.delete_perspective(perspective_id)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["postgres", "sqlite", "memory"],
+                        choices=["postgres", "sqlite", "memory"])
+    parser.add_argument("--perspectives", type=int, default=1000, help="perspectives loaded into each backend")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per single-row operation")
+    parser.add_argument("--views", type=int, default=8, help="items per section")
+    parser.add_argument("--columns", type=int, default=30, help="defaultColumns per column_state item")
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'operation':<26}{'calls':>8}{'seconds':>10}{'calls/s':>12}")
+    for backend in args.backends:
+        _run(backend, args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,155 @@
+"""
+Microbenchmark cases for the CPU hot paths of reading and saving perspectives.
+
+Each case is a setup function that takes a layout size and returns the
+zero-argument callable that is timed. Setup work (building rows, validating
+inputs) is done once, outside the timed call.
+"""
+from typing import Any, Callable, Dict
+
+from flask import Flask
+
+from api.json_provider import FastJSONProvider
+from api.models.perspective import Perspective as PerspectiveModel
+from api.schemas.perspective import ColumnState, Perspective, ViewSetting
+from api.services.merge import delete_section_items, item_key, merge_section_items
+from api.services.storage import encode_document
+
+from . import layouts
+
+Case = Callable[[int], Callable[[], Any]]
+
+CASES: Dict[str, Case] = {}
+
+_json = FastJSONProvider(Flask(__name__))
+
+
+def case(name: str):
+    """Registers a case under `name`."""
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _decoded_dto(size: int) -> PerspectiveModel:
+    dto = PerspectiveModel.from_dict(layouts.row(size))
+    dto.column_state, dto.sort_model, dto.filter_model  # decode every section
+    return dto
+
+
+@case("dto.from_dict")
+def dto_from_dict(size):
+    """Row -> DTO; sections stay undecoded."""
+    data = layouts.row(size)
+    return lambda: PerspectiveModel.from_dict(data)
+
+
+@case("dto.decode_sections")
+def dto_decode_sections(size):
+    """Row -> DTO with every section decoded into ColumnState/ViewSetting objects."""
+    data = layouts.row(size)
+
+    def run():
+        dto = PerspectiveModel.from_dict(data)
+        return dto.column_state, dto.sort_model, dto.filter_model
+    return run
+
+
+@case("dto.to_dict")
+def dto_to_dict(size):
+    """Decoded DTO -> dicts (ViewSetting.to_dict replaced the old _convert_view_settings_to_dicts)."""
+    dto = _decoded_dto(size)
+    return dto.to_dict
+
+
+@case("schema.validate_from_attributes")
+def schema_validate_from_attributes(size):
+    """Perspective.model_validate(dto, from_attributes=True) on a decoded DTO."""
+    dto = _decoded_dto(size)
+    return lambda: Perspective.model_validate(dto, from_attributes=True)
+
+
+@case("schema.validate_dict")
+def schema_validate_dict(size):
+    """Perspective.model_validate(dto.to_dict()), as the create/update routes do."""
+    dto = PerspectiveModel.from_dict(layouts.row(size))
+    return lambda: Perspective.model_validate(dto.to_dict())
+
+
+@case("schema.model_dump_json_mode")
+def schema_model_dump_json_mode(size):
+    """Perspective.model_dump(mode='json')."""
+    model = Perspective.model_validate(layouts.row(size))
+    return lambda: model.model_dump(mode='json')
+
+
+@case("json.provider_dumps")
+def json_provider_dumps(size):
+    """Encoding a validated Perspective with the app's JSON provider, as jsonify does."""
+    model = Perspective.model_validate(layouts.row(size))
+    return lambda: _json.dumps_bytes(model)
+
+
+@case("json.encode_document")
+def json_encode_document(size):
+    """Row -> response document, as the embedded storage backends encode it."""
+    data = layouts.row(size)
+    return lambda: encode_document(data)
+
+
+@case("save.column_state_request")
+def save_column_state_request(size):
+    """
+    The Python side of save_single_column_state_route: validate each item and
+    de-duplicate its defaultColumns before the merge runs in the database.
+    """
+    body = layouts.save_items("column_state", size)
+
+    def run():
+        items = []
+        for validated in [ColumnState.model_validate(item) for item in body]:
+            item = validated.model_dump()
+            item['defaultColumns'] = list(dict.fromkeys(item['defaultColumns']))
+            items.append(item)
+        return items
+    return run
+
+
+@case("save.filter_model_request")
+def save_filter_model_request(size):
+    """The Python side of save_single_filter_model_route: validate and dump each item."""
+    body = layouts.save_items("filter_model", size)
+    return lambda: [ViewSetting.model_validate(item).model_dump() for item in body]
+
+
+@case("merge.column_state")
+def merge_column_state(size):
+    """Upsert of column_state items by name (the embedded backends' merge)."""
+    existing = layouts.row(size)["column_state"]
+    incoming = layouts.save_items("column_state", size)
+    return lambda: merge_section_items("column_state", existing, incoming)
+
+
+@case("merge.filter_model")
+def merge_filter_model(size):
+    """Upsert of filter_model items by name + view (the embedded backends' merge)."""
+    existing = layouts.row(size)["filter_model"]
+    incoming = layouts.save_items("filter_model", size)
+    return lambda: merge_section_items("filter_model", existing, incoming)
+
+
+@case("merge.sort_model_items")
+def merge_sort_model_items(size):
+    """Upsert of a batch of `size` sort_model items into a section of `size` items (half of them new)."""
+    existing = layouts.view_setting_items(2, views=size, kind="sort")
+    incoming = layouts.save_items("sort_model", 2, views=size)
+    return lambda: merge_section_items("sort_model", existing, incoming)
+
+
+@case("merge.delete_items")
+def merge_delete_items(size):
+    """Delete of half the items of a filter_model section of `size` items, by name + view."""
+    existing = layouts.view_setting_items(2, views=size)
+    keys = [item_key("filter_model", item) for item in existing[::2]]
+    return lambda: delete_section_items("filter_model", existing, keys)
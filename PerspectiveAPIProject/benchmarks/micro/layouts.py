@@ -0,0 +1,63 @@
+"""
+Synthetic perspective layouts for the microbenchmarks.
+
+`size` is both the number of defaultColumns per column_state item and the
+number of filters per sort_model/filter_model item, so one size scales every
+section together. Layouts are deterministic, so runs are comparable.
+"""
+from datetime import datetime, timezone
+
+# Layout sizes every case runs at.
+SIZES = (10, 100, 1000)
+# Items per section (saved views of a grid).
+VIEWS = 8
+
+_UPDATED_TIME = datetime(2024, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+
+def column_state_items(size: int, views: int = VIEWS, prefix: str = "layout") -> list:
+    return [{
+        "name": f"{prefix}_{v}",
+        "view": "grid",
+        "defaultColumns": [f"column_{c}" for c in range(size)],
+        "default": v == 0,
+    } for v in range(views)]
+
+
+def view_setting_items(size: int, views: int = VIEWS, prefix: str = "layout", kind: str = "filter") -> list:
+    return [{
+        "name": f"{prefix}_{v}",
+        "view": "grid",
+        "filters": {
+            f"column_{c}": {"type": "asc", "filter": ""} if kind == "sort" else
+            {"type": "contains", "filter": f"value_{c}"}
+            for c in range(size)
+        },
+        "default": v == 0,
+    } for v in range(views)]
+
+
+def row(size: int, views: int = VIEWS) -> dict:
+    """A perspective row in the shape psycopg2 returns it (JSONB already decoded)."""
+    return {
+        "id": 1,
+        "username": "benchmark_user",
+        "layout_name": "Trading Blotter",
+        "updated_by": "benchmark@example.com",
+        "column_state": column_state_items(size, views),
+        "sort_model": view_setting_items(size, views, kind="sort"),
+        "filter_model": view_setting_items(size, views),
+        "updated_time": _UPDATED_TIME,
+        "version": 1,
+    }
+
+
+def save_items(section: str, size: int, views: int = VIEWS) -> list:
+    """
+    A save request body for one section: half of the items update existing ones
+    (same name/view as `row`), half are new.
+    """
+    updated = views // 2
+    if section == "column_state":
+        return column_state_items(size, updated) + column_state_items(size, views - updated, prefix="new")
+    return view_setting_items(size, updated) + view_setting_items(size, views - updated, prefix="new")
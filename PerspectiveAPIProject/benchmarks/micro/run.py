@@ -0,0 +1,115 @@
+"""
+Runs the serialization and merge microbenchmarks (benchmarks/micro/cases.py) at
+every layout size and compares them with the stored baseline.
+
+No database is needed. Run from the PerspectiveAPIProject directory:
+
+    python -m benchmarks.micro.run                       # compare with the baseline
+    python -m benchmarks.micro.run --filter merge --sizes 100
+    python -m benchmarks.micro.run --save-baseline       # record a new baseline
+
+Each result is the best per-call time over --repeat rounds. Every round runs
+enough calls to take at least about 0.2 s (timeit's autorange). A case is
+flagged as a regression when it is more than --threshold slower than the
+baseline. The exit status is 1 if any case regressed. Baselines depend on the
+machine: record them on the machine that runs the comparisons. On shared or
+single-core hosts, raise --repeat (or --threshold) to keep noise from being
+reported as a regression.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+
+from .cases import CASES
+from .layouts import SIZES
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def _key(name: str, size: int) -> str:
+    return f"{name}[{size}]"
+
+
+def _measure(fn, repeat: int) -> float:
+    """Best seconds per call over `repeat` rounds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def _load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="layout sizes to run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write this run's results to the baseline file (merged with existing entries)")
+    args = parser.parse_args()
+
+    baseline = _load_baseline(args.baseline)
+    baseline_results = baseline.get("results", {})
+    if baseline and baseline.get("environment", {}).get("python") != platform.python_version():
+        print(f"note: baseline was recorded on Python {baseline['environment'].get('python')}, "
+              f"running on {platform.python_version()}", file=sys.stderr)
+
+    results = {}
+    regressions = []
+    print(f"{'case':<40}{'us/call':>12}{'baseline':>12}{'change':>9}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        for size in args.sizes:
+            key = _key(name, size)
+            seconds = results[key] = _measure(setup(size), args.repeat)
+            previous = baseline_results.get(key)
+            if previous is None:
+                print(f"{key:<40}{seconds * 1e6:>12.2f}{'-':>12}{'':>9}")
+                continue
+            change = seconds / previous - 1
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions.append(key)
+            elif change < -args.threshold:
+                flag = "  faster"
+            print(f"{key:<40}{seconds * 1e6:>12.2f}{previous * 1e6:>12.2f}{change:>+9.1%}{flag}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": _environment(), "results": {**baseline_results, **results}}, f,
+                      indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
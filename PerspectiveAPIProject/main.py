@@ -3,23 +3,39 @@ from flask import Flask, g
 from api.v1.endpoints.perspective import perspective_bp
 from api.v1.endpoints.column_state import column_state_bp
 from api.v1.endpoints.filter_model import filter_model_bp
-from api.database.database import close_db_connection
+from api.v1.endpoints.sort_model import sort_model_bp
+from api.v1.endpoints.row_model import row_model_bp
+from api.database.database import release_db_connection
+from api.database.profiling import check_query_budget
+from api.json_provider import FastJSONProvider
+from api.metrics import init_metrics
+from api.compression import init_compression
 
 # Initialize the Flask application
 app = Flask(__name__)
+# orjson-backed JSON encoding/decoding (stdlib fallback) for jsonify and request bodies
+app.json = FastJSONProvider(app)
 
 # Register the blueprint for the API routes
 app.register_blueprint(perspective_bp, url_prefix='/api/v1/perspectives')
 app.register_blueprint(column_state_bp, url_prefix='/api/v1/perspectives/column_state')
 app.register_blueprint(filter_model_bp, url_prefix='/api/v1/perspectives/filter_model')
+app.register_blueprint(sort_model_bp, url_prefix='/api/v1/perspectives/sort_model')
+app.register_blueprint(row_model_bp, url_prefix='/api/v1/perspectives/row_model')
 
+# Per-route latency histograms, exposed at /metrics in the Prometheus text format
+init_metrics(app)
+# gzip/zstd/br response compression above a size threshold (after metrics, so it is timed)
+init_compression(app)
 
-# Add a teardown function to close the database connection and cursor
+
+# Add a teardown function to return the database connection to the pool
 @app.teardown_appcontext
 def teardown_db(exception=None):
     conn = g.pop('db_conn', None)
     curr = g.pop('db_curr', None)
-    close_db_connection(conn, curr)
+    check_query_budget(curr)
+    release_db_connection(conn, curr)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
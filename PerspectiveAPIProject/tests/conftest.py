@@ -0,0 +1,102 @@
+"""
+Fixtures for the API tests, which drive the Flask app through app.test_client().
+
+Every test runs once per storage backend: memory and sqlite always, and
+postgres and postgres_items when PERSPECTIVE_TEST_DSN is set to a libpq
+connection string (e.g. "host=localhost dbname=perspectives user=postgres").
+That database must have the migrations applied (python -m api.database.migrations
+upgrade); the tests only touch the users they create and delete them afterwards.
+
+Run from the PerspectiveAPIProject directory:
+
+    python -m pytest tests
+"""
+import os
+import uuid
+
+import pytest
+
+PERSPECTIVE_TEST_DSN = os.getenv("PERSPECTIVE_TEST_DSN")
+if PERSPECTIVE_TEST_DSN:
+    from psycopg2.extensions import parse_dsn
+
+    # api.database.database reads its settings from the environment at import time.
+    _dsn = parse_dsn(PERSPECTIVE_TEST_DSN)
+    for _key, _variable in (('host', 'DB_HOST'), ('port', 'DB_PORT'), ('dbname', 'DB_NAME'),
+                            ('user', 'DB_USER'), ('password', 'DB_PASSWORD')):
+        if _key in _dsn:
+            os.environ[_variable] = _dsn[_key]
+# Buffered saves would answer 202 and settle later; the tests check the synchronous path.
+os.environ["WRITE_BEHIND_ENABLED"] = "0"
+
+from main import app  # noqa: E402  (the environment above must be set first)
+from api.compression import compressed_body_cache  # noqa: E402
+from api.services import storage  # noqa: E402
+from api.services.cache import perspective_cache  # noqa: E402
+from api.services.memory_perspective import InMemoryPerspectiveService  # noqa: E402
+from api.services.sqlite_perspective import SQLitePerspectiveService  # noqa: E402
+
+API = '/api/v1/perspectives'
+BACKENDS = ['memory', 'sqlite'] + (['postgres', 'postgres_items'] if PERSPECTIVE_TEST_DSN else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch, tmp_path):
+    """Selects the storage backend for the test; the embedded ones start empty."""
+    monkeypatch.setattr(storage, 'PERSPECTIVE_STORAGE', request.param)
+    if request.param == 'memory':
+        monkeypatch.setattr(storage, '_embedded_service', InMemoryPerspectiveService())
+    elif request.param == 'sqlite':
+        service = SQLitePerspectiveService(str(tmp_path / 'perspectives.sqlite3'))
+        monkeypatch.setattr(storage, '_embedded_service', service)
+    # Cached bodies are keyed by perspective id, which the backends reuse.
+    perspective_cache.clear()
+    compressed_body_cache.clear()
+    yield request.param
+    perspective_cache.clear()
+    compressed_body_cache.clear()
+
+
+@pytest.fixture
+def client(backend):
+    return app.test_client()
+
+
+@pytest.fixture
+def new_username(client):
+    """Returns a factory of unique usernames; their perspectives are deleted after the test."""
+    created = []
+
+    def make(prefix: str = 'test') -> str:
+        username = f"{prefix}_{uuid.uuid4().hex[:12]}"
+        created.append(username)
+        return username
+
+    yield make
+    for username in created:
+        response = client.get(f'{API}/user/{username}')
+        if response.status_code == 200:
+            client.delete(f"{API}/{response.get_json()['id']}")
+
+
+def column_state_item(name: str, view: str = 'grid', columns=('x',), default: bool = False) -> dict:
+    return {"name": name, "view": view, "defaultColumns": list(columns), "default": default}
+
+
+def filter_item(name: str, view: str = 'grid', fields=('price',), default: bool = False) -> dict:
+    return {"name": name, "view": view, "default": default,
+            "filters": {field: {"type": "contains", "filter": "1"} for field in fields}}
+
+
+@pytest.fixture
+def create_perspective(client, new_username):
+    """Creates a perspective through POST / and returns it."""
+
+    def create(username: str = None, **fields):
+        body = {"username": username or new_username(), "layout_name": "layout", "updated_by": "tester",
+                "column_state": [], "sort_model": [], "filter_model": [], **fields}
+        response = client.post(f'{API}/', json=body)
+        assert response.status_code == 201, response.get_data(as_text=True)
+        return response.get_json()
+
+    return create
@@ -0,0 +1,115 @@
+"""Read-through perspective cache: per-perspective invalidation and stale-while-revalidate refreshes."""
+import pytest
+
+from api.services import storage
+from api.services.cache import PerspectiveCache
+from conftest import API
+
+
+def _cache(**kwargs) -> PerspectiveCache:
+    settings = dict(ttl=30, stale_ttl=0, max_entries=100, max_bytes=1024 * 1024)
+    settings.update(kwargs)
+    return PerspectiveCache(**settings)
+
+
+def _put(cache, perspective_id, username, token, etag='e'):
+    cache.put(perspective_id, username, b'{}', etag, token)
+    entry, _ = cache.get(perspective_id=perspective_id)
+    return entry is not None
+
+
+def test_a_write_only_discards_loads_of_the_same_perspective():
+    cache = _cache()
+    token = cache.load_token()
+    cache.invalidate(perspective_id=2, username='bob')
+    assert _put(cache, 1, 'alice', token)
+    assert not _put(cache, 2, 'bob', token)
+
+    # A load by username is discarded by an invalidation of the id it returned, and vice versa.
+    token = cache.load_token()
+    cache.invalidate(perspective_id=3)
+    assert not _put(cache, 3, 'carol', token)
+    token = cache.load_token()
+    cache.invalidate(username='dave')
+    assert not _put(cache, 4, 'dave', token)
+
+    # Loads that start after the write are kept.
+    assert _put(cache, 2, 'bob', cache.load_token())
+
+
+def test_invalidation_records_are_bounded():
+    cache = _cache(max_entries=2)
+    token = cache.load_token()
+    for perspective_id in range(10, 15):
+        cache.invalidate(perspective_id=perspective_id)
+    # Records for 10..12 were dropped: loads older than them are discarded conservatively.
+    assert len(cache._invalidated) == 2
+    assert not _put(cache, 1, 'alice', token)
+    assert _put(cache, 1, 'alice', cache.load_token())
+
+
+def test_clear_discards_loads_in_flight():
+    cache = _cache()
+    token = cache.load_token()
+    cache.clear()
+    assert not _put(cache, 1, 'alice', token)
+    assert _put(cache, 1, 'alice', cache.load_token())
+
+
+def test_a_discarded_refresh_releases_the_stale_entry(monkeypatch):
+    cache = _cache(ttl=0, stale_ttl=60, max_entries=2)
+    loads = []
+
+    class Service:
+        def load_perspective_document(self, perspective_id=None, username=None):
+            loads.append(perspective_id)
+            if len(loads) == 1:
+                # Enough unrelated writes during the load to drop their records: the put is discarded.
+                for other in range(10, 15):
+                    cache.invalidate(perspective_id=other)
+                return 1, 'alice', b'{}', 'new'
+            raise RuntimeError("database unavailable")
+
+    class Session:
+        def __enter__(self):
+            return Service()
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(storage, 'perspective_cache', cache)
+    monkeypatch.setattr(storage, 'perspective_service_session', Session)
+    cache.put(1, 'alice', b'{}', 'old', cache.load_token())
+    entry, refresh_id = cache.get(perspective_id=1)
+    assert (entry.etag, refresh_id) == ('old', 1)
+    # While it is refreshing, other readers get the stale entry without starting another refresh.
+    assert cache.get(perspective_id=1)[1] is None
+
+    for _ in range(2):  # the discarded put, then a failed load
+        storage._refresh_cached_perspective(1)
+        entry, refresh_id = cache.get(perspective_id=1)
+        assert (entry.etag, refresh_id) == ('old', 1)
+    assert loads == [1, 1]
+
+
+@pytest.fixture
+def cached_client(client, backend, monkeypatch):
+    if backend == 'memory':
+        pytest.skip("the in-memory backend serves its own rows without the cache")
+    monkeypatch.setattr(storage, 'PERSPECTIVE_CACHE_ENABLED', True)
+    return client
+
+
+def test_writes_invalidate_cached_bodies_and_etags(cached_client, create_perspective):
+    client = cached_client
+    created = create_perspective()
+    by_id, by_username = f"{API}/{created['id']}", f"{API}/user/{created['username']}"
+    etag = client.get(by_username).headers['ETag']
+    assert client.get(by_id, headers={"If-None-Match": etag}).status_code == 304
+    assert storage.perspective_cache.stats()['entries'] == 1
+
+    client.put(by_id, json={"layout_name": "renamed"})
+    for url in (by_id, by_username):
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.get_json()['layout_name'] == 'renamed'
@@ -0,0 +1,39 @@
+"""Response compression: each Content-Encoding of a perspective version carries its own strong ETag."""
+import gzip
+
+from conftest import API, column_state_item
+
+
+def _large_perspective(create_perspective):
+    """A perspective whose body is above COMPRESSION_MIN_SIZE."""
+    return create_perspective(column_state=[column_state_item(f'column_{i}', columns=('x', 'y')) for i in range(40)])
+
+
+def test_compressed_bodies_get_an_encoding_specific_etag(client, create_perspective):
+    created = _large_perspective(create_perspective)
+    url = f"{API}/{created['id']}"
+
+    plain = client.get(url)
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+
+
+def test_conditional_requests_accept_the_encoded_etag(client, create_perspective):
+    created = _large_perspective(create_perspective)
+    url, by_username = f"{API}/{created['id']}", f"{API}/user/{created['username']}"
+    gzip_etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers['ETag']
+
+    # The 304 repeats the tag of the copy the client holds.
+    for target in (url, by_username):
+        not_modified = client.get(target, headers={"If-None-Match": gzip_etag, "Accept-Encoding": "gzip"})
+        assert not_modified.status_code == 304
+        assert not_modified.headers['ETag'] == gzip_etag
+
+    updated = client.put(url, json={"layout_name": "renamed"}, headers={"If-Match": gzip_etag})
+    assert updated.status_code == 200
+    assert client.put(url, json={"layout_name": "again"}, headers={"If-Match": gzip_etag}).status_code == 412
+    assert client.get(url, headers={"If-None-Match": gzip_etag}).status_code == 200
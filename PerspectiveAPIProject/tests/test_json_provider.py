@@ -0,0 +1,64 @@
+"""FastJSONProvider: orjson and the stdlib fallback encode the same types to the same JSON."""
+import decimal
+import json
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+
+from api import json_provider
+from api.schemas.perspective import ColumnState
+from main import app
+
+UTC_TIME = datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc)
+VALUES = {
+    "utc": UTC_TIME,
+    "naive": datetime(2024, 5, 6, 7, 8, 9),
+    "day": date(2024, 5, 6),
+    "id": uuid.UUID(int=1),
+    "amount": decimal.Decimal("1.50"),
+    "tags": {"only"},
+    "model": ColumnState(name="a", view="grid", defaultColumns=["x"], default=True),
+}
+EXPECTED = {
+    "utc": "2024-05-06T07:08:09.123456Z",
+    "naive": "2024-05-06T07:08:09",
+    "day": "2024-05-06",
+    "id": "00000000-0000-0000-0000-000000000001",
+    "amount": "1.50",
+    "tags": ["only"],
+    "model": {"name": "a", "view": "grid", "defaultColumns": ["x"], "default": True},
+}
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def provider(request, monkeypatch):
+    if request.param == 'orjson':
+        if json_provider.orjson is None:
+            pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(json_provider, 'orjson', None)
+        monkeypatch.setattr(json_provider, '_Fragment', None)
+    return app.json
+
+
+def test_both_encoders_produce_the_same_documents(provider):
+    encoded = provider.dumps_bytes(VALUES)
+    assert json.loads(encoded) == EXPECTED
+    # Keys keep their insertion order, and there is no whitespace between tokens.
+    assert list(json.loads(encoded)) == list(VALUES)
+    assert b", " not in encoded and b": " not in encoded
+
+
+def test_unknown_types_are_rejected(provider):
+    with pytest.raises(TypeError):
+        provider.dumps_bytes({"value": object()})
+
+
+def test_jsonify_and_request_bodies_use_the_provider(provider):
+    with app.test_request_context('/', method='POST', data=b'{"when": "x", "n": [1, 2]}',
+                                  content_type='application/json'):
+        response = app.json.response({"when": UTC_TIME})
+        assert response.mimetype == 'application/json'
+        assert response.get_data() == b'{"when":"2024-05-06T07:08:09.123456Z"}'
+        assert json_provider.get_request_json() == {"when": "x", "n": [1, 2]}
@@ -0,0 +1,63 @@
+"""Keyed section merges: SectionIndex (memory/sqlite backends) and `_merge_section_sql` (Postgres) agree."""
+import json
+
+import pytest
+
+from api.services.merge import delete_section_items, merge_section_items
+from api.services.perspective import _merge_section_sql
+from conftest import PERSPECTIVE_TEST_DSN
+
+
+def _items(*specs):
+    """Items from (name, view, value) triples."""
+    return [{"name": name, "view": view, "v": value} for name, view, value in specs]
+
+
+# (section, stored items, incoming batch)
+CASES = [
+    ('column_state', _items(('a', 'grid', 1), ('b', 'grid', 2)), _items(('b', 'grid', 9), ('c', 'grid', 3))),
+    # The stored section repeats a key: every occurrence is replaced.
+    ('column_state', _items(('a', 'grid', 1), ('b', 'grid', 2), ('a', 'chart', 3)), _items(('a', 'grid', 9))),
+    ('filter_model', _items(('a', 'grid', 1), ('a', 'grid', 2), ('a', 'chart', 3)), _items(('a', 'grid', 9))),
+    # The batch repeats a key: the last occurrence wins, appended in request order.
+    ('sort_model', _items(('a', 'grid', 1)),
+     _items(('c', 'grid', 1), ('b', 'grid', 1), ('c', 'grid', 2), ('a', 'chart', 1))),
+    # Items without some key field match each other, not items that have it.
+    ('sort_model', [{"name": "a", "v": 1}, {"name": "a", "view": "grid", "v": 2}], [{"name": "a", "v": 9}]),
+    ('column_state', [], _items(('a', 'grid', 1))),
+    ('column_state', _items(('a', 'grid', 1)), []),
+]
+
+
+def test_upsert_replaces_every_stored_item_with_the_key():
+    merged = merge_section_items('column_state', [{"name": "a", "v": 1}, {"name": "b"}, {"name": "a", "v": 2}],
+                                 [{"name": "a", "v": 9}, {"name": "c"}])
+    assert merged == [{"name": "a", "v": 9}, {"name": "b"}, {"name": "a", "v": 9}, {"name": "c"}]
+
+    # A later upsert of the same key, and a delete, still see all of them.
+    merged = merge_section_items('column_state', merged, [{"name": "a", "v": 10}])
+    assert [item.get('v') for item in merged] == [10, None, 10, None]
+    remaining, missing = delete_section_items('column_state', merged, [('a',)])
+    assert (remaining, missing) == ([{"name": "b"}, {"name": "c"}], [])
+
+
+@pytest.fixture(scope='module')
+def postgres():
+    if not PERSPECTIVE_TEST_DSN:
+        pytest.skip("PERSPECTIVE_TEST_DSN is not set")
+    import psycopg2
+    from api.database import database
+    conn = psycopg2.connect(dbname=database.DB_NAME, user=database.DB_USER, password=database.DB_PASSWORD,
+                            host=database.DB_HOST, port=database.DB_PORT)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('section, stored, incoming', CASES)
+def test_sql_merge_matches_section_index(postgres, section, stored, incoming):
+    with postgres.cursor() as curr:
+        curr.execute(f"SELECT {_merge_section_sql(section)} FROM (SELECT %(stored)s::jsonb AS {section}) AS p",
+                     {'stored': json.dumps(stored), 'items': json.dumps(incoming)})
+        merged_in_sql = curr.fetchone()[0]
+    postgres.rollback()
+    assert merged_in_sql == merge_section_items(section, stored, incoming)
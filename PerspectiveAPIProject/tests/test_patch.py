@@ -0,0 +1,58 @@
+"""PATCH /user/<username>: JSON Patch with section items addressed by name (and view)."""
+from conftest import API, column_state_item, filter_item
+
+
+def _patch(client, username, operations, **headers):
+    return client.patch(f'{API}/user/{username}', json=operations, headers=headers)
+
+
+def test_patch_edits_items_by_key(client, create_perspective):
+    created = create_perspective(column_state=[column_state_item('a', columns=('x', 'y'))],
+                                 filter_model=[filter_item('f')])
+    username = created['username']
+
+    response = _patch(client, username, [
+        {"op": "remove", "path": "/column_state/a/defaultColumns/0"},
+        {"op": "add", "path": "/column_state/a/defaultColumns/-", "value": "z"},
+        {"op": "replace", "path": "/filter_model/f/grid/filters/price/filter", "value": "100"},
+        {"op": "add", "path": "/sort_model/s/chart", "value": {"filters": {}, "default": False}},
+        {"op": "test", "path": "/column_state/a/default", "value": False},
+        {"op": "replace", "path": "/layout_name", "value": "patched"},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert set(body) == {'id', 'username', 'updated_time', 'version'}
+    assert body['version'] == created['version'] + 1
+
+    stored = client.get(f'{API}/user/{username}')
+    assert stored.headers['ETag'] == response.headers['ETag']
+    perspective = stored.get_json()
+    assert perspective['layout_name'] == 'patched'
+    assert perspective['column_state'][0]['defaultColumns'] == ['y', 'z']
+    assert perspective['filter_model'][0]['filters']['price']['filter'] == '100'
+    assert perspective['sort_model'] == [{"filters": {}, "default": False, "name": "s", "view": "chart"}]
+
+
+def test_patch_honours_if_match(client, create_perspective):
+    username = create_perspective()['username']
+    etag = client.get(f'{API}/user/{username}').headers['ETag']
+    operation = [{"op": "replace", "path": "/updated_by", "value": "someone"}]
+
+    assert _patch(client, username, operation, **{"If-Match": etag}).status_code == 200
+    assert _patch(client, username, operation, **{"If-Match": etag}).status_code == 412
+
+
+def test_patch_error_statuses(client, create_perspective, new_username):
+    username = create_perspective(column_state=[column_state_item('a')])['username']
+    assert _patch(client, username, []).status_code == 400
+    assert _patch(client, username, [{"op": "replace", "path": "/username", "value": "x"}]).status_code == 400
+    assert _patch(client, username, [{"op": "add", "path": "/column_state/a"}]).status_code == 400
+    assert _patch(client, new_username(), [{"op": "replace", "path": "/layout_name", "value": "x"}]).status_code == 404
+    assert _patch(client, username, [{"op": "remove", "path": "/column_state/missing"}]).status_code == 409
+    assert _patch(client, username, [{"op": "test", "path": "/column_state/a/default", "value": True}]).status_code == 409
+    invalid = _patch(client, username, [{"op": "replace", "path": "/column_state/a/defaultColumns", "value": 3}])
+    assert invalid.status_code == 422
+    assert invalid.get_json()['detail']
+
+    # Nothing above was written.
+    assert client.get(f'{API}/user/{username}').get_json()['version'] == 1
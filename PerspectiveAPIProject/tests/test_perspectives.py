@@ -0,0 +1,152 @@
+"""CRUD, conditional requests, listing (keyset pages, NDJSON), bulk upsert and search."""
+import json
+
+from conftest import API, column_state_item, filter_item
+
+
+def test_create_get_update_delete(client, create_perspective):
+    created = create_perspective(column_state=[column_state_item('a')])
+    perspective_id, username = created['id'], created['username']
+    assert created['version'] == 1
+    assert created['column_state'][0]['name'] == 'a'
+
+    by_id = client.get(f'{API}/{perspective_id}')
+    by_username = client.get(f'{API}/user/{username}')
+    assert by_id.status_code == by_username.status_code == 200
+    assert by_id.get_json() == by_username.get_json()
+    assert by_id.headers['ETag'] == by_username.headers['ETag']
+
+    updated = client.put(f'{API}/{perspective_id}', json={"layout_name": "renamed"})
+    assert updated.status_code == 200
+    assert updated.get_json()['layout_name'] == 'renamed'
+    assert updated.get_json()['version'] == 2
+    assert updated.headers['ETag'] != by_id.headers['ETag']
+
+    assert client.delete(f'{API}/{perspective_id}').status_code == 200
+    assert client.get(f'{API}/{perspective_id}').status_code == 404
+    assert client.get(f'{API}/user/{username}').status_code == 404
+    assert client.delete(f'{API}/{perspective_id}').status_code == 404
+
+
+def test_create_rejects_invalid_body(client, new_username):
+    response = client.post(f'{API}/', json={"username": new_username(), "column_state": "not a list"})
+    assert response.status_code == 400
+
+
+def test_if_none_match_answers_304_until_the_perspective_changes(client, create_perspective):
+    created = create_perspective()
+    url = f"{API}/user/{created['username']}"
+    etag = client.get(url).headers['ETag']
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"{API}/{created['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"{API}/{created['id']}", json={"updated_by": "someone else"})
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_if_match_rejects_stale_writes_with_412(client, create_perspective):
+    created = create_perspective()
+    url = f"{API}/{created['id']}"
+    etag = client.get(url).headers['ETag']
+
+    first = client.put(url, json={"layout_name": "first"}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    stale = client.put(url, json={"layout_name": "second"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    # A body that changes nothing is still checked against If-Match.
+    assert client.put(url, json={}, headers={"If-Match": etag}).status_code == 412
+
+    fresh = client.put(url, json={"layout_name": "second"}, headers={"If-Match": first.headers['ETag']})
+    assert fresh.status_code == 200
+    assert client.get(url).get_json()['layout_name'] == 'second'
+
+
+def test_keyset_pages_cover_every_perspective_once(client, create_perspective):
+    ids = [create_perspective()['id'] for _ in range(5)]
+    after_id, seen = min(ids) - 1, []
+    while True:
+        response = client.get(f'{API}/?after_id={after_id}&limit=2')
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page['items']) <= 2
+        seen += [item['id'] for item in page['items']]
+        if page['next_after_id'] is None:
+            break
+        after_id = page['next_after_id']
+
+    assert seen == sorted(seen)
+    assert [i for i in seen if i in ids] == ids
+
+
+def test_page_limits_are_validated(client):
+    assert client.get(f'{API}/?after_id=-1').status_code == 400
+    assert client.get(f'{API}/?limit=0').status_code == 400
+    assert client.get(f'{API}/?limit=100000').status_code == 400
+
+
+def test_ndjson_streams_one_perspective_per_line(client, create_perspective):
+    ids = [create_perspective()['id'] for _ in range(3)]
+    for response in (client.get(f'{API}/?stream=ndjson'),
+                     client.get(f'{API}/', headers={"Accept": "application/x-ndjson"})):
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        streamed = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        streamed_ids = [p['id'] for p in streamed]
+        assert streamed_ids == sorted(streamed_ids)
+        assert set(ids) <= set(streamed_ids)
+
+
+def test_bulk_upsert_reports_a_status_per_item(client, create_perspective, new_username):
+    existing = create_perspective()
+    fresh = new_username()
+    response = client.post(f'{API}/bulk', json=[
+        {"username": existing['username'], "layout_name": "bulk", "updated_by": "bulk"},
+        {"username": fresh, "layout_name": "bulk", "updated_by": "bulk"},
+        {"username": fresh, "layout_name": "bulk again", "updated_by": "bulk"},
+        {"username": new_username(), "column_state": "not a list"},
+    ])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['updated', 'duplicate', 'created', 'invalid']
+    assert body['summary'] == {'updated': 1, 'duplicate': 1, 'created': 1, 'invalid': 1}
+
+    assert client.get(f"{API}/user/{existing['username']}").get_json()['layout_name'] == 'bulk'
+    assert client.get(f'{API}/user/{fresh}').get_json()['layout_name'] == 'bulk again'
+
+    ok = client.post(f'{API}/bulk', json={"perspectives": [
+        {"username": fresh, "layout_name": "all written", "updated_by": "bulk"}]})
+    assert ok.status_code == 200
+    assert client.post(f'{API}/bulk', json={"perspectives": "nope"}).status_code == 400
+
+
+def test_search_by_column_view_and_filter_field(client, create_perspective):
+    grid = create_perspective(column_state=[column_state_item('a', columns=('price', 'qty'))],
+                              filter_model=[filter_item('f', fields=('region',))])
+    chart = create_perspective(column_state=[column_state_item('b', view='chart', columns=('qty',))])
+
+    def found(query):
+        response = client.get(f'{API}/search?{query}&after_id={min(grid["id"], chart["id"]) - 1}')
+        assert response.status_code == 200
+        return {item['id'] for item in response.get_json()['items']} & {grid['id'], chart['id']}
+
+    assert found('column=price') == {grid['id']}
+    assert found('column=qty') == {grid['id'], chart['id']}
+    # Filter fields count as columns too.
+    assert found('column=region') == {grid['id']}
+    assert found('view=chart') == {chart['id']}
+    assert found('filter=region') == {grid['id']}
+    assert found('filter=region&view=chart') == set()
+    assert client.get(f'{API}/search').status_code == 400
+
+
+def test_search_pages_by_keyset(client, create_perspective):
+    ids = [create_perspective(column_state=[column_state_item('a', columns=('paged_col',))])['id'] for _ in range(3)]
+    after_id, seen = min(ids) - 1, []
+    while after_id is not None:
+        page = client.get(f'{API}/search?column=paged_col&after_id={after_id}&limit=2').get_json()
+        seen += [item['id'] for item in page['items']]
+        after_id = page['next_after_id']
+    assert [i for i in seen if i in ids] == ids
@@ -0,0 +1,44 @@
+"""Projected single-perspective GETs: ?fields=, ?view= and ?offset=/?limit= over column_state."""
+import pytest
+
+from conftest import API, column_state_item, filter_item
+
+
+@pytest.fixture
+def perspective(create_perspective):
+    columns = [column_state_item(f'c{i}', view='chart' if i % 2 else 'grid') for i in range(6)]
+    return create_perspective(column_state=columns, filter_model=[filter_item('f', view='chart')])
+
+
+def _get(client, perspective, query, by='id'):
+    url = f"{API}/{perspective['id']}" if by == 'id' else f"{API}/user/{perspective['username']}"
+    return client.get(f'{url}?{query}')
+
+
+@pytest.mark.parametrize('by', ['id', 'username'])
+def test_fields_selects_document_keys_in_document_order(client, perspective, by):
+    response = _get(client, perspective, 'fields=filter_model, layout_name', by)
+    assert response.status_code == 200
+    assert list(response.get_json()) == ['layout_name', 'filter_model']
+    assert response.get_json()['filter_model'] == perspective['filter_model']
+    # A projection is of the same version: it carries the document's ETag.
+    assert response.headers['ETag'] == _get(client, perspective, '', by).headers['ETag']
+
+
+def test_view_and_paging_filter_the_sections(client, perspective):
+    body = _get(client, perspective, 'view=chart').get_json()
+    assert [item['name'] for item in body['column_state']] == ['c1', 'c3', 'c5']
+    assert [item['name'] for item in body['filter_model']] == ['f']
+    assert body['sort_model'] == []
+    assert body['username'] == perspective['username']
+
+    paged = _get(client, perspective, 'fields=column_state&view=grid&offset=1&limit=1').get_json()
+    assert paged == {'column_state': [perspective['column_state'][2]]}
+    assert _get(client, perspective, 'offset=4').get_json()['column_state'] == perspective['column_state'][4:]
+    assert _get(client, perspective, 'offset=10&limit=5').get_json()['column_state'] == []
+
+
+def test_invalid_projections_are_400(client, perspective, new_username):
+    for query in ('fields=nope', 'fields=', 'offset=-1', 'limit=0', 'limit=100000', 'fields=sort_model&limit=2'):
+        assert _get(client, perspective, query).status_code == 400, query
+    assert client.get(f'{API}/user/{new_username()}?fields=layout_name').status_code == 404
@@ -0,0 +1,72 @@
+"""Request body decoding: Content-Encoding, the decompressed size cap and JSON errors answer 4xx, not 500."""
+import gzip
+import json
+import zlib
+
+import pytest
+
+from api import compression
+from conftest import API, column_state_item
+
+# (method, URL) of every route that reads a JSON body; {username} is filled in per test.
+BODY_ROUTES = [
+    ('post', f'{API}/'),
+    ('post', f'{API}/bulk'),
+    ('put', f'{API}/1'),
+    ('patch', f'{API}/user/{{username}}'),
+    ('post', f'{API}/column_state/save'),
+    ('post', f'{API}/sort_model/save_single_sort'),
+    ('delete', f'{API}/filter_model/delete_single'),
+]
+
+
+def _send(client, method, url, data: bytes, encoding=None, content_type='application/json'):
+    headers = {'Content-Encoding': encoding} if encoding else {}
+    return getattr(client, method)(url, data=data, headers=headers, content_type=content_type)
+
+
+@pytest.fixture
+def username(new_username):
+    return new_username()
+
+
+@pytest.mark.parametrize('method, url', BODY_ROUTES)
+def test_invalid_json_is_400(client, username, method, url):
+    response = _send(client, method, url.format(username=username), b'{"username": ')
+    assert response.status_code == 400
+    assert 'Failed to decode JSON' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('method, url', BODY_ROUTES)
+def test_unknown_or_corrupt_encoding_is_415(client, username, method, url):
+    url = url.format(username=username)
+    assert _send(client, method, url, b'{}', encoding='compress').status_code == 415
+    corrupt = _send(client, method, url, b'not gzip at all', encoding='gzip')
+    assert corrupt.status_code == 415
+    assert 'not valid gzip' in corrupt.get_json()['error']
+    assert _send(client, method, url, b'{}', content_type='text/plain').status_code == 415
+
+
+@pytest.mark.parametrize('method, url', BODY_ROUTES)
+def test_decompressed_body_over_the_cap_is_413(client, username, monkeypatch, method, url):
+    monkeypatch.setattr(compression, 'COMPRESSION_MAX_REQUEST_SIZE', 1024)
+    body = json.dumps({"username": username, "padding": "x" * 4096}).encode()
+    for encoding, data in (('gzip', gzip.compress(body)), ('deflate', zlib.compress(body))):
+        response = _send(client, method, url.format(username=username), data, encoding=encoding)
+        assert response.status_code == 413
+        assert '1024 bytes' in response.get_json()['error']
+
+
+def test_compressed_bodies_are_decoded(client, new_username):
+    username = new_username()
+    body = json.dumps({"username": username, "layout_name": "layout", "updated_by": "tester",
+                       "column_state": [column_state_item('a')]}).encode()
+    created = _send(client, 'post', f'{API}/', gzip.compress(body), encoding='gzip')
+    assert created.status_code == 201
+    assert created.get_json()['column_state'][0]['name'] == 'a'
+
+    # Encodings are undone in reverse order of the header.
+    update = zlib.compress(gzip.compress(json.dumps({"layout_name": "twice"}).encode()))
+    updated = _send(client, 'put', f"{API}/{created.get_json()['id']}", update, encoding='gzip, deflate')
+    assert updated.status_code == 200
+    assert updated.get_json()['layout_name'] == 'twice'
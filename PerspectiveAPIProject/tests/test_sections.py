@@ -0,0 +1,125 @@
+"""Section routes: whole-section saves, merging saves by key and item deletes."""
+import pytest
+
+from conftest import API, column_state_item, filter_item
+
+# (section, blueprint path, merging save route, body key of delete_single)
+SECTIONS = [
+    ('column_state', 'column_state', 'save_single_column_state', 'column_state_name'),
+    ('sort_model', 'sort_model', 'save_single_sort', 'sort_model'),
+    ('filter_model', 'filter_model', 'save_single_filter', 'filter_model'),
+]
+
+
+def _item(section: str, name: str, view: str = 'grid', **kwargs) -> dict:
+    return column_state_item(name, view, **kwargs) if section == 'column_state' else filter_item(name, view, **kwargs)
+
+
+def _delete_keys(section: str, items):
+    """delete_single body value for (name, view) pairs: names for column_state, objects otherwise."""
+    if section == 'column_state':
+        return [name for name, _ in items]
+    return [{"name": name, "view": view} for name, view in items]
+
+
+def _keys(perspective: dict, section: str):
+    return [(item['name'], item['view']) for item in perspective[section]]
+
+
+@pytest.mark.parametrize('section, path', [('column_state', 'column_state'), ('sort_model', 'sort_model')])
+def test_save_replaces_the_section_and_creates_the_perspective(client, new_username, section, path):
+    username = new_username()
+    missing = client.post(f'{API}/{path}/save', json={"username": username, section: [_item(section, 'a')]})
+    assert missing.status_code == 400
+
+    created = client.post(f'{API}/{path}/save', json={
+        "username": username, "layout_name": "layout", "updated_by": "tester",
+        section: [_item(section, 'a'), _item(section, 'b')]})
+    assert created.status_code == 201
+    assert _keys(created.get_json(), section) == [('a', 'grid'), ('b', 'grid')]
+
+    replaced = client.post(f'{API}/{path}/save', json={"username": username, section: [_item(section, 'c')]})
+    assert replaced.status_code == 200
+    assert _keys(replaced.get_json(), section) == [('c', 'grid')]
+    assert replaced.get_json()['version'] == created.get_json()['version'] + 1
+
+    assert client.post(f'{API}/{path}/save', json={"username": username, section: "nope"}).status_code == 400
+
+
+@pytest.mark.parametrize('section, path, merge_route, _', SECTIONS)
+def test_merging_save_upserts_items_by_key(client, create_perspective, section, path, merge_route, _):
+    username = create_perspective(**{section: [_item(section, 'a'), _item(section, 'b')]})['username']
+
+    one = client.post(f'{API}/{path}/{merge_route}',
+                      json={"username": username, section: _item(section, 'b', default=True)})
+    assert one.status_code == 200
+    saved = one.get_json()[section]
+    assert [(i['name'], i['default']) for i in saved] == [('a', False), ('b', True)]
+
+    batch = client.post(f'{API}/{path}/{merge_route}', json={
+        "username": username, section: [_item(section, 'c'), _item(section, 'a', view='chart')]})
+    assert batch.status_code == 200
+    expected = [('a', 'grid'), ('b', 'grid'), ('c', 'grid')]
+    if section != 'column_state':
+        # sort_model and filter_model items are keyed by name and view.
+        expected.append(('a', 'chart'))
+    else:
+        # column_state items are keyed by name alone.
+        expected = [('a', 'chart'), ('b', 'grid'), ('c', 'grid')]
+    assert _keys(batch.get_json(), section) == expected
+
+    no_key = client.post(f'{API}/{path}/{merge_route}', json={"username": username, section: {"view": "grid"}})
+    assert no_key.status_code == 400
+
+
+@pytest.mark.parametrize('section, path, _, body_key', SECTIONS)
+def test_delete_single_removes_items_all_or_nothing(client, create_perspective, new_username,
+                                                    section, path, _, body_key):
+    items = [_item(section, name) for name in 'abc']
+    username = create_perspective(**{section: items})['username']
+    url = f'{API}/{path}/delete_single'
+
+    def delete(user, keys):
+        return client.delete(url, json={"username": user, body_key: _delete_keys(section, keys)})
+
+    deleted = delete(username, [('a', 'grid'), ('c', 'grid')])
+    assert deleted.status_code == 200
+    assert _keys(deleted.get_json(), section) == [('b', 'grid')]
+
+    # One missing item and nothing is deleted.
+    missing = delete(username, [('b', 'grid'), ('a', 'grid')])
+    assert missing.status_code == 404
+    assert _keys(client.get(f'{API}/user/{username}').get_json(), section) == [('b', 'grid')]
+
+    # Repeated keys count once.
+    repeated = delete(username, [('b', 'grid')] * 2)
+    assert repeated.status_code == 200
+    assert repeated.get_json()[section] == []
+
+    assert client.delete(url, json={"username": username}).status_code == 400
+    assert delete(new_username(), [('a', 'grid')]).status_code == 404
+
+
+def test_single_save_update_replaces_column_state(client, create_perspective):
+    username = create_perspective(column_state=[column_state_item('a'), column_state_item('b')])['username']
+    response = client.post(f'{API}/column_state/singleSaveUpdate', json={
+        "username": username, "column_state": [column_state_item('c')]})
+    assert response.status_code == 200
+    assert [item['name'] for item in response.get_json()['column_state']] == ['c']
+
+
+def test_save_single_column_state_drops_repeated_default_columns(client, create_perspective):
+    username = create_perspective()['username']
+    response = client.post(f'{API}/column_state/save_single_column_state', json={
+        "username": username, "column_state": column_state_item('a', columns=('x', 'y', 'x'))})
+    assert response.status_code == 200
+    assert response.get_json()['column_state'][0]['defaultColumns'] == ['x', 'y']
+
+
+def test_section_writes_move_the_etag(client, create_perspective):
+    created = create_perspective()
+    url = f"{API}/user/{created['username']}"
+    etag = client.get(url).headers['ETag']
+    client.post(f'{API}/sort_model/save_single_sort', json={"username": created['username'],
+                                                            "sort_model": filter_item('s')})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,64 @@
+"""Slow-query log: admin-token gated routes, and no request data in captured statements or plans."""
+import pytest
+
+from api.database import profiling
+from api.v1.endpoints import perspective as perspective_endpoints
+from conftest import API
+
+URL = f'{API}/db/slow_queries'
+TOKEN = 'test-admin-token'
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(perspective_endpoints, 'DB_SLOW_QUERY_ADMIN_TOKEN', TOKEN)
+    return {'X-Admin-Token': TOKEN}
+
+
+def test_routes_are_hidden_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(perspective_endpoints, 'DB_SLOW_QUERY_ADMIN_TOKEN', '')
+    assert client.get(URL).status_code == 404
+    assert client.delete(URL, headers={'X-Admin-Token': ''}).status_code == 404
+
+
+def test_routes_require_the_admin_token(client, admin_token):
+    for headers in ({}, {'X-Admin-Token': 'wrong'}):
+        assert client.get(URL, headers=headers).status_code == 403
+        assert client.delete(URL, headers=headers).status_code == 403
+    response = client.get(URL, headers=admin_token)
+    assert response.status_code == 200
+    assert 'slow_queries' in response.get_json()
+    assert client.delete(URL, headers=admin_token).status_code == 200
+
+
+def test_literals_are_redacted():
+    assert profiling._redact_statement(
+        "SELECT * FROM recsui.perspectives WHERE username = 'o''brien' AND id > 42 AND t2.x = $1 LIMIT 10"
+    ) == "SELECT * FROM recsui.perspectives WHERE username = '?' AND id > ? AND t2.x = $1 LIMIT ?"
+    plan = ("Index Scan using perspectives_pkey on perspectives  (cost=0.15..8.17 rows=1 width=40)\n"
+            "  Index Cond: (id = 42)\n"
+            "  Filter: ((username)::text = 'alice'::text)")
+    assert profiling._redact_plan(plan) == (
+        "Index Scan using perspectives_pkey on perspectives  (cost=0.15..8.17 rows=1 width=40)\n"
+        "  Index Cond: (id = ?)\n"
+        "  Filter: ((username)::text = '?'::text)")
+
+
+def test_captured_entries_hold_no_request_values(client, backend, admin_token, create_perspective, monkeypatch):
+    if not backend.startswith('postgres'):
+        pytest.skip("only the Postgres backends run statements through the profiling cursor")
+    created = create_perspective()
+    monkeypatch.setattr(profiling, 'DB_SLOW_QUERY_MS', 1e-6)
+    monkeypatch.setattr(profiling, 'DB_SLOW_QUERY_EXPLAIN_INTERVAL', 0)
+    profiling.slow_queries.clear()
+
+    client.get(f"{API}/user/{created['username']}")
+    client.put(f"{API}/{created['id']}", json={"layout_name": "secret-layout-name"})
+    entries = client.get(URL, headers=admin_token).get_json()['slow_queries']
+    monkeypatch.setattr(profiling, 'DB_SLOW_QUERY_MS', 0)
+    profiling.slow_queries.clear()
+
+    assert entries and any(entry['plan'] for entry in entries)
+    captured = repr(entries)
+    assert created['username'] not in captured
+    assert 'secret-layout-name' not in captured
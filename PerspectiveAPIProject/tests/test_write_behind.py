@@ -0,0 +1,68 @@
+"""Write-behind of column_state singleSaveUpdate: coalescing, read-your-writes and 503 on a failed settle."""
+import pytest
+
+from api.services import write_behind
+from conftest import API, column_state_item
+
+SAVE = f'{API}/column_state/singleSaveUpdate'
+
+
+@pytest.fixture
+def buffer(client, monkeypatch):
+    """A fresh write-behind buffer whose background thread never comes due during a test."""
+    buffer = write_behind.WriteBehindBuffer()
+    monkeypatch.setattr(write_behind, 'WRITE_BEHIND_ENABLED', True)
+    monkeypatch.setattr(write_behind, 'WRITE_BEHIND_DELAY_MS', 60000)
+    monkeypatch.setattr(write_behind, 'WRITE_BEHIND_MAX_DELAY_MS', 60000)
+    monkeypatch.setattr(write_behind, 'write_behind', buffer)
+    yield buffer
+    buffer.close()
+
+
+def test_a_burst_of_saves_is_written_once_before_the_next_read(client, buffer, create_perspective):
+    created = create_perspective(column_state=[column_state_item('a')])
+    username = created['username']
+    for name in ('b', 'c', 'd'):
+        response = client.post(SAVE, json={"username": username, "column_state": [column_state_item(name)]})
+        assert response.status_code == 202
+        assert response.get_json()['buffered'] is True
+    assert buffer.stats()['pending'] == 1
+    assert buffer.stats()['coalesced'] == 2
+
+    # Reads settle the user's pending save first, by username or by id.
+    stored = client.get(f"{API}/{created['id']}").get_json()
+    assert [item['name'] for item in stored['column_state']] == ['d']
+    assert stored['version'] == created['version'] + 1
+    assert buffer.stats()['pending'] == 0
+
+
+def test_saves_that_create_a_perspective_are_written_synchronously(client, buffer, new_username):
+    response = client.post(SAVE, json={"username": new_username(), "layout_name": "layout", "updated_by": "tester",
+                                       "column_state": [column_state_item('a')]})
+    assert response.status_code == 201
+    assert buffer.stats()['pending'] == 0
+
+
+def test_a_pending_save_that_cannot_be_written_answers_503(client, buffer, create_perspective, monkeypatch):
+    username = create_perspective()['username']
+    assert client.post(SAVE, json={"username": username, "column_state": [column_state_item('a')]}).status_code == 202
+
+    database_down = True
+    write = buffer._write
+
+    def flaky_write(pending, service):
+        if database_down:
+            buffer._failed(pending, RuntimeError("database unavailable"))
+            return False
+        return write(pending, service)
+
+    monkeypatch.setattr(buffer, '_write', flaky_write)
+    assert client.get(f'{API}/user/{username}').status_code == 503
+    assert client.post(SAVE, json={"username": username, "column_state": []}).status_code == 202
+    assert buffer.stats()['pending'] == 1
+
+    # The save stays pending and is written by the next request once the database is back.
+    database_down = False
+    response = client.get(f'{API}/user/{username}')
+    assert response.status_code == 200
+    assert response.get_json()['column_state'] == []
@@ -1,9 +1,12 @@
 import os
+import time
 from typing import Any, AsyncGenerator
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import text
+from sqlalchemy import event, text
+
+from api.metrics import add_phase_time
 
 """ 
 import psycopg2
@@ -42,6 +45,17 @@ print(f'DATABASE_URL => ', DATABASE_URL)
 
 # Create the asynchronous database engine
 engine = create_async_engine(DATABASE_URL, echo=True)
+
+
+# Time spent executing statements counts towards the request's 'db' phase (/metrics).
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    add_phase_time('db', time.perf_counter() - conn.info["statement_start"].pop())
 """
 # You can now use the engine to interact with the database
 with engine.connect() as connection:
@@ -0,0 +1,283 @@
+"""
+Request metrics for the FastAPI app, exposed in the Prometheus text format at /metrics.
+
+- http_request_duration_seconds: latency histogram per route (the path
+  template, e.g. /api/v1/perspectives/{perspective_id}) and method.
+- http_request_phase_seconds: the same requests split into phases:
+  - db: time spent executing statements, reported by the app's database
+    module through `add_phase_time('db', ...)`;
+  - validation: reading the body, solving dependencies and validating the
+    parameters and body, up to the endpoint's start (see TimedRoute);
+  - serialization: validating the return value against response_model and
+    rendering the response, after the endpoint returns (see TimedRoute);
+  - other: whatever is left (the endpoint's own work, routing, middleware).
+- http_requests_in_flight: gauge per method (the route is only known once the
+  request has been routed).
+- http_responses_total: counter per route, method and status code.
+
+MetricsMiddleware is plain ASGI, so recording a request costs a few
+perf_counter() calls and one short lock per metric. It is meant to stay on in
+production; METRICS_ENABLED=0 turns it off. Latency covers the whole response,
+including the body. Routers are created with `APIRouter(route_class=TimedRoute)`
+so their routes report the validation and serialization phases.
+
+This module is kept identical in the three FastAPI apps (perspective_api,
+perspectives_app and perspective_api_002). They are deployed separately and do
+not share a package, so a change to one copy is made to all three.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.routing import APIRoute
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASES = ('db', 'validation', 'serialization')
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Phase -> seconds for the request being handled in this context; None outside requests.
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_phases', default=None)
+# perf_counter() when the endpoint started and returned, appended by `_timed_endpoint`.
+# A list rather than two values: sync endpoints run in a worker thread with a copy of
+# the context, so the route handler only sees what they add to the same object.
+_endpoint_span: ContextVar[Optional[List[float]]] = ContextVar('endpoint_span', default=None)
+
+
+def add_phase_time(phase: str, seconds: float):
+    """Adds `seconds` to a phase of the current request (no-op outside a measured request)."""
+    phases = _request_phases.get()
+    if phases is not None:
+        phases[phase] += seconds
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...], amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = self._header()
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, by route.", ("method", "route"))
+REQUEST_PHASES = Histogram(
+    "http_request_phase_seconds", "Time spent per phase of a request (db, validation, serialization, other).",
+    ("method", "route", "phase"))
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method",))
+RESPONSES = Counter(
+    "http_responses_total", "Responses sent, by status code.", ("method", "route", "status"))
+
+_METRICS = (REQUEST_DURATION, REQUEST_PHASES, REQUESTS_IN_FLIGHT, RESPONSES)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency, phases and status of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500  # if the app fails before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        phases = dict.fromkeys(PHASES, 0.0)
+        token = _request_phases.set(phases)
+        REQUESTS_IN_FLIGHT.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.dec((method,))
+            _request_phases.reset(token)
+            # The router stores the matched route in the scope; its path template
+            # keeps ids and usernames from creating new series.
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            labels = (method, route)
+            REQUEST_DURATION.observe(labels, elapsed)
+            for phase, seconds in phases.items():
+                REQUEST_PHASES.observe(labels + (phase,), seconds)
+            REQUEST_PHASES.observe(labels + ('other',), max(elapsed - sum(phases.values()), 0.0))
+            RESPONSES.inc(labels + (str(status),))
+
+
+def _timed_endpoint(call: Callable) -> Callable:
+    """Wraps an endpoint so that TimedRoute sees when it starts and returns."""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            span = _endpoint_span.get()
+            if span is not None:
+                span.append(time.perf_counter())
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                if span is not None:
+                    span.append(time.perf_counter())
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            span = _endpoint_span.get()
+            if span is not None:
+                span.append(time.perf_counter())
+            try:
+                return call(*args, **kwargs)
+            finally:
+                if span is not None:
+                    span.append(time.perf_counter())
+    endpoint.timed_endpoint = True
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that reports the work FastAPI does around the endpoint as phases:
+    validation until the endpoint starts (the whole handler when validation
+    fails), serialization after it returns. Dependencies are solved in the
+    validation window, so database time spent in them is counted there too.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if METRICS_ENABLED and not getattr(endpoint, 'timed_endpoint', False) \
+                and not inspect.isgeneratorfunction(endpoint) and not inspect.isasyncgenfunction(endpoint):
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        if not getattr(self.endpoint, 'timed_endpoint', False):
+            return handler
+
+        async def timed_handler(request: Request) -> Response:
+            span: List[float] = []
+            token = _endpoint_span.set(span)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                end = time.perf_counter()
+                _endpoint_span.reset(token)
+                add_phase_time('validation', (span[0] if span else end) - start)
+                if len(span) == 2:
+                    add_phase_time('serialization', end - span[1])
+
+        return timed_handler
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_route():
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+def init_metrics(app: FastAPI):
+    """Installs MetricsMiddleware and the /metrics endpoint (unless METRICS_ENABLED=0)."""
+    if not METRICS_ENABLED:
+        return
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, text
+from sqlalchemy import Column, Integer, String, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from api.database.database import Base
 
@@ -8,10 +9,16 @@ class Perspective(Base):
     This model maps to the data structure provided in the user's JSON.
     """
     __tablename__ = "perspectives"
-    __table_args__ = {"schema": "recsui"}
+    # The DDL (including these indexes) is owned by the versioned migrations in
+    # PerspectiveAPIProject/api/database/migrations.py; this only mirrors it.
+    __table_args__ = (
+        Index("perspectives_username_key", "username", unique=True),
+        Index("perspectives_updated_time_idx", "updated_time"),
+        {"schema": "recsui"},
+    )
 
     # id is the primary key and is auto-incremented
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
 
     # These fields are required and are validated to not be empty strings.
     username = Column(String, nullable=False)
@@ -19,9 +26,12 @@ class Perspective(Base):
     updated_by = Column(String, nullable=False)
 
     # These fields store JSON data. JSONB is used for efficient storage and querying.
-    column_state = Column(JSON, nullable=False, default=text("'[]'::jsonb"))
-    sort_model = Column(JSON, nullable=False, default=text("'[]'::jsonb"))
-    filter_model = Column(JSON, nullable=False, default=text("'[]'::jsonb"))
+    column_state = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    sort_model = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
+    filter_model = Column(JSONB, nullable=False, server_default=text("'[]'::jsonb"))
 
     # updated_time is automatically populated with the current timestamp
-    updated_time = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_time = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Row version for optimistic concurrency control, bumped on every write
+    version = Column(Integer, nullable=False, server_default=text("1"))
\ No newline at end of file
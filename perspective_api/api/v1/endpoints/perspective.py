@@ -4,9 +4,10 @@ from typing import List
 from api.database.database import get_db
 from api.schemas.perspective import Perspective, PerspectiveCreate, PerspectiveUpdate
 from api.services.perspective import PerspectiveService
+from api.metrics import TimedRoute
 
 # Create an APIRouter for this module
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/perspectives/", response_model=List[Perspective])
 async def get_all(db: AsyncSession = Depends(get_db)):
@@ -1,9 +1,17 @@
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from api.v1.endpoints import perspective
+from api.metrics import init_metrics
 
 # Initialize the FastAPI application
 app = FastAPI(title="Perspective API", version="1.0.0")
 
 # Include the API router
-app.include_router(perspective.router, prefix="/api/v1", tags=["Perspectives"])
\ No newline at end of file
+app.include_router(perspective.router, prefix="/api/v1", tags=["Perspectives"])
+
+# gzip responses of 1 KB and more (layout documents compress about 10x)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Per-route latency histograms, exposed at /metrics in the Prometheus text format
+init_metrics(app)
\ No newline at end of file
@@ -6,10 +6,12 @@
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 from typing import Dict, Any
 
 from perspectives_app.perspective_route import router
+from perspectives_app.metrics import init_metrics
 
 # A global variable to store the database connection pool or client.
 # In a real application, you would initialize your database connection here.
@@ -42,6 +44,12 @@ app = FastAPI(
 # Include the router for the perspective endpoints.
 app.include_router(router)
 
+# gzip responses of 1 KB and more (layout documents compress about 10x)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Per-route latency histograms, exposed at /metrics in the Prometheus text format
+init_metrics(app)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Perspective API"}
@@ -13,6 +13,40 @@ import os
 
 from perspectives_app.perspective_schemas import ColumnState, UserPerspectiveCreate, ColumnStateUpdate
 
+# Inserts a perspective, or merges the incoming column states into the existing
+# ones by name: matching items are replaced in place, new items are appended in
+# request order (the last duplicate in the request wins).
+UPSERT_PERSPECTIVE_QUERY = """
+    INSERT INTO perspectives AS p (username, layout_name, column_state, sort_model, filter_model, updated_by)
+    VALUES (%(username)s, %(layout_name)s, %(column_state)s::jsonb, %(sort_model)s::jsonb,
+            %(filter_model)s::jsonb, %(updated_by)s)
+    ON CONFLICT (username) DO UPDATE SET
+        column_state = (
+            WITH incoming AS (
+                SELECT DISTINCT ON (i.item -> 'name') i.item, i.ord
+                FROM jsonb_array_elements(EXCLUDED.column_state) WITH ORDINALITY AS i(item, ord)
+                ORDER BY i.item -> 'name', i.ord DESC
+            ),
+            existing AS (
+                SELECT e.item, e.ord
+                FROM jsonb_array_elements(COALESCE(p.column_state, '[]'::jsonb)) WITH ORDINALITY AS e(item, ord)
+            )
+            SELECT COALESCE(jsonb_agg(merged.item ORDER BY merged.grp, merged.ord), '[]'::jsonb)
+            FROM (
+                SELECT COALESCE(incoming.item, existing.item) AS item, 0 AS grp, existing.ord
+                FROM existing LEFT JOIN incoming ON incoming.item -> 'name' = existing.item -> 'name'
+                UNION ALL
+                SELECT incoming.item, 1 AS grp, incoming.ord
+                FROM incoming
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM existing WHERE existing.item -> 'name' = incoming.item -> 'name'
+                )
+            ) AS merged
+        ),
+        updated_by = EXCLUDED.updated_by,
+        updated_time = now();
+"""
+
 
 class PerspectiveModel:
     """
@@ -41,53 +75,23 @@ class PerspectiveModel:
     def create_or_update_perspective(self, conn: connection, curr: cursor, data: UserPerspectiveCreate) -> bool:
         """
         Inserts a new perspective for a user or updates it if the user already exists.
+
+        Runs as a single INSERT ... ON CONFLICT statement: on conflict the incoming
+        column states are merged into the stored ones by name inside Postgres, so
+        the row is never read back into Python and concurrent saves cannot
+        overwrite each other. Requires the unique index on username.
         """
         try:
-            existing_user = self.get_user_perspective(curr, data.username)
-
-            if existing_user:
-                current_column_states = existing_user.get('column_state', [])
-                new_column_states = data.column_state
-                current_map = {cs['name']: cs for cs in current_column_states}
-
-                updated_column_states = []
-                for new_cs in new_column_states:
-                    if new_cs.name in current_map:
-                        current_map[new_cs.name] = new_cs.model_dump()
-                    else:
-                        updated_column_states.append(new_cs.model_dump())
-
-                final_column_states = list(current_map.values()) + updated_column_states
-
-                update_query = """
-                               UPDATE perspectives \
-                               SET column_state = %s::jsonb, 
-                        updated_by = %s
-                               WHERE username = %s; \
-                               """
-                curr.execute(update_query, (
-                    json.dumps(final_column_states),
-                    data.updated_by,
-                    data.username
-                ))
-                conn.commit()
-                return True
-            else:
-                insert_query = """
-                               INSERT INTO perspectives (username, layout_name, column_state, sort_model, filter_model, \
-                                                         updated_by)
-                               VALUES (%s, %s, %s::jsonb, %s::jsonb, %s::jsonb, %s); \
-                               """
-                curr.execute(insert_query, (
-                    data.username,
-                    data.layout_name,
-                    json.dumps([cs.model_dump() for cs in data.column_state]),
-                    json.dumps(data.sort_model),
-                    json.dumps(data.filter_model),
-                    data.updated_by
-                ))
-                conn.commit()
-                return True
+            curr.execute(UPSERT_PERSPECTIVE_QUERY, {
+                'username': data.username,
+                'layout_name': data.layout_name,
+                'column_state': json.dumps([cs.model_dump() for cs in data.column_state]),
+                'sort_model': json.dumps(data.sort_model),
+                'filter_model': json.dumps(data.filter_model),
+                'updated_by': data.updated_by,
+            })
+            conn.commit()
+            return True
         except psycopg2.Error as e:
             print(f"Error creating or updating perspective: {e}")
             conn.rollback()
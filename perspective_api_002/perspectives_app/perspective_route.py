@@ -10,12 +10,14 @@ from typing import List
 from  perspectives_app.perspective_schemas import UserPerspectiveCreate, ColumnState, ColumnStateUpdate
 from perspectives_app.perspective_model import PerspectiveModel
 from perspectives_app.database import get_db_connection, close_db_connection
+from perspectives_app.metrics import TimedRoute
 
 # Create an instance of the router.
 router = APIRouter(
     prefix="/perspectives",
     tags=["perspectives"],
     responses={404: {"description": "Not found"}},
+    route_class=TimedRoute,
 )
 
 # Initialize the database model.
@@ -7,9 +7,10 @@ from typing import List
 from app.database.database import get_db
 from ...schemas.perspective import Perspective, PerspectiveCreate, PerspectiveUpdate
 from ...services.perspective import PerspectiveService
+from ...metrics import TimedRoute
 
 # Create an APIRouter for this module
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/perspectives/", response_model=List[Perspective])
 async def get_all(db: AsyncSession = Depends(get_db)):
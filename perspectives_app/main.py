@@ -13,16 +13,13 @@
 #
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from perspectives_app.app.routes.perspectives import perspective
-from perspectives_app.app.database.database import engine, Base
+from perspectives_app.app.metrics import init_metrics
 
-# This function creates the database tables when the application starts.
-async def create_db_and_tables():
-    """Initializes the database and creates tables based on the models."""
-    async with engine.begin() as conn:
-        # Use a transaction to create tables within the specified schema
-        await conn.execute("CREATE SCHEMA IF NOT EXISTS recsui")
-        await conn.run_sync(Base.metadata.create_all)
+# The recsui schema, tables and indexes are created by the versioned migrations
+# (python -m api.database.migrations upgrade, from PerspectiveAPIProject); the app
+# issues no DDL at startup.
 
 # Initialize the FastAPI application
 app = FastAPI(title="Perspective API", version="1.0.0")
@@ -30,8 +27,8 @@ app = FastAPI(title="Perspective API", version="1.0.0")
 # Include the API router
 app.include_router(perspective.router, prefix="/api/v1", tags=["Perspectives"])
 
-# Register the event to create tables on startup
-@app.on_event("startup")
-async def startup_event():
-    await create_db_and_tables()
-    print("Database tables created/checked.")
\ No newline at end of file
+# gzip responses of 1 KB and more (layout documents compress about 10x)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Per-route latency histograms, exposed at /metrics in the Prometheus text format
+init_metrics(app)
\ No newline at end of file